@@ -1,6 +1,12 @@
+import os
+import sys
 import pandas as pd
-import json
-import re
+
+# Shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import jsonio
+from common.contacts import find_member_conflicts, report_conflicts
+from common.recipients import normalize_series, valid_mask
 
 # Read the CSV file
 csv_file = "DL Sprint Team Registration Form (Responses) - Form responses 1.csv"
@@ -9,6 +15,18 @@ df = pd.read_csv(csv_file)
 # Get only member email columns (exclude "Email address" which is form submission email)
 email_columns = [col for col in df.columns if 'Email' in col and col != 'Email address']
 
+# Validate every member email column at once (one compiled pattern);
+# invalid cells become NaN and are skipped below
+for col in email_columns:
+    cleaned = normalize_series(df[col])
+    invalid = (cleaned != "") & ~valid_mask(cleaned)
+    for bad in df.loc[invalid, col]:
+        print(f"WARNING: Skipping invalid email '{bad}'")
+    df[col] = df[col].where(~invalid)
+
+# Members listed on several teams (same email or phone)
+report_conflicts(find_member_conflicts(df, 'Team Name'), "member_conflicts.csv")
+
 # Build list of team entries (to handle duplicate team names)
 team_emails_list = []
 
@@ -20,9 +38,7 @@ for idx, row in df.iterrows():
         email = row[col]
         # Check if email is non-empty and valid
         if pd.notna(email) and isinstance(email, str) and email.strip():
-            # Basic email validation
-            if '@' in email:
-                emails.add(email.strip())
+            emails.add(email.strip())
     
     if emails:
         email_list = list(emails)
@@ -37,8 +53,7 @@ for idx, row in df.iterrows():
 
 # Save to JSON file
 output_file = "team_emails.json"
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(team_emails_list, f, indent=4, ensure_ascii=False)
+jsonio.dump_array(team_emails_list, output_file, pretty=True, indent=4)
 
 print(f"\nGenerated {output_file} with {len(team_emails_list)} teams")
 print(f"Total emails extracted: {sum(len(t['emails']) for t in team_emails_list)}")
@@ -10,11 +10,15 @@ Usage:
 """
 
 import pandas as pd
-import json
 import os
+import sys
 import argparse
 from datetime import datetime
 
+# Shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import jsonio
+
 # Configuration
 CSV_FILE = "DL Sprint Team Registration Form (Responses) - Form responses 1_new.csv"  # Always use latest
 SENT_LOG_FILE = "sent_teams.json"  # Tracks which teams have been emailed
@@ -25,16 +29,14 @@ ALL_TEAMS_JSON = "team_emails.json"  # Full list
 def load_sent_log():
     """Load the log of teams that have already been sent emails"""
     if os.path.exists(SENT_LOG_FILE):
-        with open(SENT_LOG_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return jsonio.load(SENT_LOG_FILE)
     return {"sent_teams": [], "last_updated": None}
 
 
 def save_sent_log(sent_log):
     """Save the sent teams log"""
     sent_log["last_updated"] = datetime.now().isoformat()
-    with open(SENT_LOG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(sent_log, f, indent=4, ensure_ascii=False)
+    jsonio.dump(sent_log, SENT_LOG_FILE, pretty=True, indent=4)
     print(f"✓ Updated {SENT_LOG_FILE}")
 
 
@@ -77,6 +79,7 @@ def main():
     parser.add_argument('--generate', action='store_true', help='Generate JSON for new teams')
     parser.add_argument('--mark-sent', action='store_true', help='Mark new teams as sent')
     parser.add_argument('--mark-all', action='store_true', help='Mark ALL current teams as sent (initial setup)')
+    parser.add_argument('--compact', action='store_true', help='Write new_team_emails.json as compact JSON')
     args = parser.parse_args()
 
     # Load current state
@@ -110,9 +113,8 @@ def main():
     
     if args.generate:
         # Generate JSON file for new teams only
-        output_teams = [{"team_name": t["team_name"], "emails": t["emails"]} for t in new_teams]
-        with open(NEW_TEAMS_JSON, 'w', encoding='utf-8') as f:
-            json.dump(output_teams, f, indent=4, ensure_ascii=False)
+        output_teams = ({"team_name": t["team_name"], "emails": t["emails"]} for t in new_teams)
+        jsonio.dump_array(output_teams, NEW_TEAMS_JSON, pretty=not args.compact, indent=4)
         print(f"\n✓ Generated {NEW_TEAMS_JSON} with {len(new_teams)} new teams")
         print(f"   Total emails: {sum(len(t['emails']) for t in new_teams)}")
     
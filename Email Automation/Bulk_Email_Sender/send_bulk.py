@@ -7,56 +7,57 @@ Usage:
     python send_bulk.py form_response.csv
 """
 
+import argparse
+import hashlib
 import os
 import sys
 import time
 import pandas as pd
-import requests
 from datetime import datetime, timezone
 
 # Import configuration
 import config
 
+# Shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.recipients import SuppressionList, normalize_series, valid_mask
+from common.brevo import MISSING_KEY_ERROR, SendResult
+from common.quota import QuotaScheduler
+from common.aimd import send_adaptive
+from common.breaker import CircuitBreaker
+from common.senders import SenderPool
+from common.workqueue import WorkQueue, run_worker
+from common.events import message_tags
+
 
 # ========================================
 # CONSTANTS (from config)
 # ========================================
 BREVO_API_KEY = config.BREVO_API_KEY or os.getenv("BREVO_API_KEY", "").strip()
-BREVO_URL = "https://api.brevo.com/v3/smtp/email"
+CAMPAIGN = "bulk"  # Priority class in the shared outbox (common/quota.py)
+
+# One or more Brevo keys (senders.json / BREVO_API_KEYS, see common/senders.py)
+SENDERS = SenderPool.from_env(BREVO_API_KEY)
+# Fails fast while Brevo is down, parking emails in the outbox (common/breaker.py)
+BREAKER = CircuitBreaker(config.CIRCUIT_BREAKER_FAILURES, config.CIRCUIT_BREAKER_COOLDOWN,
+                         campaign=CAMPAIGN, send_fn=SENDERS.send)
 
 
 # ========================================
 # HELPER FUNCTIONS
 # ========================================
 
-def clean_email(x) -> str:
-    """Clean and normalize email address"""
-    return str(x).strip().lower() if pd.notna(x) else ""
-
-
 def now_iso() -> str:
     """Return current timestamp in ISO format"""
     return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
 
 
-def send_email_brevo(to_email: str, team: str) -> tuple[bool, str]:
-    """
-    Send email via Brevo API
-    
-    Args:
-        to_email: Recipient email address
-        team: Team name
-    
-    Returns:
-        (success: bool, info: str) - info is messageId or error message
-    """
-    if not BREVO_API_KEY:
-        return False, "Missing BREVO_API_KEY"
-    
+def build_payload(to_email: str, team: str) -> dict:
+    """Build the Brevo /v3/smtp/email payload for one team"""
     # Get message from env or config
     message = os.getenv("EMAIL_MESSAGE", config.DEFAULT_MESSAGE)
     
-    payload = {
+    return {
         "sender": {"name": config.FROM_NAME, "email": config.FROM_EMAIL},
         "to": [{"email": to_email, "name": team}],
         "replyTo": {"name": config.REPLY_TO_NAME, "email": config.REPLY_TO_EMAIL},
@@ -65,48 +66,114 @@ def send_email_brevo(to_email: str, team: str) -> tuple[bool, str]:
             team=team,
             message=message,
             reply_team=config.REPLY_TO_NAME
-        )
+        ),
+        "tags": message_tags(CAMPAIGN),
     }
+
+
+def send_email_brevo(to_email: str, team: str) -> SendResult:
+    """
+    Send email via Brevo API
     
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "api-key": BREVO_API_KEY
-    }
+    Args:
+        to_email: Recipient email address
+        team: Team name
     
-    try:
-        r = requests.post(BREVO_URL, json=payload, headers=headers, timeout=30)
-        
-        if 200 <= r.status_code < 300:
-            try:
-                msg_id = r.json().get("messageId", "OK")
-            except Exception:
-                msg_id = "OK"
-            return True, msg_id
+    Returns:
+        SendResult - info is messageId or error message; queued is set when
+        Brevo was unavailable and the email was parked in the outbox instead
+    """
+    if not SENDERS:
+        return SendResult(False, MISSING_KEY_ERROR, None, 0.0)
+    
+    result = BREAKER.send(build_payload(to_email, team), BREVO_API_KEY)
+    return result
+
+
+def queue_name(csv_path: str, campaign: str = None) -> str:
+    """
+    Work queue for one campaign run.
+    
+    Queue items are keyed by address, so every campaign needs its own queue:
+    by default one per subject, message and CSV file, so a new message to
+    the same people after reset_columns.py is not skipped as already done.
+    """
+    if campaign:
+        return f"{CAMPAIGN}-{campaign}"
+    message = os.getenv("EMAIL_MESSAGE", config.DEFAULT_MESSAGE)
+    digest = hashlib.sha1("\0".join([
+        config.SUBJECT, config.BODY_TEXT_TEMPLATE, message, os.path.basename(csv_path),
+    ]).encode("utf-8")).hexdigest()[:10]
+    return f"{CAMPAIGN}-{digest}"
+
+
+def send_as_worker(candidates: pd.DataFrame, queue_campaign: str) -> None:
+    """
+    Send the campaign together with other worker processes (common/workqueue.py).
+    
+    Every worker loads the same candidates into the shared queue (already
+    queued addresses are skipped) and then sends leased batches until none
+    are left. Workers do not write the CSV; run with --collect afterwards.
+    """
+    queue = WorkQueue(queue_campaign)
+    items = []
+    for _, row in candidates.iterrows():
+        real_to = config.TEST_TO if config.TEST_MODE else row["_to_email"]
+        items.append((row["_to_email"], build_payload(real_to, row["_team"] or "Team")))
+    print(f"📦 Added {queue.add(items)} new email(s) to the work queue")
+    
+    def done(key, payload, result):
+        team = payload["to"][0]["name"]
+        if result.ok:
+            print(f"📤 {team} <{key}> ✅ Sent (ID: {result.info})")
+        elif result.queued is not None:
+            print(f"📤 {team} <{key}> ⏸  Brevo unavailable - queued for retry (#{result.queued})")
         else:
-            try:
-                error_msg = r.json().get("message", r.text)
-            except Exception:
-                error_msg = r.text
-            return False, f"HTTP {r.status_code}: {error_msg}"
-    
-    except requests.exceptions.Timeout:
-        return False, "Request timeout"
-    except requests.exceptions.RequestException as e:
-        return False, f"Request error: {str(e)}"
-    except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+            print(f"📤 {team} <{key}> ❌ Failed: {result.info}")
+    
+    stats = run_worker(queue, lambda payload: BREAKER.send(payload, BREVO_API_KEY), done,
+                       delay=config.SECONDS_BETWEEN_EMAILS)
+    
+    print("\n" + "="*50)
+    print("📊 WORKER SUMMARY")
+    print("="*50)
+    print(f"✅ Sent: {stats['sent']}  ❌ Failed: {stats['failed']}  ⏸ Retry later: {stats['retry']}")
+    print(f"🔒 Batches: {stats['batches']} ({stats['lost']} lost to other workers)")
+    print(f"📦 Queue {queue_campaign}: {queue.counts()}")
+    print("ℹ️  When all workers are done, run with --collect to update Mail Sent in the CSV")
+
+
+def collect_results(df: pd.DataFrame, csv_path: str, queue_campaign: str) -> int:
+    """Copy finished work-queue sends into the Mail Sent column; returns rows updated"""
+    updated = 0
+    df[config.MAIL_SENT_COL] = df[config.MAIL_SENT_COL].astype(object)
+    for key, status, info, finished_at in WorkQueue(queue_campaign).results():
+        if status != "done":
+            continue
+        info = info if info.startswith("queued #") else f"<{info}>"
+        rows = (df["_to_email"] == key) & (
+            df[config.MAIL_SENT_COL].isna() | (df[config.MAIL_SENT_COL].astype(str).str.strip() == "")
+        )
+        df.loc[rows, config.MAIL_SENT_COL] = f"{finished_at} | {info}"
+        updated += int(rows.sum())
+    df.to_csv(csv_path, index=False)
+    return updated
 
 
 # ========================================
 # MAIN PROCESSING
 # ========================================
 
-def main():
-    """Process CSV and send bulk emails"""
+def main(csv_path: str = "form_response.csv", enqueue: bool = False, adaptive: bool = False,
+         worker: bool = False, collect: bool = False, campaign: str = None):
+    """Process CSV and send bulk emails (or queue them in the shared outbox)
     
-    # Get CSV path from command line or use default
-    csv_path = sys.argv[1] if len(sys.argv) > 1 else "form_response.csv"
+    With adaptive=True, emails are sent concurrently under an AIMD limit
+    (common/aimd.py) instead of sleeping SECONDS_BETWEEN_EMAILS between sends.
+    With worker=True, the campaign is shared with other worker processes
+    through common/workqueue.py; collect=True writes their results to the CSV.
+    The queue is named after campaign, or after the subject, message and CSV.
+    """
     
     if not os.path.exists(csv_path):
         print(f"❌ Error: File not found: {csv_path}")
@@ -129,7 +196,12 @@ def main():
         sys.exit(1)
     
     # Clean columns
-    df["_to_email"] = df[config.EMAIL_COL].apply(clean_email)
+    df["_to_email"] = normalize_series(df[config.EMAIL_COL])
+    
+    if collect:
+        print(f"📥 Marked {collect_results(df, csv_path, queue_name(csv_path, campaign))} row(s) as sent "
+              f"from the work queue")
+        return
     
     if config.TEAM_COL in df.columns:
         df["_team"] = df[config.TEAM_COL].fillna("Team").astype(str).str.strip()
@@ -148,11 +220,20 @@ def main():
     candidates = candidates[candidates["_to_email"] != ""]
     candidates = candidates.drop_duplicates(subset=["_to_email"])
     
+    # Drop bad and previously bounced addresses before any API call
+    suppressed = set(SuppressionList.load().entries)
+    bad_mask = ~valid_mask(candidates["_to_email"]) | candidates["_to_email"].isin(suppressed)
+    rejected = candidates[bad_mask]
+    candidates = candidates[~bad_mask]
+    
     print("="*50)
     print("📧 Bulk Email Sender")
     print("="*50)
     print(f"📄 Loaded: {len(df)} rows from {csv_path}")
     print(f"➡️  Will send: {len(candidates)} emails (Send Now=YES & Mail Sent empty)")
+    if len(rejected):
+        print(f"🚫 Skipped {len(rejected)} invalid or suppressed address(es): "
+              f"{', '.join(rejected['_to_email'])}")
     
     if config.TEST_MODE:
         print(f"⚠️  TEST MODE: All emails will go to {config.TEST_TO}")
@@ -163,39 +244,95 @@ def main():
     
     print()
     
+    if worker:
+        send_as_worker(candidates, queue_name(csv_path, campaign))
+        return
+    
     sent_count = 0
     fail_count = 0
+    parked_count = 0  # Parked in the outbox while Brevo was down
+    scheduler = QuotaScheduler() if enqueue else None
+    adaptive_jobs = []  # (row index, team, payload) sent after the loop in adaptive mode
     
     for idx, row in candidates.iterrows():
         real_to = config.TEST_TO if config.TEST_MODE else row["_to_email"]
         team = row["_team"] or "Team"
         
+        if scheduler is not None:
+            outbox_id = scheduler.enqueue(CAMPAIGN, build_payload(real_to, team))
+            sent_count += 1
+            df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | queued #{outbox_id}"
+            print(f"📥 Queued: {team} <{real_to}> (#{outbox_id})")
+            continue
+        
+        if adaptive:
+            adaptive_jobs.append((idx, team, build_payload(real_to, team)))
+            continue
+        
         print(f"📤 Sending to: {team} <{real_to}>", end=" ")
         
-        ok, info = send_email_brevo(real_to, team)
+        result = send_email_brevo(real_to, team)
         
-        if ok:
+        if result.ok:
             sent_count += 1
-            df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | <{info}>"
-            print(f"✅ Sent (ID: {info})")
+            df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | <{result.info}>"
+            print(f"✅ Sent (ID: {result.info})")
+        elif result.queued is not None:
+            parked_count += 1
+            df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | queued #{result.queued}"
+            print(f"⏸  Brevo unavailable - queued for retry (#{result.queued})")
         else:
             fail_count += 1
-            print(f"❌ Failed: {info}")
+            print(f"❌ Failed: {result.info}")
         
         # Save progress after each email (safe for reruns)
         df.to_csv(csv_path, index=False)
         
-        # Rate limiting (don't delay after last email)
-        if idx != candidates.index[-1]:
+        # Rate limiting (don't delay after last email, or while failing fast)
+        if idx != candidates.index[-1] and result.latency:
             time.sleep(config.SECONDS_BETWEEN_EMAILS)
     
+    limiter = None
+    if adaptive_jobs:
+        def job_done(job, result):
+            nonlocal sent_count, fail_count, parked_count
+            idx, team, payload = job
+            real_to = payload["to"][0]["email"]
+            if result.ok:
+                sent_count += 1
+                df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | <{result.info}>"
+                print(f"📤 {team} <{real_to}> ✅ Sent (ID: {result.info})")
+            elif result.queued is not None:
+                parked_count += 1
+                df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | queued #{result.queued}"
+                print(f"📤 {team} <{real_to}> ⏸  Brevo unavailable - queued for retry (#{result.queued})")
+            else:
+                fail_count += 1
+                print(f"📤 {team} <{real_to}> ❌ Failed: {result.info}")
+            # Save progress after each email (safe for reruns)
+            df.to_csv(csv_path, index=False)
+        
+        limiter = send_adaptive(adaptive_jobs, lambda job: BREAKER.send(job[2], BREVO_API_KEY), job_done)
+    
     # Summary
     print("\n" + "="*50)
     print("📊 SUMMARY")
     print("="*50)
-    print(f"✅ Successfully sent: {sent_count}")
+    if enqueue:
+        # Persist the queued markers (the send path saves after each email)
+        df.to_csv(csv_path, index=False)
+        print(f"📥 Queued in outbox: {sent_count}")
+    else:
+        print(f"✅ Successfully sent: {sent_count}")
     print(f"❌ Failed: {fail_count}")
-    print(f"📧 Total processed: {sent_count + fail_count}")
+    if parked_count:
+        print(f"⏸  Queued for retry (Brevo unavailable): {parked_count} - "
+              f"run `python -m common.quota drain` later")
+    print(f"📧 Total processed: {sent_count + fail_count + parked_count}")
+    if limiter is not None:
+        print(f"⚙️  Adaptive sending: {limiter.summary()}")
+    if len(SENDERS) > 1 and not enqueue:
+        print(f"🔑 Senders: {SENDERS.summary()}")
     
     if config.TEST_MODE:
         print(f"⚠️  TEST MODE was enabled")
@@ -206,10 +343,28 @@ def main():
 # ========================================
 
 if __name__ == "__main__":
-    if not BREVO_API_KEY:
+    parser = argparse.ArgumentParser(description="Bulk Email Sender via Brevo")
+    parser.add_argument("csv", nargs="?", default="form_response.csv", help="Form responses CSV")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="Queue emails in the shared outbox instead of sending now")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Send concurrently, adapting to Brevo latency/rate limits "
+                             "instead of SECONDS_BETWEEN_EMAILS")
+    parser.add_argument("--worker", action="store_true",
+                        help="Share the campaign with other --worker processes via a leased work queue")
+    parser.add_argument("--collect", action="store_true",
+                        help="Write work-queue results into the CSV's Mail Sent column")
+    parser.add_argument("--campaign", default=None,
+                        help="With --worker/--collect: work queue name (default: from subject, message and CSV)")
+    args = parser.parse_args()
+    if args.worker and (args.enqueue or args.adaptive):
+        parser.error("--worker cannot be combined with --enqueue or --adaptive")
+    
+    if not SENDERS and not (args.enqueue or args.collect):
         print("❌ Error: BREVO_API_KEY not set")
         print("   Set it in config.py OR as environment variable")
         sys.exit(1)
     
-    main()
+    main(args.csv, enqueue=args.enqueue, adaptive=args.adaptive,
+         worker=args.worker, collect=args.collect, campaign=args.campaign)
     print("\n✨ Done!")
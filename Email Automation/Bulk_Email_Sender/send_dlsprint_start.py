@@ -10,21 +10,34 @@ Usage:
 
 import os
 import sys
-import json
 import time
 import argparse
-import requests
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Load .env file from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+# Shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.records import load_team_emails
+from common.recipients import SuppressionList, clean_recipients
+from common.coalesce import POLICIES, plan_messages
+from common.brevo import MISSING_KEY_ERROR, SendResult
+from common.quota import QuotaScheduler
+from common.scheduling import parse_start, submit_scheduled
+from common.templates import ensure_template, template_params, template_payload
+from common.aimd import send_adaptive
+from common.breaker import CircuitBreaker
+from common.senders import SenderPool
+from common.events import message_tags
+
 # ========================================
 # CONFIGURATION
 # ========================================
 BREVO_API_KEY = os.getenv("BREVO_API_KEY", "").strip()
-BREVO_URL = "https://api.brevo.com/v3/smtp/email"
+CAMPAIGN = "dlsprint-start"  # Priority class in the shared outbox (common/quota.py)
+TEMPLATE_NAME = "dlsprint-online-start"  # Brevo template name for --use-template
 
 # Sender info
 FROM_EMAIL = "noreply@buetcsefest2026.com"
@@ -35,6 +48,15 @@ REPLY_TO_NAME = "DL Sprint 4.0"
 # Rate limiting
 SECONDS_BETWEEN_EMAILS = 0.5
 
+# Outage handling: after this many timeouts/5xx in a row, park the remaining
+# emails in the shared outbox for `python -m common.quota drain`
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_COOLDOWN = 30  # Seconds before a later send probes Brevo again
+# One or more Brevo keys (senders.json / BREVO_API_KEYS, see common/senders.py)
+SENDERS = SenderPool.from_env(BREVO_API_KEY)
+BREAKER = CircuitBreaker(CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_COOLDOWN,
+                         campaign=CAMPAIGN, send_fn=SENDERS.send)
+
 # Competition links - UPDATE THESE
 KAGGLE_LINK_1 = "https://www.kaggle.com/t/be8384727a28293dd012ee3ce5df9bac"
 KAGGLE_LINK_2 = "https://www.kaggle.com/t/fbf7ab57b50a41c59aae973a725b9a4f"
@@ -93,66 +115,106 @@ def now_iso() -> str:
     return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
 
 
-def send_email_with_cc(to_email: str, cc_emails: list, team_name: str) -> tuple[bool, str]:
-    """
-    Send email via Brevo API with CC recipients
-    
-    Args:
-        to_email: Primary recipient email address
-        cc_emails: List of CC email addresses
-        team_name: Team name
-    
-    Returns:
-        (success: bool, info: str) - info is messageId or error message
-    """
-    if not BREVO_API_KEY:
-        return False, "Missing BREVO_API_KEY"
+def body_values(team_name: str) -> dict:
+    """Values for the EMAIL_BODY placeholders"""
+    return {
+        "team_name": team_name,
+        "kaggle_link_1": KAGGLE_LINK_1,
+        "kaggle_link_2": KAGGLE_LINK_2,
+        "rulebook_link": RULEBOOK_LINK,
+    }
+
+
+def sync_template() -> int:
+    """Upload EMAIL_BODY to Brevo if it changed; returns the template id"""
+    return ensure_template(
+        TEMPLATE_NAME, SUBJECT, EMAIL_BODY,
+        sender={"name": FROM_NAME, "email": FROM_EMAIL},
+        reply_to={"name": REPLY_TO_NAME, "email": REPLY_TO_EMAIL},
+        api_key=BREVO_API_KEY,
+    )
+
+
+def build_payload(to_email: str, cc_emails: list, team_name: str, template_id: int = None) -> dict:
+    """Build the Brevo /v3/smtp/email payload for one team"""
+    if template_id is not None:
+        # Stored template: only the per-team params are sent
+        return template_payload(
+            template_id,
+            to=[{"email": to_email, "name": team_name}],
+            params=template_params(body_values(team_name), SUBJECT, EMAIL_BODY),
+            cc=[{"email": email} for email in cc_emails],
+            tags=message_tags(CAMPAIGN),
+        )
     
     # Build email body
-    body = EMAIL_BODY.format(
-        team_name=team_name,
-        kaggle_link_1=KAGGLE_LINK_1,
-        kaggle_link_2=KAGGLE_LINK_2,
-        rulebook_link=RULEBOOK_LINK
-    )
+    body = EMAIL_BODY.format(**body_values(team_name))
     
     payload = {
         "sender": {"name": FROM_NAME, "email": FROM_EMAIL},
         "to": [{"email": to_email, "name": team_name}],
         "replyTo": {"name": REPLY_TO_NAME, "email": REPLY_TO_EMAIL},
         "subject": SUBJECT,
-        "htmlContent": body
+        "htmlContent": body,
+        "tags": message_tags(CAMPAIGN),
     }
     
     # Add CC if there are additional members
     if cc_emails:
         payload["cc"] = [{"email": email} for email in cc_emails]
     
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "api-key": BREVO_API_KEY
-    }
+    return payload
+
+
+def send_email_with_cc(to_email: str, cc_emails: list, team_name: str,
+                       template_id: int = None) -> SendResult:
+    """
+    Send email via Brevo API with CC recipients
     
-    try:
-        r = requests.post(BREVO_URL, json=payload, headers=headers, timeout=30)
-        
-        if 200 <= r.status_code < 300:
-            msg_id = r.json().get("messageId", "OK")
-            return True, msg_id
-        else:
-            return False, f"HTTP {r.status_code}: {r.text}"
-    except Exception as e:
-        return False, str(e)
+    Args:
+        to_email: Primary recipient email address
+        cc_emails: List of CC email addresses
+        team_name: Team name
+        template_id: Stored Brevo template to use (--use-template), or None
+    
+    Returns:
+        SendResult - info is messageId or error message; queued is set when
+        Brevo was unavailable and the email was parked in the outbox instead
+    """
+    if not SENDERS:
+        return SendResult(False, MISSING_KEY_ERROR, None, 0.0)
+    
+    result = BREAKER.send(build_payload(to_email, cc_emails, team_name, template_id), BREVO_API_KEY)
+    return result
 
 
 def main():
     parser = argparse.ArgumentParser(description="DL Sprint 4.0 Online Round Start Notification")
     parser.add_argument("--test", action="store_true", help="Test mode: only send to test team")
+    parser.add_argument("--coalesce", choices=POLICIES, default="none",
+                        help="Merge emails for people on several teams (default: one email per team)")
+    parser.add_argument("--max-teams", type=int, default=None,
+                        help="With --coalesce: at most this many teams per merged email")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="Queue emails in the shared outbox instead of sending now")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Submit all emails now with Brevo scheduledAt times instead of sleeping between sends")
+    parser.add_argument("--start-at", default=None,
+                        help="With --schedule: ISO time of the first email (default: in 2 minutes)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Send concurrently, adapting to Brevo latency/rate limits "
+                             "instead of SECONDS_BETWEEN_EMAILS")
+    parser.add_argument("--use-template", action="store_true",
+                        help="Sync EMAIL_BODY to Brevo once and send only templateId + params")
     args = parser.parse_args()
+    if args.schedule and args.enqueue:
+        parser.error("--schedule and --enqueue cannot be combined")
+    
+    if (args.use_template or args.schedule) and len(SENDERS) > 1:
+        parser.error("--use-template/--schedule work on one Brevo account; use a single BREVO_API_KEY")
     
     # Check API key
-    if not BREVO_API_KEY:
+    if not SENDERS and (args.use_template or not args.enqueue):
         print("❌ ERROR: BREVO_API_KEY environment variable not set")
         sys.exit(1)
     
@@ -162,12 +224,11 @@ def main():
         print(f"❌ ERROR: {json_file} not found. Run generate_team_emails_json.py first.")
         sys.exit(1)
     
-    with open(json_file, 'r', encoding='utf-8') as f:
-        teams = json.load(f)
+    teams = load_team_emails(json_file)
     
     # Filter for test mode
     if args.test:
-        teams = [t for t in teams if t['team_name'] == TEST_TEAM_NAME]
+        teams = [t for t in teams if t.team_name == TEST_TEAM_NAME]
         if not teams:
             print(f"❌ ERROR: Test team '{TEST_TEAM_NAME}' not found in {json_file}")
             sys.exit(1)
@@ -186,46 +247,121 @@ def main():
     print(f"Teams to process: {len(teams)}")
     print(f"{'='*60}\n")
     
+    # Clean each team's recipients, then plan the API calls
+    suppression = SuppressionList.load()
+    cleaned = []
+    for team in teams:
+        # First email is TO, rest are CC (invalid/duplicate/suppressed dropped)
+        to, cc_emails, rejected = clean_recipients(team.emails[:1], team.emails[1:], suppression)
+        for email, reason in rejected:
+            print(f"⚠️  {team.team_name}: Dropped {reason} address '{email}'")
+        if not to:
+            print(f"⚠️  {team.team_name}: No emails found, skipping")
+            continue
+        cleaned.append((team.team_name, to + cc_emails))
+    
+    plan = plan_messages(cleaned, policy=args.coalesce, max_teams_per_message=args.max_teams)
+    plan.print_report()
+    messages = plan.messages
+    print()
+    
+    template_id = None
+    if args.use_template:
+        try:
+            template_id = sync_template()
+        except RuntimeError as e:
+            print(f"❌ ERROR: {e}")
+            sys.exit(1)
+    
+    if args.schedule:
+        # Brevo paces the campaign server-side, SECONDS_BETWEEN_EMAILS apart
+        payloads = [build_payload(m.to, list(m.cc), m.display_name, template_id) for m in messages]
+        try:
+            stats = submit_scheduled(payloads, BREVO_API_KEY, CAMPAIGN,
+                                     parse_start(args.start_at), SECONDS_BETWEEN_EMAILS)
+        except ValueError as e:
+            print(f"❌ ERROR: {e}")
+            sys.exit(1)
+        print(f"\n🗓  Scheduled: {stats['scheduled']}  ❌ Failed: {stats['failed']}")
+        print(f"Batch ID: {stats['batch_id']}")
+        print(f"Cancel/reschedule: python -m common.scheduling cancel --campaign {CAMPAIGN}")
+        return
+    
     # Stats
     success_count = 0
     fail_count = 0
+    parked_count = 0  # Parked in the outbox while Brevo was down
+    scheduler = QuotaScheduler() if args.enqueue else None
+    adaptive_jobs = []  # (team name, payload) sent after the loop with --adaptive
     
-    for i, team in enumerate(teams, 1):
-        team_name = team['team_name']
-        emails = team['emails']
+    for i, message in enumerate(messages, 1):
+        team_name = message.display_name
+        to_email = message.to
+        cc_emails = list(message.cc)
         
-        if not emails:
-            print(f"[{i}/{len(teams)}] ⚠️  {team_name}: No emails found, skipping")
-            continue
-        
-        # First email is TO, rest are CC
-        to_email = emails[0]
-        cc_emails = emails[1:] if len(emails) > 1 else []
-        
-        print(f"[{i}/{len(teams)}] 📤 {team_name}")
+        print(f"[{i}/{len(messages)}] 📤 {team_name}")
         print(f"    TO: {to_email}")
         if cc_emails:
             print(f"    CC: {', '.join(cc_emails)}")
         
-        success, info = send_email_with_cc(to_email, cc_emails, team_name)
+        if scheduler is not None:
+            outbox_id = scheduler.enqueue(CAMPAIGN, build_payload(to_email, cc_emails, team_name, template_id))
+            print(f"    📥 Queued in outbox (#{outbox_id})")
+            success_count += 1
+            continue
+        
+        if args.adaptive:
+            adaptive_jobs.append((team_name, build_payload(to_email, cc_emails, team_name, template_id)))
+            continue
         
-        if success:
-            print(f"    ✅ Sent (ID: {info})")
+        result = send_email_with_cc(to_email, cc_emails, team_name, template_id)
+        
+        if result.ok:
+            print(f"    ✅ Sent (ID: {result.info})")
             success_count += 1
+        elif result.queued is not None:
+            print(f"    ⏸  Brevo unavailable - queued for retry (#{result.queued})")
+            parked_count += 1
         else:
-            print(f"    ❌ Failed: {info}")
+            print(f"    ❌ Failed: {result.info}")
             fail_count += 1
         
-        # Rate limiting
-        if i < len(teams):
+        # Rate limiting (not needed while failing fast)
+        if i < len(messages) and result.latency:
             time.sleep(SECONDS_BETWEEN_EMAILS)
     
+    limiter = None
+    if adaptive_jobs:
+        def job_done(job, result):
+            nonlocal success_count, fail_count, parked_count
+            team_name, _ = job
+            if result.ok:
+                print(f"    ✅ {team_name}: Sent (ID: {result.info})")
+                success_count += 1
+            elif result.queued is not None:
+                print(f"    ⏸  {team_name}: Brevo unavailable - queued for retry (#{result.queued})")
+                parked_count += 1
+            else:
+                print(f"    ❌ {team_name}: Failed: {result.info}")
+                fail_count += 1
+        
+        print(f"\n🚀 Sending {len(adaptive_jobs)} email(s) with adaptive concurrency...")
+        limiter = send_adaptive(adaptive_jobs, lambda job: BREAKER.send(job[1], BREVO_API_KEY), job_done)
+    
     # Summary
     print(f"\n{'='*60}")
     print(f"SUMMARY")
     print(f"{'='*60}")
     print(f"✅ Successful: {success_count}")
     print(f"❌ Failed: {fail_count}")
+    if parked_count:
+        print(f"⏸  Queued for retry (Brevo unavailable): {parked_count} - "
+              f"run `python -m common.quota drain` later")
+    print(f"📉 API calls saved by coalescing: {plan.saved_calls}")
+    if limiter is not None:
+        print(f"⚙️  Adaptive sending: {limiter.summary()}")
+    if len(SENDERS) > 1 and not args.enqueue:
+        print(f"🔑 Senders: {SENDERS.summary()}")
     print(f"Finished at: {now_iso()}")
 
 
@@ -11,6 +11,7 @@ Usage:
     python send_to_new_teams.py --check     # Just show new teams (dry run)
     python send_to_new_teams.py --test      # Send only to test team
     python send_to_new_teams.py             # Send to all new teams
+    python send_to_new_teams.py --worker    # Share the sending with other --worker processes
 """
 
 import os
@@ -18,7 +19,6 @@ import sys
 import json
 import time
 import argparse
-import requests
 import pandas as pd
 from datetime import datetime, timezone
 from dotenv import load_dotenv
@@ -26,17 +26,27 @@ from dotenv import load_dotenv
 # Load .env file from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+# Shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.coalesce import POLICIES, plan_messages
+from common.recipients import SuppressionList, clean_recipients
+from common.brevo import MISSING_KEY_ERROR, SendResult
+from common.breaker import CircuitBreaker
+from common.senders import SenderPool
+from common.workqueue import WorkQueue, run_worker
+from common.events import message_tags
+
 # ========================================
 # FILE CONFIGURATION
 # ========================================
 CSV_FILE = "DL Sprint Team Registration Form (Responses) - Form responses 1_new.csv"
 SENT_LOG_FILE = "sent_teams.json"
+CAMPAIGN = "dlsprint-new-teams"  # Work queue name for --worker runs (common/workqueue.py)
 
 # ========================================
 # EMAIL CONFIGURATION
 # ========================================
 BREVO_API_KEY = os.getenv("BREVO_API_KEY", "").strip()
-BREVO_URL = "https://api.brevo.com/v3/smtp/email"
 
 FROM_EMAIL = "noreply@buetcsefest2026.com"
 FROM_NAME = "BUET CSE Fest 2026"
@@ -45,6 +55,15 @@ REPLY_TO_NAME = "DL Sprint 4.0"
 
 SECONDS_BETWEEN_EMAILS = 0.5
 
+# Outage handling: after this many timeouts/5xx in a row, park the remaining
+# emails in the shared outbox for `python -m common.quota drain`
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_COOLDOWN = 30  # Seconds before a later send probes Brevo again
+# One or more Brevo keys (senders.json / BREVO_API_KEYS, see common/senders.py)
+SENDERS = SenderPool.from_env(BREVO_API_KEY)
+BREAKER = CircuitBreaker(CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_COOLDOWN,
+                         campaign=CAMPAIGN, send_fn=SENDERS.send)
+
 # Competition links
 KAGGLE_LINK_1 = "https://www.kaggle.com/t/be8384727a28293dd012ee3ce5df9bac"
 KAGGLE_LINK_2 = "https://www.kaggle.com/t/fbf7ab57b50a41c59aae973a725b9a4f"
@@ -112,10 +131,25 @@ def load_sent_log():
 
 
 def save_sent_log(sent_log):
-    """Save the sent teams log"""
+    """Save the sent teams log (atomically: several workers may save it)"""
     sent_log["last_updated"] = now_iso()
-    with open(SENT_LOG_FILE, 'w', encoding='utf-8') as f:
+    tmp = f"{SENT_LOG_FILE}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
         json.dump(sent_log, f, indent=4, ensure_ascii=False)
+    os.replace(tmp, SENT_LOG_FILE)
+
+
+def merge_queue_into_sent_log(sent_log, queue):
+    """Add teams finished by any --worker process to the sent log; returns how many"""
+    added = 0
+    for key, status, _, _ in queue.results():
+        if status != "done":
+            continue
+        for team_name in json.loads(key):
+            if team_name not in sent_log["sent_teams"]:
+                sent_log["sent_teams"].append(team_name)
+                added += 1
+    return added
 
 
 def extract_teams_from_csv():
@@ -127,20 +161,26 @@ def extract_teams_from_csv():
     df = pd.read_csv(CSV_FILE)
     email_columns = [col for col in df.columns if 'Email' in col and col != 'Email address']
     
+    # Drop invalid and previously bounced addresses before any API call
+    suppression = SuppressionList.load()
     teams = []
     for idx, row in df.iterrows():
         team_name = row['Team Name']
-        emails = set()
+        # Column order, not a set: every --worker must build the same plan
+        emails = {}
         
         for col in email_columns:
             email = row[col]
             if pd.notna(email) and isinstance(email, str) and email.strip() and '@' in email:
-                emails.add(email.strip())
+                emails.setdefault(email.strip(), None)
         
-        if emails:
+        to, cc, rejected = clean_recipients(list(emails), suppression=suppression)
+        for email, reason in rejected:
+            print(f"⚠ {team_name}: dropped {reason} address '{email}'")
+        if to:
             teams.append({
                 "team_name": team_name,
-                "emails": list(emails)
+                "emails": to + cc
             })
     
     return teams
@@ -152,11 +192,8 @@ def get_new_teams(all_teams, sent_log):
     return [t for t in all_teams if t["team_name"] not in sent_team_names]
 
 
-def send_email_with_cc(to_email: str, cc_emails: list, team_name: str) -> tuple:
-    """Send email via Brevo API with CC recipients"""
-    if not BREVO_API_KEY:
-        return False, "Missing BREVO_API_KEY"
-    
+def build_payload(to_email: str, cc_emails: list, team_name: str) -> dict:
+    """Build the Brevo /v3/smtp/email payload for one team"""
     body = EMAIL_BODY.format(
         team_name=team_name,
         kaggle_link_1=KAGGLE_LINK_1,
@@ -169,26 +206,69 @@ def send_email_with_cc(to_email: str, cc_emails: list, team_name: str) -> tuple:
         "to": [{"email": to_email, "name": team_name}],
         "replyTo": {"name": REPLY_TO_NAME, "email": REPLY_TO_EMAIL},
         "subject": SUBJECT,
-        "htmlContent": body
+        "htmlContent": body,
+        "tags": message_tags(CAMPAIGN),
     }
     
     if cc_emails:
         payload["cc"] = [{"email": email} for email in cc_emails]
+    return payload
+
+
+def send_email_with_cc(to_email: str, cc_emails: list, team_name: str) -> SendResult:
+    """
+    Send email via Brevo API with CC recipients
     
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "api-key": BREVO_API_KEY
-    }
+    Returns:
+        SendResult - info is messageId or error message; queued is set when
+        Brevo was unavailable and the email was parked in the outbox instead
+    """
+    if not SENDERS:
+        return SendResult(False, MISSING_KEY_ERROR, None, 0.0)
+    return BREAKER.send(build_payload(to_email, cc_emails, team_name), BREVO_API_KEY)
+
+
+def send_as_worker(messages, sent_log):
+    """
+    Send the planned messages together with other --worker processes.
     
-    try:
-        r = requests.post(BREVO_URL, json=payload, headers=headers, timeout=30)
-        if 200 <= r.status_code < 300:
-            return True, r.json().get("messageId", "OK")
+    Every worker loads the same plan into the shared work queue (messages
+    already queued are skipped) and sends leased batches until none are left;
+    teams finished by any worker are then merged into the sent log.
+    """
+    queue = WorkQueue(CAMPAIGN)
+    added = queue.add(
+        (json.dumps(m.teams, ensure_ascii=False), build_payload(m.to, list(m.cc), m.display_name))
+        for m in messages
+    )
+    print(f"📦 Added {added} new message(s) to the work queue")
+
+    def done(key, payload, result):
+        print(f"📤 {payload['to'][0]['name']} <{payload['to'][0]['email']}>", end=" ")
+        if result.ok:
+            print(f"✅ Sent (ID: {result.info})")
+        elif result.queued is not None:
+            print(f"⏸  Brevo unavailable - queued for retry (#{result.queued})")
         else:
-            return False, f"HTTP {r.status_code}: {r.text}"
-    except Exception as e:
-        return False, str(e)
+            print(f"❌ Failed: {result.info}")
+
+    stats = run_worker(queue, lambda payload: BREAKER.send(payload, BREVO_API_KEY), done,
+                       delay=SECONDS_BETWEEN_EMAILS)
+
+    merged = merge_queue_into_sent_log(sent_log, queue)
+    if merged:
+        save_sent_log(sent_log)
+
+    print(f"\n{'='*60}")
+    print(f"📊 WORKER SUMMARY")
+    print(f"{'='*60}")
+    print(f"   ✅ Successful: {stats['sent']}")
+    print(f"   ❌ Failed: {stats['failed']}")
+    print(f"   ⏸  Retry later: {stats['retry']}")
+    print(f"   🔒 Batches: {stats['batches']} ({stats['lost']} lost to other workers)")
+    print(f"   📁 Tracking updated: {SENT_LOG_FILE} (+{merged} teams)")
+    print(f"   Finished at: {now_iso()}")
+    print(f"{'='*60}\n")
 
 
 # ========================================
@@ -199,10 +279,20 @@ def main():
     parser = argparse.ArgumentParser(description="Send DL Sprint emails to NEW teams only")
     parser.add_argument("--check", action="store_true", help="Just show new teams (dry run)")
     parser.add_argument("--test", action="store_true", help="Test mode: only send to test team")
+    parser.add_argument("--coalesce", choices=POLICIES, default="none",
+                        help="Merge emails for people on several teams (default: one email per team)")
+    parser.add_argument("--max-teams", type=int, default=None,
+                        help="With --coalesce: at most this many teams per merged email")
+    parser.add_argument("--worker", action="store_true",
+                        help="Share the sending with other --worker processes via a leased work queue")
+    parser.add_argument("--yes", action="store_true", help="Skip the confirmation prompt")
     args = parser.parse_args()
 
     # Load current state
     sent_log = load_sent_log()
+    if args.worker and merge_queue_into_sent_log(sent_log, WorkQueue(CAMPAIGN)):
+        # Teams another worker already finished count as sent
+        save_sent_log(sent_log)
     all_teams = extract_teams_from_csv()
     new_teams = get_new_teams(all_teams, sent_log)
 
@@ -244,14 +334,15 @@ def main():
         print(f"🧪 TEST MODE: Only sending to '{TEST_TEAM_NAME}'\n")
     else:
         # Confirmation for production
-        if not BREVO_API_KEY:
+        if not SENDERS:
             print("❌ ERROR: BREVO_API_KEY not set in environment")
             sys.exit(1)
         
-        confirm = input(f"📧 Send emails to {len(new_teams)} new teams? Type 'yes' to confirm: ")
-        if confirm.lower() != 'yes':
-            print("Aborted.")
-            return
+        if not args.yes:
+            confirm = input(f"📧 Send emails to {len(new_teams)} new teams? Type 'yes' to confirm: ")
+            if confirm.lower() != 'yes':
+                print("Aborted.")
+                return
 
     # Send emails
     print(f"\n{'='*60}")
@@ -259,37 +350,49 @@ def main():
     print(f"{'='*60}")
     print(f"Started at: {now_iso()}\n")
 
+    # Plan API calls (optionally one email per person across their teams)
+    plan = plan_messages([(t['team_name'], t['emails']) for t in new_teams],
+                         policy=args.coalesce, max_teams_per_message=args.max_teams)
+    plan.print_report()
+    messages = plan.messages
+    print()
+
+    if args.worker:
+        send_as_worker(messages, sent_log)
+        return
+
     success_count = 0
     fail_count = 0
+    parked_count = 0  # Parked in the outbox while Brevo was down
     successfully_sent_teams = []
 
-    for i, team in enumerate(new_teams, 1):
-        team_name = team['team_name']
-        emails = team['emails']
-
-        if not emails:
-            print(f"[{i}/{len(new_teams)}] ⚠️  {team_name}: No emails, skipping")
-            continue
-
-        to_email = emails[0]
-        cc_emails = emails[1:] if len(emails) > 1 else []
+    for i, message in enumerate(messages, 1):
+        team_name = message.display_name
+        to_email = message.to
+        cc_emails = list(message.cc)
 
-        print(f"[{i}/{len(new_teams)}] 📤 {team_name}")
+        print(f"[{i}/{len(messages)}] 📤 {team_name}")
         print(f"    TO: {to_email}")
         if cc_emails:
             print(f"    CC: {', '.join(cc_emails)}")
 
-        success, info = send_email_with_cc(to_email, cc_emails, team_name)
+        result = send_email_with_cc(to_email, cc_emails, team_name)
 
-        if success:
-            print(f"    ✅ Sent (ID: {info})")
+        if result.ok:
+            print(f"    ✅ Sent (ID: {result.info})")
             success_count += 1
-            successfully_sent_teams.append(team_name)
+            successfully_sent_teams.extend(message.teams)
+        elif result.queued is not None:
+            # The outbox drain delivers it - don't send it again next run
+            print(f"    ⏸  Brevo unavailable - queued for retry (#{result.queued})")
+            parked_count += 1
+            successfully_sent_teams.extend(message.teams)
         else:
-            print(f"    ❌ Failed: {info}")
+            print(f"    ❌ Failed: {result.info}")
             fail_count += 1
 
-        if i < len(new_teams):
+        # Rate limiting (not needed while failing fast)
+        if i < len(messages) and result.latency:
             time.sleep(SECONDS_BETWEEN_EMAILS)
 
     # Update sent log with successfully sent teams
@@ -306,6 +409,10 @@ def main():
     print(f"{'='*60}")
     print(f"   ✅ Successful: {success_count}")
     print(f"   ❌ Failed: {fail_count}")
+    if parked_count:
+        print(f"   ⏸  Queued for retry (Brevo unavailable): {parked_count} - "
+              f"run `python -m common.quota drain` later")
+    print(f"   📉 API calls saved by coalescing: {plan.saved_calls}")
     print(f"   📁 Tracking updated: {SENT_LOG_FILE}")
     print(f"   Finished at: {now_iso()}")
     print(f"{'='*60}\n")
@@ -5,9 +5,13 @@ Reads Final_Slot_With_Bkash.csv and merges payment details into the JSON file.
 """
 import argparse
 import csv
-import json
 import os
 import sys
+from pathlib import Path
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import jsonio
 
 
 def normalize_university_name(name):
@@ -33,28 +37,28 @@ def load_payment_info(csv_file, encoding='utf-8-sig'):
     return payment_map
 
 
-def add_payment_info(json_file, payment_map, output_file=None, encoding='utf-8'):
-    """Add payment info to each university in JSON."""
-    with open(json_file, 'r', encoding=encoding) as f:
-        data = json.load(f)
-    
+def add_payment_info(json_file, payment_map, output_file=None, encoding='utf-8', pretty=True):
+    """Add payment info to each university in JSON (streamed entry by entry)."""
     matched = 0
     unmatched = []
     
-    for entry in data:
-        uni = entry.get('university', '')
-        key = normalize_university_name(uni)
-        if key in payment_map:
-            entry['payment_info'] = payment_map[key]
-            matched += 1
-        else:
-            unmatched.append(uni)
+    def with_payment(entries):
+        nonlocal matched
+        for entry in entries:
+            uni = entry.get('university', '')
+            key = normalize_university_name(uni)
+            if key in payment_map:
+                entry['payment_info'] = payment_map[key]
+                matched += 1
+            else:
+                unmatched.append(uni)
+            yield entry
     
     target = output_file if output_file else json_file
-    with open(target, 'w', encoding=encoding) as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    total = jsonio.dump_array(with_payment(jsonio.iter_array(json_file, encoding=encoding)),
+                              target, pretty=pretty, encoding=encoding)
     
-    print(f'✓ Processed {len(data)} universities')
+    print(f'✓ Processed {total} universities')
     print(f'✓ Matched {matched} with payment info')
     if unmatched:
         print(f'⚠ {len(unmatched)} universities without payment info:')
@@ -74,6 +78,8 @@ def main(argv=None):
     p.add_argument('-o', '--out', help='Output JSON file (default: overwrite input)')
     p.add_argument('--csv-encoding', default='utf-8-sig', help='CSV encoding')
     p.add_argument('--json-encoding', default='utf-8', help='JSON encoding')
+    p.add_argument('--compact', action='store_true',
+                   help='Write compact JSON (for machine-only outputs)')
     args = p.parse_args(argv)
     
     if not os.path.isfile(args.csv):
@@ -86,7 +92,8 @@ def main(argv=None):
     payment_map = load_payment_info(args.csv, encoding=args.csv_encoding)
     print(f'✓ Loaded payment info for {len(payment_map)} universities from CSV')
     
-    return add_payment_info(args.json, payment_map, output_file=args.out, encoding=args.json_encoding)
+    return add_payment_info(args.json, payment_map, output_file=args.out,
+                            encoding=args.json_encoding, pretty=not args.compact)
 
 
 if __name__ == '__main__':
@@ -74,6 +74,12 @@ TEST_TO = "amimul.ehsan2001@gmail.com"
 # Paid plans: Can be faster, e.g., 0.1-0.3 seconds
 SECONDS_BETWEEN_EMAILS = 0.1
 
+# When Brevo is down (timeouts, 5xx), stop waiting after this many failures in a
+# row: remaining emails are queued in the shared outbox for
+# `python -m common.quota drain` (run it once Brevo is back)
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_COOLDOWN = 30  # Seconds before a later send probes Brevo again
+
 # ========================================
 # CSV COLUMN NAMES
 # ========================================
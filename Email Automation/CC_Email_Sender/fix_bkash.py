@@ -1,86 +1,130 @@
 #!/usr/bin/env python3
-"""Normalize Bkash numbers in a CSV.
+"""Normalize phone numbers and emails in a CSV.
 
-Finds a column whose header contains 'bkash' (case-insensitive) and ensures
-numbers that are 10 digits become 11 digits by prepending a leading '0'.
-Writes to a new file by default, or overwrites in place with `--inplace`.
+Every column whose header mentions bkash, mobile or phone (but not name) is
+normalized to an 11-digit Bangladeshi number ('01XXXXXXXXX', from +880 / 880 /
+10-digit forms), and every column whose header mentions email is stripped and
+lowercased - address by address when a cell lists several ('a@x.edu; b@y.edu').
+Values that can't be normalized are left as they are and counted.
+
+The file is streamed in chunks with vectorized string operations, so large
+exports never sit in memory as Python rows. Writes to a new file by default,
+or overwrites in place with `--inplace`; either way the output only replaces
+its target once it is complete.
 """
 import argparse
-import csv
 import os
-import re
 import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.contacts import normalize_phone_series
+from common.recipients import normalize_series, valid_mask
+
+PHONE_WORDS = ('bkash', 'mobile', 'phone')
+NOT_PHONE_WORDS = ('name', 'email')  # e.g. 'Bkash Account Name'
+EMAIL_WORDS = ('email',)
+
+EMAIL_SEPARATORS = r'[;,]'  # between the addresses of one cell, e.g. 'Coach Emails (CC)'
+
+CHUNK_SIZE = 50_000
+
+
+def find_columns(headers, words, exclude=()):
+    """Headers containing any of the words and none of exclude (case-insensitive)."""
+    return [h for h in headers
+            if any(w in str(h).lower() for w in words)
+            and not any(x in str(h).lower() for x in exclude)]
 
 
-def normalize_bkash(value):
-    if value is None:
-        return ""
-    s = str(value).strip()
-    if s == "":
-        return s
-    digits = re.sub(r'\D', '', s)
-    if digits == "":
-        return s
-    if len(digits) == 10:
-        return '0' + digits
-    # keep 11-digit values as-is; leave other lengths unchanged but return digits
-    if len(digits) == 11:
-        return digits
-    return digits
-
-
-def find_bkash_index(headers):
-    for i, h in enumerate(headers):
-        if h and 'bkash' in h.lower():
-            return i
-    return None
-
-
-def process(infile, outfile, inplace=False, encoding='utf-8-sig'):
-    with open(infile, newline='', encoding=encoding) as inf:
-        reader = csv.reader(inf)
-        rows = list(reader)
-    if not rows:
+def normalize_phones(cells):
+    """(normalized cells, mask of cells that could be normalized)."""
+    new = normalize_phone_series(cells)
+    return new, new != ''
+
+
+def normalize_emails(cells):
+    """(normalized cells, mask of cells whose addresses are all valid).
+
+    Cells may hold several addresses; their separator style is kept.
+    """
+    parts = normalize_series(cells.str.split(EMAIL_SEPARATORS, regex=True).explode())
+    parts = parts[parts != '']
+    ok = valid_mask(parts).groupby(level=0).all().reindex(cells.index, fill_value=False)
+    grouped = parts.groupby(level=0)
+    new = grouped.agg(', '.join).where(~cells.str.contains(';'), grouped.agg('; '.join))
+    return new.reindex(cells.index, fill_value=''), ok
+
+
+def normalize_chunk(chunk, phone_cols, email_cols, stats):
+    """Normalize columns of one chunk in place, counting changes per column."""
+    for cols, normalize in ((phone_cols, normalize_phones), (email_cols, normalize_emails)):
+        for col in cols:
+            old = chunk[col]
+            new, ok = normalize(old)
+            new = new.where(ok, old)
+            stats[col]['changed'] += int((new != old).sum())
+            stats[col]['invalid'] += int((~ok & (old.str.strip() != '')).sum())
+            chunk[col] = new
+    return chunk
+
+
+def process(infile, outfile, inplace=False, encoding='utf-8-sig', columns=None,
+            chunk_size=CHUNK_SIZE):
+    headers = list(pd.read_csv(infile, nrows=0, encoding=encoding).columns)
+    if not headers:
         print('Input CSV is empty')
         return 1
-    headers = rows[0]
-    idx = find_bkash_index(headers)
-    if idx is None:
-        print("No column containing 'bkash' found in headers:", headers)
+    if columns:
+        missing = [c for c in columns if c not in headers]
+        if missing:
+            print('Columns not found in headers:', missing)
+            return 2
+        email_cols = find_columns(columns, EMAIL_WORDS)
+        phone_cols = [c for c in columns if c not in email_cols]
+    else:
+        phone_cols = find_columns(headers, PHONE_WORDS, NOT_PHONE_WORDS)
+        email_cols = find_columns(headers, EMAIL_WORDS)
+    if not phone_cols and not email_cols:
+        print("No phone (bkash/mobile/phone) or email column found in headers:", headers)
         return 2
 
-    changed = 0
+    stats = {col: {'changed': 0, 'invalid': 0} for col in phone_cols + email_cols}
     total = 0
-    for r in rows[1:]:
-        total += 1
-        # ensure row has enough columns
-        if idx >= len(r):
-            # extend row if needed
-            r += [''] * (idx - len(r) + 1)
-        old = r[idx]
-        new = normalize_bkash(old)
-        if new != old:
-            r[idx] = new
-            changed += 1
-
     target = infile if inplace else outfile
-    # write
     tmp = target + '.tmp'
-    with open(tmp, 'w', newline='', encoding=encoding) as outf:
-        writer = csv.writer(outf)
-        writer.writerows(rows)
+    try:
+        with open(tmp, 'w', newline='', encoding=encoding) as outf:
+            # Keep every cell as text: no NaN for blanks, no floats for numbers
+            reader = pd.read_csv(infile, dtype=str, keep_default_na=False,
+                                 encoding=encoding, chunksize=chunk_size)
+            for i, chunk in enumerate(reader):
+                total += len(chunk)
+                normalize_chunk(chunk, phone_cols, email_cols, stats)
+                # CRLF rows, as csv.writer wrote them
+                chunk.to_csv(outf, index=False, header=(i == 0), lineterminator='\r\n')
+    except BaseException:
+        os.remove(tmp)
+        raise
     os.replace(tmp, target)
 
-    print(f'Processed {infile}: total rows={total}, changed={changed}, written to {target}')
+    print(f'Processed {infile}: total rows={total}, written to {target}')
+    for col, s in stats.items():
+        print(f"  - {col}: changed={s['changed']}, not normalizable={s['invalid']}")
     return 0
 
 
 def main(argv=None):
-    p = argparse.ArgumentParser(description='Normalize Bkash numbers in CSV')
+    p = argparse.ArgumentParser(description='Normalize phone numbers and emails in CSV')
     p.add_argument('input', nargs='?', default='Final_Slot_With_Bkash.csv', help='Input CSV file')
     p.add_argument('-o', '--out', default='Final_Slot_With_Bkash_fixed.csv', help='Output CSV file (ignored if --inplace)')
     p.add_argument('--inplace', action='store_true', help='Replace the input file with the fixed file')
     p.add_argument('--encoding', default='utf-8-sig', help='File encoding to use')
+    p.add_argument('--columns', nargs='+', help='Only these columns (default: detect by header)')
+    p.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per chunk')
     args = p.parse_args(argv)
 
     infile = args.input
@@ -88,7 +132,8 @@ def main(argv=None):
     if not os.path.isfile(infile):
         print('Input file not found:', infile)
         return 3
-    return process(infile, outfile, inplace=args.inplace, encoding=args.encoding)
+    return process(infile, outfile, inplace=args.inplace, encoding=args.encoding,
+                   columns=args.columns, chunk_size=args.chunk_size)
 
 
 if __name__ == '__main__':
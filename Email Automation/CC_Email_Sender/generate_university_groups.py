@@ -4,12 +4,19 @@ Generate university_teams.json from BUET IUPC registration CSV
 Run this script whenever the CSV is updated with new responses
 """
 
+import argparse
 import pandas as pd
 import json
 import re
+import sys
 from collections import defaultdict
 from pathlib import Path
 
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import jsonio
+from common.contacts import contact_keys, find_member_conflicts, link_groups, report_conflicts
+
 def normalize_university_name(name):
     """Normalize university name for grouping"""
     if pd.isna(name):
@@ -49,11 +56,43 @@ def normalize_university_name(name):
     
     return normalized
 
-def generate_university_groups():
+def consolidate_universities(university_groups, memberships):
+    """
+    Merge university groups whose registrations share a coach email or phone.
+    
+    Each set of linked spellings is folded into the group with the most
+    teams (first seen on ties). Returns one report row per merged set.
+    """
+    components, shared = link_groups(memberships)
+    report = []
+    for component in components:
+        canonical = max(component, key=lambda g: len(university_groups[g]['teams']))
+        target = university_groups[canonical]
+        spellings = []
+        for group in component:
+            if group == canonical:
+                continue
+            data = university_groups.pop(group)
+            spellings.append(data['original_name'])
+            target['teams'].extend(data['teams'])
+            target['coach_emails'] |= data['coach_emails']
+        members = set(component)
+        report.append({
+            'University': target['original_name'],
+            'Merged Spellings': '; '.join(spellings),
+            'Team Count': len(target['teams']),
+            'Linked By': '; '.join(sorted(k for k, groups in shared.items() if groups & members)),
+        })
+    return report
+
+
+def generate_university_groups(consolidate=True):
     # File paths
     csv_file = 'BUET IUPC 2026 – Preliminary  Registration (Responses) - Form responses 1.csv'
     output_json = 'university_teams.json'
     output_csv = 'university_groups.csv'
+    output_merges = 'university_merges.csv'
+    output_conflicts = 'member_conflicts.csv'
     
     # Check if CSV exists
     if not Path(csv_file).exists():
@@ -68,6 +107,10 @@ def generate_university_groups():
     university_col = 'Full Name of the University (Or IOI)'
     team_col = 'Team Name'
     coach_email_col = 'Coach Email'
+    coach_phone_col = 'Coach Mobile No. (11 digits)'
+    
+    # Members listed on several registrations (same email or mobile)
+    report_conflicts(find_member_conflicts(df, team_col), output_conflicts)
     
     # Create a dictionary grouped by university
     # Keep track of original university names for display
@@ -76,6 +119,7 @@ def generate_university_groups():
         'coach_emails': set(),
         'original_name': None
     })
+    memberships = []  # (normalized university, coach contact keys) per row
     
     # Process each row
     for _, row in df.iterrows():
@@ -96,6 +140,18 @@ def generate_university_groups():
                     'coach_email': coach_email
                 })
                 university_groups[normalized_uni]['coach_emails'].add(coach_email)
+                memberships.append((normalized_uni,
+                                    contact_keys(coach_email, row.get(coach_phone_col))))
+    
+    # Different spellings of one university share their coach's email/phone
+    if consolidate:
+        merges = consolidate_universities(university_groups, memberships)
+        pd.DataFrame(merges, columns=['University', 'Merged Spellings', 'Team Count', 'Linked By']
+                     ).to_csv(output_merges, index=False, encoding='utf-8')
+        print(f"✓ Consolidated {len(merges)} universities registered under several names "
+              f"(review {output_merges})")
+        for merge in merges:
+            print(f"  - {merge['University']} <- {merge['Merged Spellings']}")
     
     # Convert to list format for JSON
     result = []
@@ -107,9 +163,8 @@ def generate_university_groups():
             'teams': data['teams']
         })
     
-    # Save as JSON
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    # Save as JSON (reviewed by hand - keep it pretty)
+    jsonio.dump_array(result, output_json, pretty=True, indent=2)
     
     print(f"\n✓ Created {output_json}")
     print(f"  - {len(result)} universities")
@@ -137,4 +192,8 @@ def generate_university_groups():
     return result
 
 if __name__ == '__main__':
-    generate_university_groups()
+    parser = argparse.ArgumentParser(description='Group IUPC registrations by university')
+    parser.add_argument('--no-consolidate', action='store_true',
+                        help="Don't merge spellings that share a coach email or phone")
+    args = parser.parse_args()
+    generate_university_groups(consolidate=not args.no_consolidate)
@@ -27,6 +27,9 @@ REPLY_TO_NAME = "IUPC Organizing Team"
 # ========================================
 SUBJECT = "BUET IUPC 2026 – Slot Allocation & Payment Instructions for {university}"
 
+# Put in front of the subject by --correction (resend of changed emails only)
+CORRECTION_PREFIX = "[Correction] "
+
 # Email body template
 # Available variables: 
 #   {university} - University name
@@ -37,6 +40,8 @@ SUBJECT = "BUET IUPC 2026 – Slot Allocation & Payment Instructions for {univer
 #   {account_holder_name} - Bkash account holder name (optional)
 #   {total_amount} - Total payment amount (5500 × allocated_slots)
 #   {per_team_amount} - Per team amount (5500 BDT)
+#   {deadline} - Payment deadline: CONFIRMATION_DEADLINE, or WAITLIST_PAYMENT_HOURS
+#                after the university got its slots from the waitlist
 
 BODY_TEXT_TEMPLATE = """\
 Dear Coaches,
@@ -91,7 +96,7 @@ Required information (per team):
 
 ⚠️ NOTE: Each team must submit this form separately with their own transaction ID.
 
-⏰ DEADLINE: 26 January 2026, 11:55 PM (for all teams)
+⏰ DEADLINE: {deadline} (for all teams)
 
 STEP 4: Teams Can Verify Payment Acknowledgement
 After submitting the form, teams can check the payment acknowledgement in our tracking sheet:
@@ -211,7 +216,7 @@ BODY_HTML_TEMPLATE = """\
             </div>
             
             <div class="deadline">
-                ⏰ DEADLINE: 26 January 2026, 11:55 PM (for all teams)
+                ⏰ DEADLINE: {deadline} (for all teams)
             </div>
             
             <div class="step-box">
@@ -246,6 +251,60 @@ BODY_HTML_TEMPLATE = """\
 # ========================================
 PER_TEAM_AMOUNT = 5500  # BDT per team
 
+# Teams not confirmed and paid by then lose their slots to the waitlist
+# (waitlist.py --unpaid); shown as {deadline} in the templates
+CONFIRMATION_DEADLINE = "2026-01-26 23:55"
+
+# Universities given slots from the waitlist (waitlist.py) get this long from
+# the grant to pay, if that ends after CONFIRMATION_DEADLINE
+WAITLIST_PAYMENT_HOURS = 48
+
+# ========================================
+# RELEASE NOTICE
+# ========================================
+# Sent by send_slot_emails.py --only slot_changes.csv to universities whose
+# slots dropped to zero (declined, or unpaid by the deadline)
+RELEASE_SUBJECT = "BUET IUPC 2026 – Slot Release Notice for {university}"
+
+# {reason} comes from RELEASE_REASONS by the Reason column of slot_changes.csv
+RELEASE_REASONS = {
+    'Declined': 'as you informed us that your teams will not take part in the final round',
+    'Unpaid': 'as the registration fee was not received by the payment deadline',
+}
+
+RELEASE_BODY_TEXT_TEMPLATE = """\
+Dear Coaches,
+
+Greetings from BUET IUPC 2026!
+
+This is to inform you that the {old_slots} slot(s) allocated to {university} for the final round of BUET IUPC 2026 have been released, {reason}. The slots have been offered to other universities on the waitlist.
+
+If you believe this is a mistake, please contact us at {contact_email} as soon as possible.
+
+Best regards,
+BUET IUPC 2026 Organizing Committee
+BUET CSE Fest 2026
+
+Contact: {contact_email}
+Website: https://buetcsefest2026.com
+"""
+
+RELEASE_BODY_HTML_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <p>Dear Coaches,</p>
+    <p>Greetings from BUET IUPC 2026!</p>
+    <p>This is to inform you that the <strong>{old_slots} slot(s)</strong> allocated to <strong>{university}</strong> for the final round of BUET IUPC 2026 have been released, {reason}. The slots have been offered to other universities on the waitlist.</p>
+    <p>If you believe this is a mistake, please contact us at <a href="mailto:{contact_email}">{contact_email}</a> as soon as possible.</p>
+    <p><strong>Best regards,</strong><br>
+    BUET IUPC 2026 Organizing Committee<br>
+    BUET CSE Fest 2026</p>
+    <p><strong>🌐 Website:</strong> <a href="https://buetcsefest2026.com">buetcsefest2026.com</a></p>
+</body>
+</html>
+"""
+
 # ========================================
 # GLOBAL CC RECIPIENTS
 # ========================================
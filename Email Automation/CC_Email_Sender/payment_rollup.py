@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Running per-university payment totals for the acknowledgement sheet.
+
+Re-aggregating every payment of every university on each refresh does work
+proportional to all payments, even when one team just paid. PaymentRollup
+keeps the totals instead - paid teams against ``allocated_slots``, received
+and outstanding amount, open issues - and applies each acknowledgement row as
+a delta: the row's old contribution is taken back and the new one added, so a
+new or changed row costs O(1) whatever the number of payments.
+
+Universities whose totals or rows changed are marked dirty, and only their
+exports are rewritten:
+- payment_ack/<University>.csv, one file per university
+- optionally one XLSX workbook (--xlsx) with a Summary sheet and one sheet per
+  university; needs openpyxl (pip install openpyxl)
+
+Universities no longer in the JSON, or left without slots, are dropped from
+the totals and their exports are deleted.
+
+The state lives in payment_rollup.json next to the exports, so the next run
+starts from the totals of the last one.
+
+reconcile_payments.py feeds the rollup after every reconciliation; run this
+script directly to re-export from the stored state, e.g. after editing
+allocated_slots:
+    python payment_rollup.py [--xlsx payment_acknowledgement.xlsx] [--all]
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+from pathlib import Path
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import jsonio
+from common.records import load_universities
+from iupc_slot_config import PER_TEAM_AMOUNT
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+DEFAULT_STATE = 'payment_rollup.json'
+DEFAULT_EXPORT_DIR = 'payment_ack'
+
+# Statuses, as written by reconcile_payments.py
+VERIFIED = 'Verified'
+PENDING = 'Pending'
+
+ROW_COLUMNS = ['TrxID', 'Team Name', 'Paid To', 'Amount', 'Status', 'Note',
+               'Submitted At', 'Updated At']
+SUMMARY_COLUMNS = ['University', 'Allocated Slots', 'Paid Teams', 'Expected Amount',
+                   'Received Amount', 'Outstanding Amount', 'Missing Payments', 'Issues']
+
+_UNSAFE_NAME = re.compile(r'[^\w\- ]+')
+
+
+def ack_key(row):
+    """Identity of an acknowledgement row: a TrxID claimed by two teams gives two rows."""
+    return f"{row['TrxID']}|{row['Team Name'].casefold()}"
+
+
+def contribution(row):
+    """(paid teams, received amount, issues) one acknowledgement row adds to its university."""
+    status = row['Status']
+    if status == VERIFIED:
+        return 1, float(row['Amount'] or 0), 0
+    return 0, 0.0, 0 if status == PENDING else 1
+
+
+def _amount(value):
+    """Whole taka as int (5500, not 5500.0), so sheets show plain numbers."""
+    return int(value) if float(value).is_integer() else round(value, 2)
+
+
+def _file_name(university, limit=None):
+    name = _UNSAFE_NAME.sub('_', university).strip() or 'university'
+    return name[:limit] if limit else name
+
+
+class PaymentRollup:
+    """Per-university payment totals, updated one acknowledgement row at a time."""
+
+    def __init__(self, universities, per_team_amount=PER_TEAM_AMOUNT, state=None):
+        state = state or {}
+        self.per_team_amount = per_team_amount
+        self.rows = state.get('rows', {})      # university -> {ack key: row}
+        self.totals = state.get('totals', {})  # university -> running totals
+        self.dirty = set()
+        self.dropped = set()  # universities whose exports must be deleted
+
+        # Slots come from the JSON every run: an edited allocation only
+        # dirties the universities whose slots changed
+        current = set()
+        for uni in universities:
+            if not uni.slots:
+                continue
+            current.add(uni.university)
+            totals = self.totals.setdefault(
+                uni.university, {'slots': uni.slots, 'paid': 0, 'received': 0.0, 'issues': 0})
+            self.rows.setdefault(uni.university, {})
+            if totals['slots'] != uni.slots:
+                totals['slots'] = uni.slots
+                self.dirty.add(uni.university)
+
+        # Universities no longer in the list (or left without slots) leave the
+        # summary; the next sync re-adds their rows if they come back
+        for university in [u for u in self.totals if u not in current]:
+            self.totals.pop(university, None)
+            self.rows.pop(university, None)
+            self.dropped.add(university)
+        self.owner = {key: uni for uni, rows in self.rows.items() for key in rows}
+
+    @classmethod
+    def load(cls, universities, path=DEFAULT_STATE, per_team_amount=PER_TEAM_AMOUNT):
+        state = jsonio.load(path) if os.path.exists(path) else None
+        if state and state.get('per_team_amount') != per_team_amount:
+            state = None  # amounts no longer comparable: rebuild from the next sync
+        rollup = cls(universities, per_team_amount, state)
+        if state is None:
+            rollup.dirty.update(rollup.totals)
+        return rollup
+
+    def save(self, path=DEFAULT_STATE):
+        jsonio.dump({'per_team_amount': self.per_team_amount,
+                     'totals': self.totals, 'rows': self.rows}, path, pretty=False)
+
+    # ----------------------------------------
+    # Deltas
+    # ----------------------------------------
+
+    def _add(self, university, row, sign):
+        totals = self.totals.get(university)
+        if totals is None:
+            return  # unknown university or no allocated slots
+        paid, received, issues = contribution(row)
+        totals['paid'] += sign * paid
+        totals['received'] += sign * received
+        totals['issues'] += sign * issues
+        self.dirty.add(university)
+
+    def apply(self, row):
+        """Add or update one acknowledgement row; returns True if anything changed."""
+        key = ack_key(row)
+        university = row['University']
+        old_university = self.owner.get(key)
+        if old_university is not None:
+            old = self.rows[old_university][key]
+            if old_university == university and all(
+                    str(old.get(c, '')) == str(row.get(c, '')) for c in ROW_COLUMNS if c != 'Updated At'):
+                return False
+            self.remove(key)
+        self._add(university, row, +1)
+        self.rows.setdefault(university, {})[key] = {c: row.get(c, '') for c in ROW_COLUMNS}
+        self.owner[key] = university
+        self.dirty.add(university)
+        return True
+
+    def remove(self, key):
+        """Take back a row that is no longer in the sheet."""
+        university = self.owner.pop(key, None)
+        if university is None:
+            return
+        self._add(university, self.rows[university].pop(key), -1)
+        self.dirty.add(university)
+
+    def sync(self, rows):
+        """Apply a full set of acknowledgement rows; returns the number of changed rows."""
+        changed = 0
+        keys = set()
+        for row in rows:
+            keys.add(ack_key(row))
+            changed += self.apply(row)
+        for key in [k for k in self.owner if k not in keys]:
+            self.remove(key)
+            changed += 1
+        return changed
+
+    # ----------------------------------------
+    # Exports
+    # ----------------------------------------
+
+    def summary_row(self, university):
+        t = self.totals[university]
+        expected = t['slots'] * self.per_team_amount
+        return {
+            'University': university,
+            'Allocated Slots': t['slots'],
+            'Paid Teams': t['paid'],
+            'Expected Amount': expected,
+            'Received Amount': _amount(t['received']),
+            'Outstanding Amount': _amount(max(expected - t['received'], 0)),
+            'Missing Payments': max(t['slots'] - t['paid'], 0),
+            'Issues': t['issues'],
+        }
+
+    def summary(self):
+        return [self.summary_row(u) for u in self.totals]
+
+    def export_csv(self, out_dir=DEFAULT_EXPORT_DIR, everything=False):
+        """Rewrite payment_ack/<University>.csv for dirty universities; returns how many."""
+        os.makedirs(out_dir, exist_ok=True)
+        for university in self.dropped:
+            path = os.path.join(out_dir, f"{_file_name(university)}.csv")
+            if os.path.exists(path):
+                os.remove(path)
+        written = 0
+        for university in (self.totals if everything else sorted(self.dirty)):
+            if university not in self.totals:
+                continue
+            path = os.path.join(out_dir, f"{_file_name(university)}.csv")
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                for name, value in self.summary_row(university).items():
+                    writer.writerow([name, value])
+                writer.writerow([])
+                writer.writerow(ROW_COLUMNS)
+                for row in self.rows.get(university, {}).values():
+                    writer.writerow([row.get(c, '') for c in ROW_COLUMNS])
+            os.replace(tmp, path)
+            written += 1
+        return written
+
+    def export_xlsx(self, path, everything=False):
+        """Update the Summary sheet and the sheets of dirty universities; returns how many."""
+        if openpyxl is None:
+            print("⚠ openpyxl not installed, skipping XLSX export. Install with: pip install openpyxl")
+            return 0
+        if os.path.exists(path) and not everything:
+            wb = openpyxl.load_workbook(path)
+            targets = sorted(self.dirty)
+        else:
+            wb = openpyxl.Workbook()
+            wb.active.title = 'Summary'
+            targets = list(self.totals)
+
+        for university in self.dropped:
+            title = _file_name(university, limit=31)
+            if title in wb.sheetnames:
+                del wb[title]
+
+        summary = wb['Summary']
+        summary.delete_rows(1, summary.max_row)
+        summary.append(SUMMARY_COLUMNS)
+        for row in self.summary():
+            summary.append([row[c] for c in SUMMARY_COLUMNS])
+
+        written = 0
+        for university in targets:
+            if university not in self.totals:
+                continue
+            title = _file_name(university, limit=31)  # Excel sheet name limit
+            if title in wb.sheetnames:
+                del wb[title]
+            sheet = wb.create_sheet(title)
+            sheet.append(ROW_COLUMNS)
+            for row in self.rows.get(university, {}).values():
+                sheet.append([row.get(c, '') for c in ROW_COLUMNS])
+            written += 1
+
+        tmp = f"{path}.tmp"
+        wb.save(tmp)
+        os.replace(tmp, path)
+        return written
+
+    def write_summary(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.summary())
+        os.replace(tmp, path)
+
+
+def export(rollup, summary_path='payment_summary.csv', out_dir=DEFAULT_EXPORT_DIR,
+           xlsx=None, everything=False, state_path=DEFAULT_STATE):
+    """Write the summary and the changed per-university exports, then save the state."""
+    rollup.write_summary(summary_path)
+    written = rollup.export_csv(out_dir, everything)
+    print(f"✓ {summary_path}; {written} university file(s) rewritten in {out_dir}/")
+    if xlsx:
+        sheets = rollup.export_xlsx(xlsx, everything)
+        print(f"✓ {xlsx}: {sheets} university sheet(s) rewritten")
+    rollup.dirty.clear()
+    rollup.dropped.clear()
+    rollup.save(state_path)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Re-export payment totals from the stored rollup')
+    p.add_argument('--json', default='university_teams_with_payment.json',
+                   help='University JSON with allocated_slots')
+    p.add_argument('--state', default=DEFAULT_STATE, help='Rollup state file')
+    p.add_argument('--summary', default='payment_summary.csv', help='Per-university summary')
+    p.add_argument('--out-dir', default=DEFAULT_EXPORT_DIR, help='Per-university CSV folder')
+    p.add_argument('--xlsx', help='Also maintain this XLSX workbook')
+    p.add_argument('--all', action='store_true', help='Rewrite every university, not just changed ones')
+    args = p.parse_args(argv)
+
+    rollup = PaymentRollup.load(load_universities(args.json), args.state)
+    export(rollup, args.summary, args.out_dir, args.xlsx, args.all, args.state)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Reconcile bKash payments against Team Information Form submissions.
+
+Teams pay PER_TEAM_AMOUNT each to their university's bKash number and submit
+the TrxID in the Team Information Form. This script joins the form responses
+with bKash statement exports on TrxID (one dict lookup per submission), checks
+the receiving number against ``payment_info.bkash_account`` and the amount
+against PER_TEAM_AMOUNT, and rolls the verified payments up per university
+against ``allocated_slots``.
+
+Outputs:
+- payment_acknowledgement.csv: one row per submission with its status. Rows
+  already in the sheet keep their place and are updated; new submissions are
+  appended, so a team's row never moves between refreshes.
+- payment_summary.csv and payment_ack/<University>.csv: per university paid
+  teams, expected/received amount, outstanding amount and missing payments,
+  kept as running totals by payment_rollup.py (only changed universities
+  are rewritten).
+- unmatched_payments.csv: statement transactions no submission claimed.
+
+A statement export without a receiving-number column belongs to one bKash
+account; pass it as NUMBER=FILE.
+
+Usage:
+    python reconcile_payments.py --form team_info.csv --statement statement.csv
+    python reconcile_payments.py --form team_info.csv --statement 01840574730=statement.csv
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.contacts import normalize_phone
+from common.records import load_universities
+from generate_university_groups import normalize_university_name
+from iupc_slot_config import PER_TEAM_AMOUNT
+from payment_rollup import DEFAULT_EXPORT_DIR, DEFAULT_STATE, PaymentRollup, ack_key, export
+
+# Submission statuses
+VERIFIED = 'Verified'
+PENDING = 'Pending'                  # TrxID not in any statement (yet)
+DUPLICATE = 'Duplicate TrxID'        # TrxID already claimed by another submission
+WRONG_NUMBER = 'Wrong bKash number'  # paid to a number not assigned to the university
+AMOUNT_MISMATCH = 'Amount mismatch'
+REFUNDED = 'Refunded'                # the statement also has a reversal of this TrxID
+UNKNOWN_UNIVERSITY = 'Unknown university'
+
+ACK_COLUMNS = ['TrxID', 'Team Name', 'University', 'Paid To', 'Amount', 'Status', 'Note',
+               'Submitted At', 'Updated At']
+UNMATCHED_COLUMNS = ['TrxID', 'Paid To', 'Amount', 'Time', 'Reference']
+
+_AMOUNT = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+
+def normalize_trx(value):
+    """TrxIDs are compared uppercase without spaces."""
+    return ''.join(str(value or '').split()).upper()
+
+
+def parse_amount(value):
+    """'5,500.00' / '৳5500' / 'Tk. 5500' -> 5500.0; '-5500' / '(5,500)' -> -5500.0; unparseable -> None.
+
+    The sign is kept so that refunds and reversals never pass as payments.
+    """
+    text = str(value or '').strip()
+    match = _AMOUNT.search(text)
+    if match is None:
+        return None
+    amount = float(match.group().replace(',', ''))
+    negative = ('-' in text[:match.start()] or '\u2212' in text[:match.start()]
+                or (text.startswith('(') and text.endswith(')')))
+    return -amount if negative else amount
+
+
+def find_column(columns, *words, exclude=()):
+    """First header containing all words and none of exclude (case-insensitive)."""
+    for col in columns:
+        name = str(col).lower()
+        if all(w in name for w in words) and not any(x in name for x in exclude):
+            return col
+    return None
+
+
+def trx_column(columns):
+    return (find_column(columns, 'trx') or find_column(columns, 'transaction', 'id')
+            or find_column(columns, 'transaction'))
+
+
+# ========================================
+# LOADING
+# ========================================
+
+def load_statement(spec, encoding='utf-8-sig'):
+    """
+    Transactions of one statement export as dicts.
+
+    spec is FILE, or NUMBER=FILE when the export has no receiving-number column.
+    """
+    account = None
+    path = spec
+    if '=' in spec and not os.path.exists(spec):
+        account, path = spec.split('=', 1)
+        account = normalize_phone(account)
+        if not account:
+            raise SystemExit(f"❌ Error: Invalid bKash number in '{spec}'")
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding=encoding)
+    cols = list(df.columns)
+    trx_col = trx_column(cols)
+    amount_col = find_column(cols, 'amount')
+    receiver_col = (find_column(cols, 'receiver') or find_column(cols, 'to', 'number')
+                    or find_column(cols, 'account', exclude=('name',)))
+    time_col = find_column(cols, 'time') or find_column(cols, 'date')
+    ref_col = find_column(cols, 'reference')
+    if trx_col is None or amount_col is None:
+        raise SystemExit(f"❌ Error: {path} needs a TrxID and an Amount column (found {cols})")
+    if receiver_col is None and account is None:
+        raise SystemExit(f"❌ Error: {path} has no receiving-number column; pass it as NUMBER={path}")
+
+    rows = []
+    for rec in df.to_dict('records'):
+        rows.append({
+            'trx': normalize_trx(rec[trx_col]),
+            'paid_to': account or normalize_phone(rec[receiver_col]),
+            'amount': parse_amount(rec[amount_col]),
+            'time': rec[time_col] if time_col else '',
+            'reference': rec[ref_col] if ref_col else '',
+        })
+    return [r for r in rows if r['trx']]
+
+
+def load_submissions(path, encoding='utf-8-sig'):
+    """Team Information Form responses as dicts, in submission order."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding=encoding)
+    cols = list(df.columns)
+    trx_col = trx_column(cols)
+    team_col = find_column(cols, 'team', 'name')
+    uni_col = find_column(cols, 'university')
+    phone_col = (find_column(cols, 'recipient') or find_column(cols, 'bkash')
+                 or find_column(cols, 'paid', 'to'))
+    time_col = find_column(cols, 'timestamp')
+    if trx_col is None or team_col is None:
+        raise SystemExit(f"❌ Error: {path} needs a TrxID and a Team Name column (found {cols})")
+
+    return [{
+        'trx': normalize_trx(rec[trx_col]),
+        'team': rec[team_col].strip(),
+        'university': rec[uni_col].strip() if uni_col else '',
+        'paid_to': normalize_phone(rec[phone_col]) if phone_col else '',
+        'submitted_at': rec[time_col] if time_col else '',
+    } for rec in df.to_dict('records')]
+
+
+# ========================================
+# RECONCILIATION
+# ========================================
+
+class UniversityIndex:
+    """Resolve a submission to its university: by team name, else by university name."""
+
+    def __init__(self, universities):
+        self.by_name = {}
+        self.by_team = {}
+        for uni in universities:
+            self.by_name[normalize_university_name(uni.university)] = uni
+            for team in uni.teams:
+                self.by_team.setdefault(team.team_name.strip().casefold(), uni)
+
+    def resolve(self, team, university):
+        return (self.by_team.get(team.casefold())
+                or self.by_name.get(normalize_university_name(university) or ''))
+
+
+def reconcile(submissions, transactions, universities, per_team_amount=PER_TEAM_AMOUNT):
+    """
+    Hash-join submissions with statement transactions on TrxID.
+
+    Returns:
+        (acknowledgements, unmatched) - one row per submission, and the
+        transactions no submission claimed
+    """
+    index = UniversityIndex(universities)
+    by_trx = {}
+    repeated = Counter(t['trx'] for t in transactions)
+    refunded = {t['trx'] for t in transactions if t['amount'] is not None and t['amount'] < 0}
+    for t in transactions:
+        by_trx.setdefault(t['trx'], t)
+
+    seen = {}  # TrxID -> teams that submitted it
+    acks = []
+    for sub in submissions:
+        team_key = sub['team'].casefold()
+        if team_key in seen.get(sub['trx'], ()):
+            continue  # the same team submitted the form again
+        uni = index.resolve(sub['team'], sub['university'])
+        t = by_trx.get(sub['trx'])
+        status, note = VERIFIED, ''
+        expected_to = normalize_phone(uni.payment_info.bkash_account) if uni and uni.payment_info else ''
+        if uni is None:
+            status, note = UNKNOWN_UNIVERSITY, f"'{sub['university']}' / team '{sub['team']}' not found"
+        elif not sub['trx']:
+            status, note = PENDING, 'No TrxID submitted'
+        elif sub['trx'] in seen:
+            status, note = DUPLICATE, 'TrxID already used by an earlier submission'
+        elif t is None:
+            status, note = PENDING, 'TrxID not in the bKash statement yet'
+        elif expected_to and t['paid_to'] != expected_to:
+            status, note = WRONG_NUMBER, f"paid to {t['paid_to']}, expected {expected_to}"
+        elif sub['trx'] in refunded:
+            status, note = REFUNDED, 'payment reversed or refunded in the bKash statement'
+        elif t['amount'] != per_team_amount:
+            paid = 'an unreadable amount' if t['amount'] is None else f"{t['amount']:g}"
+            status, note = AMOUNT_MISMATCH, f"paid {paid}, expected {per_team_amount}"
+        if t is not None and repeated[sub['trx']] > 1 and not note:
+            note = 'TrxID appears more than once in the statement'
+        if sub['trx']:
+            seen.setdefault(sub['trx'], set()).add(team_key)
+
+        acks.append({
+            'TrxID': sub['trx'],
+            'Team Name': sub['team'],
+            'University': uni.university if uni else sub['university'],
+            'Paid To': t['paid_to'] if t else sub['paid_to'],
+            'Amount': f"{t['amount']:g}" if t and t['amount'] is not None else '',
+            'Status': status,
+            'Note': note,
+            'Submitted At': sub['submitted_at'],
+        })
+
+    unmatched = [{
+        'TrxID': t['trx'], 'Paid To': t['paid_to'],
+        'Amount': f"{t['amount']:g}" if t['amount'] is not None else '',
+        'Time': t['time'], 'Reference': t['reference'],
+    } for trx, t in by_trx.items() if trx not in seen]
+    return acks, unmatched
+
+
+# ========================================
+# OUTPUT
+# ========================================
+
+def write_acknowledgements(acks, path, encoding='utf-8'):
+    """
+    Merge acknowledgements into the existing sheet.
+
+    Existing rows keep their order and are updated in place; new submissions
+    are appended. Returns (all rows of the sheet, new, changed).
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    merged = {}
+    if os.path.exists(path):
+        with open(path, newline='', encoding=encoding) as f:
+            for row in csv.DictReader(f):
+                merged[ack_key(row)] = row
+
+    new = changed = 0
+    for ack in acks:
+        key = ack_key(ack)
+        old = merged.get(key)
+        if old is None:
+            new += 1
+        elif any(str(old.get(c, '')) != str(ack[c]) for c in ACK_COLUMNS if c in ack):
+            changed += 1
+        else:
+            continue
+        merged[key] = dict(ack, **{'Updated At': now})
+
+    _write_csv(path, ACK_COLUMNS, merged.values(), encoding)
+    return list(merged.values()), new, changed
+
+
+def _write_csv(path, columns, rows, encoding='utf-8'):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', newline='', encoding=encoding) as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Reconcile bKash payments with Team Information Form submissions')
+    p.add_argument('--form', required=True, help='Team Information Form responses CSV')
+    p.add_argument('--statement', action='append', required=True,
+                   help='bKash statement export CSV, or NUMBER=FILE (repeatable)')
+    p.add_argument('--json', default='university_teams_with_payment.json',
+                   help='University JSON with allocated_slots and payment_info')
+    p.add_argument('--ack', default='payment_acknowledgement.csv', help='Acknowledgement sheet')
+    p.add_argument('--summary', default='payment_summary.csv', help='Per-university summary')
+    p.add_argument('--out-dir', default=DEFAULT_EXPORT_DIR, help='Per-university CSV folder')
+    p.add_argument('--xlsx', help='Also maintain this XLSX workbook')
+    p.add_argument('--state', default=DEFAULT_STATE, help='Payment rollup state file')
+    p.add_argument('--unmatched', default='unmatched_payments.csv',
+                   help='Statement transactions no submission claimed')
+    p.add_argument('--encoding', default='utf-8-sig', help='Encoding of the input CSVs')
+    args = p.parse_args(argv)
+
+    universities = load_universities(args.json)
+    submissions = load_submissions(args.form, encoding=args.encoding)
+    transactions = [t for spec in args.statement for t in load_statement(spec, encoding=args.encoding)]
+    print(f"📄 {len(submissions)} submissions, {len(transactions)} statement transactions, "
+          f"{len(universities)} universities")
+
+    acks, unmatched = reconcile(submissions, transactions, universities)
+    rows, new, changed = write_acknowledgements(acks, args.ack)
+    _write_csv(args.unmatched, UNMATCHED_COLUMNS, unmatched)
+
+    statuses = Counter(a['Status'] for a in acks)
+    print(f"\n✓ {args.ack}: {new} new, {changed} updated")
+    for status, count in statuses.most_common():
+        print(f"  - {status}: {count}")
+
+    rollup = PaymentRollup.load(universities, args.state)
+    rollup.sync(rows)
+    summary = rollup.summary()
+    paid = sum(s['Paid Teams'] for s in summary)
+    slots = sum(s['Allocated Slots'] for s in summary)
+    complete = sum(1 for s in summary if s['Missing Payments'] == 0)
+    print(f"✓ {args.unmatched}: {len(unmatched)} transaction(s) without a submission")
+    print(f"✓ {paid}/{slots} teams paid, {complete}/{len(summary)} universities complete")
+    export(rollup, args.summary, args.out_dir, args.xlsx, state_path=args.state)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
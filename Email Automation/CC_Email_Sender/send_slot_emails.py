@@ -2,11 +2,12 @@
 """Send slot allocation and payment emails to university coaches."""
 
 import argparse
-import json
+import csv
 import os
 import sys
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 
 # Load environment variables from .env file in parent directory
@@ -34,6 +35,68 @@ except ImportError:
     print("Error: iupc_slot_config.py not found")
     sys.exit(1)
 
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.records import load_universities
+from common.recipients import SuppressionList, clean_recipients
+from common.quota import QuotaScheduler, record_direct_send
+from common.scheduling import parse_start, submit_scheduled
+from common.templates import ensure_template, template_params
+from common.render_pool import render_stream
+from common.htmlbuild import compile_html, extract_css
+from common.events import message_tags
+from common.contenthash import CHANGED, NEW, ContentLedger, content_hash
+from split_universities_by_slots import normalize_university_name
+from waitlist import DEFAULT_STATE as WAITLIST_STATE, load_state
+
+CAMPAIGN = "iupc-slot"  # Priority class in the shared outbox (common/quota.py)
+TEMPLATE_NAME = "iupc-slot-allocation"  # Brevo template name for --use-template
+
+# Inserted into BODY_HTML_TEMPLATE when the bKash account has a holder name
+ACCOUNT_HOLDER_HTML = '<div class="payment-detail"><strong>📝 Account holder:</strong> {holder_name}</div>'
+
+
+@lru_cache(maxsize=None)
+def html_templates():
+    """(body, account holder fragment) with CSS inlined and markup minified.
+    
+    Compiled once per template change (cached in ../.build_cache).
+    """
+    css = extract_css(config.BODY_HTML_TEMPLATE)
+    return (compile_html(config.BODY_HTML_TEMPLATE),
+            compile_html(ACCOUNT_HOLDER_HTML, css=css))
+
+
+@lru_cache(maxsize=None)
+def release_html_template():
+    """RELEASE_BODY_HTML_TEMPLATE with CSS inlined and markup minified."""
+    return compile_html(config.RELEASE_BODY_HTML_TEMPLATE)
+
+
+@lru_cache(maxsize=None)
+def waitlist_grants():
+    """{university: ISO time} of the slots granted from the waitlist (waitlist.py)."""
+    return load_state(WAITLIST_STATE)[1]
+
+
+def load_targets(csv_file):
+    """Universities to email from a CSV with a University column.
+
+    Rows with a New Slots column of 0 are skipped - those universities get the
+    release notice instead (load_released).
+    """
+    with open(csv_file, newline='', encoding='utf-8-sig') as f:
+        return {row['University'].strip().upper() for row in csv.DictReader(f)
+                if row.get('University') and str(row.get('New Slots', '1')).strip() != '0'}
+
+
+def load_released(csv_file):
+    """{university: (old slots, reason)} for the CSV's rows with New Slots of 0."""
+    with open(csv_file, newline='', encoding='utf-8-sig') as f:
+        return {row['University'].strip().upper(): (row.get('Old Slots', ''), row.get('Reason', ''))
+                for row in csv.DictReader(f)
+                if row.get('University') and str(row.get('New Slots', '')).strip() == '0'}
+
 
 def get_short_university_name(university_name):
     """Get a shortened version of university name for reference."""
@@ -46,13 +109,13 @@ def get_short_university_name(university_name):
 
 def format_team_list_text(teams):
     """Format team list for plain text email."""
-    return '\n'.join([f"  • {team['team_name']}" for team in teams])
+    return '\n'.join([f"  • {team.team_name}" for team in teams])
 
 
 def format_team_list_html(teams):
     """Format team list for HTML email."""
     return '<ul style="margin: 10px 0;">' + ''.join([
-        f'<li style="margin: 5px 0;">{team["team_name"]}</li>' 
+        f'<li style="margin: 5px 0;">{team.team_name}</li>' 
         for team in teams
     ]) + '</ul>'
 
@@ -67,20 +130,30 @@ def format_account_holder_info_text(holder_name):
 def format_account_holder_info_html(holder_name):
     """Format account holder info for HTML email."""
     if holder_name:
-        return f'<div class="payment-detail"><strong>📝 Account holder:</strong> {holder_name}</div>'
+        return html_templates()[1].format(holder_name=holder_name)
     return ""
 
 
-def prepare_email_content(university_data):
-    """Prepare email content for a university."""
-    university = university_data['university']
-    allocated_slots = university_data['allocated_slots']
-    team_count = university_data['team_count']
-    teams = university_data['teams']
-    payment_info = university_data.get('payment_info', {})
+def payment_deadline(university):
+    """CONFIRMATION_DEADLINE, or WAITLIST_PAYMENT_HOURS after a waitlist grant if later."""
+    deadline = datetime.fromisoformat(config.CONFIRMATION_DEADLINE)
+    granted = waitlist_grants().get(normalize_university_name(university))
+    if granted:
+        deadline = max(deadline, datetime.fromisoformat(granted)
+                       + timedelta(hours=config.WAITLIST_PAYMENT_HOURS))
+    return f"{deadline.day} {deadline:%B %Y, %I:%M %p}"
+
+
+def template_vars(university_data):
+    """Values for the config templates' placeholders (a records.University)."""
+    university = university_data.university
+    allocated_slots = university_data.slots
+    team_count = university_data.team_count
+    teams = university_data.teams
+    payment_info = university_data.payment_info
     
-    bkash_account = payment_info.get('bkash_account', 'NOT ASSIGNED')
-    account_holder_name = payment_info.get('account_holder_name', '')
+    bkash_account = payment_info.bkash_account if payment_info else 'NOT ASSIGNED'
+    account_holder_name = (payment_info.account_holder_name or '') if payment_info else ''
     
     per_team_amount = config.PER_TEAM_AMOUNT
     total_amount = per_team_amount * allocated_slots
@@ -95,8 +168,7 @@ def prepare_email_content(university_data):
     
     university_short = get_short_university_name(university)
     
-    # Prepare template variables
-    template_vars = {
+    return {
         'university': university,
         'allocated_slots': allocated_slots,
         'team_count': team_count,
@@ -110,27 +182,76 @@ def prepare_email_content(university_data):
         'per_team_amount': f"{per_team_amount:,}",
         'university_short': university_short,
         'contact_email': config.CONTACT_EMAIL,
+        'deadline': payment_deadline(university),
     }
+
+
+def prepare_email_content(university_data):
+    """Prepare email content for a university (a records.University)."""
+    values = template_vars(university_data)
     
     # Format email content
-    subject = config.SUBJECT.format(**template_vars)
-    text_content = config.BODY_TEXT_TEMPLATE.format(**template_vars)
-    html_content = config.BODY_HTML_TEMPLATE.format(**template_vars)
+    subject = config.SUBJECT.format(**values)
+    text_content = config.BODY_TEXT_TEMPLATE.format(**values)
+    html_content = html_templates()[0].format(**values)
     
     return subject, text_content, html_content
 
 
-def send_email(api_instance, university_data, test_mode=False):
-    """Send email to university coaches."""
-    coach_emails = university_data['coach_emails']
-    university = university_data['university']
+def prepare_release_content(university_data, old_slots, reason):
+    """(subject, text, html) of the release notice for a university that lost all its slots."""
+    values = {
+        'university': university_data.university,
+        'old_slots': old_slots or 'all',
+        'reason': config.RELEASE_REASONS.get(reason, 'as the slots were not confirmed'),
+        'contact_email': config.CONTACT_EMAIL,
+    }
+    return (config.RELEASE_SUBJECT.format(**values),
+            config.RELEASE_BODY_TEXT_TEMPLATE.format(**values),
+            release_html_template().format(**values))
+
+
+def content_digest(university_data, content=None):
+    """Hash of what a university would receive: rendered email plus recipients.
+    
+    content is the (subject, text, html) tuple if already rendered; in
+    template mode the full email is rendered here so hashes stay comparable.
+    """
+    if not isinstance(content, tuple):
+        content = prepare_email_content(university_data)
+    return content_hash(*content, *university_data.coach_emails, *config.GLOBAL_CC_EMAILS)
+
+
+def prepare_template_params(university_data):
+    """Params for the stored Brevo template (see --use-template)."""
+    return template_params(template_vars(university_data), config.SUBJECT, html_templates()[0])
+
+
+def sync_template(api_key):
+    """Upload the slot email template to Brevo if it changed; returns its id."""
+    return ensure_template(
+        TEMPLATE_NAME, config.SUBJECT, html_templates()[0],
+        sender={"name": config.FROM_NAME, "email": config.FROM_EMAIL},
+        reply_to={"name": config.REPLY_TO_NAME, "email": config.REPLY_TO_EMAIL},
+        api_key=api_key,
+    )
+
+
+def build_email(university_data, test_mode=False, content=None, template_id=None,
+                subject_prefix=""):
+    """Build the SendSmtpEmail for a university, or None if it has no coach emails.
+    
+    content is the (subject, text, html) tuple from prepare_email_content();
+    pass it when the email was pre-rendered, otherwise it is rendered here.
+    With template_id, content is the params dict from prepare_template_params()
+    and only templateId + params are sent. subject_prefix marks corrections.
+    """
+    coach_emails = university_data.coach_emails
+    university = university_data.university
     
     if not coach_emails:
         print(f"⚠ Skipping {university}: No coach emails")
-        return False
-    
-    # Prepare email content
-    subject, text_content, html_content = prepare_email_content(university_data)
+        return None
     
     # Prepare recipients
     if test_mode:
@@ -160,24 +281,76 @@ def send_email(api_instance, university_data, test_mode=False):
     for email in config.GLOBAL_CC_EMAILS:
         cc_recipients.append({"email": email})
     
+    if template_id is not None:
+        # Stored template: sender, reply-to, subject and body live on Brevo
+        subject = None
+        if subject_prefix:
+            subject = subject_prefix + config.SUBJECT.format(**template_vars(university_data))
+        return sib_api_v3_sdk.SendSmtpEmail(
+            to=to_recipients,
+            cc=cc_recipients if cc_recipients else None,
+            subject=subject,
+            template_id=template_id,
+            params=content if content is not None else prepare_template_params(university_data),
+            tags=message_tags(CAMPAIGN, university),
+        )
+    
+    # Prepare email content
+    if content is None:
+        content = prepare_email_content(university_data)
+    subject, text_content, html_content = content
+    subject = subject_prefix + subject
+    
     # Prepare sender
     sender = {"name": config.FROM_NAME, "email": config.FROM_EMAIL}
     reply_to = {"name": config.REPLY_TO_NAME, "email": config.REPLY_TO_EMAIL}
     
     # Create email
-    send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
+    return sib_api_v3_sdk.SendSmtpEmail(
         to=to_recipients,
         cc=cc_recipients if cc_recipients else None,
         sender=sender,
         reply_to=reply_to,
         subject=subject,
         text_content=text_content,
-        html_content=html_content
+        html_content=html_content,
+        tags=message_tags(CAMPAIGN, university),
     )
+
+
+def to_payload(send_smtp_email):
+    """SendSmtpEmail -> REST JSON payload (camelCase keys)."""
+    return sib_api_v3_sdk.ApiClient().sanitize_for_serialization(send_smtp_email)
+
+
+def send_email(api_instance, university_data, test_mode=False, content=None, outbox=None,
+               template_id=None, subject_prefix="", ledger=None, digest=None):
+    """Send email to university coaches.
+    
+    With outbox (a quota.QuotaScheduler), the email is queued instead of sent.
+    With ledger (a contenthash.ContentLedger), the content digest is stored
+    once the email was sent or queued, for later --changed-only runs.
+    """
+    if ledger is not None and digest is None:
+        digest = content_digest(university_data, content)
+    send_smtp_email = build_email(university_data, test_mode=test_mode, content=content,
+                                  template_id=template_id, subject_prefix=subject_prefix)
+    if send_smtp_email is None:
+        return False
+    
+    if outbox is not None:
+        outbox_id = outbox.enqueue(CAMPAIGN, to_payload(send_smtp_email))
+        print(f"   📥 Queued in outbox (#{outbox_id})")
+        if ledger is not None:
+            ledger.record(CAMPAIGN, university_data.university, digest, f"queued #{outbox_id}")
+        return True
     
     try:
         api_response = api_instance.send_transac_email(send_smtp_email)
         print(f"   ✅ Sent successfully (Message ID: {api_response.message_id})")
+        record_direct_send(api_instance.api_client.configuration.api_key.get('api-key', ''))
+        if ledger is not None:
+            ledger.record(CAMPAIGN, university_data.university, digest, api_response.message_id)
         return True
     except ApiException as e:
         print(f"   ❌ Failed: {e}")
@@ -194,19 +367,45 @@ def main(argv=None):
                        help='Dry run: Show what would be sent without sending')
     parser.add_argument('--delay', type=float, default=None,
                        help='Delay between emails in seconds (default: from config)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Processes used to render emails ahead of sending (0 = one per core)')
+    parser.add_argument('--enqueue', action='store_true',
+                       help='Queue emails in the shared outbox (python -m common.quota drain sends them)')
+    parser.add_argument('--schedule', action='store_true',
+                       help='Submit all emails now with Brevo scheduledAt times spaced by --delay, '
+                            'instead of sleeping between sends')
+    parser.add_argument('--start-at', default=None,
+                       help='With --schedule: ISO time of the first email (default: in 2 minutes)')
+    parser.add_argument('--use-template', action='store_true',
+                       help='Sync the HTML template to Brevo once and send only templateId + params')
+    parser.add_argument('--unordered', action='store_true',
+                       help='With --workers, send each email as soon as it is rendered '
+                            '(default keeps the JSON order)')
+    parser.add_argument('--changed-only', action='store_true',
+                       help='Send only to universities whose email changed since it was last sent')
+    parser.add_argument('--correction', action='store_true',
+                       help='--changed-only, with CORRECTION_PREFIX in front of the subject')
+    parser.add_argument('--only', default=None, metavar='CSV',
+                       help='Send only to the universities in this CSV\'s University column '
+                            '(e.g. slot_changes.csv from waitlist.py); rows with New Slots 0 '
+                            'get the release notice')
+    parser.add_argument('--teams-json', default='university_teams.json',
+                       help='With --only: coach emails for the release notices')
     args = parser.parse_args(argv)
+    args.changed_only = args.changed_only or args.correction
+    if args.schedule and args.enqueue:
+        parser.error('--schedule and --enqueue cannot be combined')
     
     # Load universities data
     if not os.path.isfile(args.json):
         print(f"Error: JSON file not found: {args.json}")
         return 1
     
-    with open(args.json, 'r', encoding='utf-8') as f:
-        universities = json.load(f)
+    universities = load_universities(args.json)
     
     # Test mode: filter to only BUET
     if args.test:
-        buet_data = [u for u in universities if u['university'] == 'BUET']
+        buet_data = [u for u in universities if u.university == 'BUET']
         if not buet_data:
             print("Error: BUET entry not found in JSON for test mode")
             return 2
@@ -215,40 +414,139 @@ def main(argv=None):
         print(f"   Will send only BUET email to: {config.TEST_TO}")
         print(f"   (In production, would send to all {len(universities)} universities)")
     
+    released = []  # (university, old slots, reason) for the release notice
+    if args.only:
+        targets = load_targets(args.only)
+        universities = [u for u in universities if u.university.strip().upper() in targets]
+        print(f"\n🎯 Only universities in {args.only}: {len(universities)} of {len(targets)} listed "
+              f"have slots in {args.json}")
+        dropped = load_released(args.only)
+        if dropped:
+            released = [(u, *dropped[u.university.strip().upper()])
+                        for u in load_universities(args.teams_json)
+                        if u.university.strip().upper() in dropped
+                        and (not args.test or u.university == 'BUET')]
+            print(f"   {len(released)} of {len(dropped)} released all their slots and get the release notice")
+        if not universities and not released:
+            print("\n✨ Nothing to send")
+            return 0
+    
+    # Drop invalid, duplicate and previously bounced coach emails up front
+    suppression = SuppressionList.load()
+    for uni in universities + [u for u, _, _ in released]:
+        to, cc, rejected = clean_recipients(uni.coach_emails[:1], uni.coach_emails[1:], suppression)
+        uni.coach_emails = tuple(to + cc)
+        for email, reason in rejected:
+            print(f"⚠ {uni.university}: dropped {reason} coach email '{email}'")
+    
     print(f"\n📊 Summary:")
     print(f"   Universities to email: {len(universities)}")
     print(f"   Test mode: {'YES' if args.test else 'NO'}")
     print(f"   Dry run: {'YES' if args.dry_run else 'NO'}")
     
+    workers = args.workers if args.workers > 0 else None
+    # Template mode only needs the params; a dry run still shows the full email
+    render = prepare_template_params if args.use_template and not args.dry_run else prepare_email_content
+    rendered = render_stream(render, universities,
+                             workers=workers, ordered=not args.unordered)
+    
+    # Content hashes: compared for --changed-only, stored after real sends
+    ledger = None if args.test else ContentLedger()
+    digests = {}
+    if args.changed_only:
+        rendered = list(rendered)
+        digests = {uni.university: content_digest(uni, content) for uni, content in rendered}
+        status = (ledger or ContentLedger()).compare(CAMPAIGN, digests.items())
+        rendered = [(uni, content) for uni, content in rendered
+                    if status[uni.university] in (NEW, CHANGED)]
+        universities = [uni for uni, _ in rendered]
+        unchanged = len(status) - len(rendered)
+        print(f"\n🔍 Changed since last send: {len(rendered)} "
+              f"({unchanged} unchanged, skipped)")
+        for uni in universities:
+            print(f"   • {uni.university} ({status[uni.university]})")
+        if not rendered and not released:
+            print("\n✨ Nothing changed - no emails to send")
+            return 0
+    subject_prefix = config.CORRECTION_PREFIX if args.correction else ""
+    
     if args.dry_run:
         print("\n📝 DRY RUN - No emails will be sent\n")
-        for uni in universities:
-            subject, text, html = prepare_email_content(uni)
+        releases = [(uni, prepare_release_content(uni, old, reason)) for uni, old, reason in released]
+        for uni, (subject, text, html) in [*releases, *rendered]:
             print(f"\n{'='*60}")
-            print(f"University: {uni['university']}")
-            print(f"To: {uni['coach_emails'][0]}")
-            if len(uni['coach_emails']) > 1:
-                print(f"CC: {', '.join(uni['coach_emails'][1:])}")
-            print(f"Subject: {subject}")
+            print(f"University: {uni.university}")
+            print(f"To: {uni.coach_emails[0] if uni.coach_emails else '(no valid coach email)'}")
+            if len(uni.coach_emails) > 1:
+                print(f"CC: {', '.join(uni.coach_emails[1:])}")
+            print(f"Subject: {subject_prefix}{subject}")
             print(f"\n{text[:500]}...")
         return 0
     
     # Get API key
     api_key = config.BREVO_API_KEY or os.getenv('BREVO_API_KEY')
-    if not api_key:
+    if not api_key and (args.use_template or not args.enqueue):
         print("Error: BREVO_API_KEY not set in config or environment")
         return 3
     
+    template_id = None
+    if args.use_template:
+        try:
+            template_id = sync_template(api_key)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 3
+    
     # Configure API
     configuration = sib_api_v3_sdk.Configuration()
     configuration.api_key['api-key'] = api_key
     api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
         sib_api_v3_sdk.ApiClient(configuration)
     )
+    outbox = QuotaScheduler() if args.enqueue else None
     
     # Send emails
     delay = args.delay if args.delay is not None else config.SECONDS_BETWEEN_EMAILS
     
+    # Release notices: a few plain emails, sent (or queued) right away in every mode
+    release_failed = 0
+    for uni, old_slots, reason in released:
+        print(f"\n🔓 Release notice ({reason or 'released'})")
+        if not send_email(api_instance, uni, test_mode=args.test,
+                          content=prepare_release_content(uni, old_slots, reason), outbox=outbox):
+            release_failed += 1
+        if outbox is None:
+            time.sleep(delay)
+    if released:
+        print(f"\n🔓 Release notices: {len(released) - release_failed} sent, {release_failed} failed")
+    if not universities:
+        return 0 if release_failed == 0 else 4
+    
+    if args.schedule:
+        # Let Brevo pace the campaign: submit everything now with scheduledAt
+        emails = [(uni, build_email(uni, test_mode=args.test, content=content,
+                                    template_id=template_id, subject_prefix=subject_prefix), content)
+                  for uni, content in rendered]
+        emails = [(uni, e, content) for uni, e, content in emails if e is not None]
+        payloads = [to_payload(e) for _, e, _ in emails]
+        
+        def scheduled(i, result):
+            if ledger is not None:
+                uni, content = emails[i][0], emails[i][2]
+                digest = digests.get(uni.university) or content_digest(uni, content)
+                ledger.record(CAMPAIGN, uni.university, digest, result.info)
+        
+        try:
+            stats = submit_scheduled(payloads, api_key, CAMPAIGN, parse_start(args.start_at), delay,
+                                     on_scheduled=scheduled)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 5
+        print(f"\n🗓  Scheduled: {stats['scheduled']}  ❌ Failed: {stats['failed']}")
+        print(f"   Batch ID: {stats['batch_id']}")
+        print(f"   Cancel/reschedule: python -m common.scheduling cancel --campaign {CAMPAIGN}")
+        return 0 if stats['failed'] == 0 and release_failed == 0 else 4
+    
     print(f"\n{'='*60}")
     print(f"Starting email send at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*60}")
@@ -256,14 +554,16 @@ def main(argv=None):
     sent = 0
     failed = 0
     
-    for i, uni in enumerate(universities):
-        if send_email(api_instance, uni, test_mode=args.test):
+    for i, (uni, content) in enumerate(rendered):
+        if send_email(api_instance, uni, test_mode=args.test, content=content, outbox=outbox,
+                      template_id=template_id, subject_prefix=subject_prefix,
+                      ledger=ledger, digest=digests.get(uni.university)):
             sent += 1
         else:
             failed += 1
         
         # Delay between emails (except for the last one)
-        if i < len(universities) - 1:
+        if outbox is None and i < len(universities) - 1:
             time.sleep(delay)
     
     print(f"\n{'='*60}")
@@ -273,7 +573,7 @@ def main(argv=None):
     print(f"❌ Failed: {failed}")
     print(f"📊 Total: {len(universities)}")
     
-    return 0 if failed == 0 else 4
+    return 0 if failed == 0 and release_failed == 0 else 4
 
 
 if __name__ == '__main__':
@@ -7,65 +7,60 @@ Usage:
     python send_with_cc.py recipients.csv
 """
 
+import argparse
 import os
 import sys
 import time
 import pandas as pd
-import requests
 from datetime import datetime, timezone
-from typing import List, Dict, Tuple, Optional
+from pathlib import Path
+from typing import List, Dict, Optional
 
 # Import configuration
 import config
 
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.recipients import SuppressionList, validate_frame
+from common.brevo import MISSING_KEY_ERROR, SendResult
+from common.quota import QuotaScheduler
+from common.aimd import send_adaptive
+from common.breaker import CircuitBreaker
+from common.senders import SenderPool
+from common.events import message_tags
+
 
 # ========================================
 # CONSTANTS (from config)
 # ========================================
 BREVO_API_KEY = config.BREVO_API_KEY or os.getenv("BREVO_API_KEY", "").strip()
-BREVO_URL = "https://api.brevo.com/v3/smtp/email"
+CAMPAIGN = "cc-update"  # Priority class in the shared outbox (common/quota.py)
+
+# One or more Brevo keys (senders.json / BREVO_API_KEYS, see common/senders.py)
+SENDERS = SenderPool.from_env(BREVO_API_KEY)
+# Fails fast while Brevo is down, parking emails in the outbox (common/breaker.py)
+BREAKER = CircuitBreaker(config.CIRCUIT_BREAKER_FAILURES, config.CIRCUIT_BREAKER_COOLDOWN,
+                         campaign=CAMPAIGN, send_fn=SENDERS.send)
 
 
 # ========================================
 # HELPER FUNCTIONS
 # ========================================
 
-def clean_email(email: str) -> str:
-    """Clean and normalize email address"""
-    return str(email).strip().lower() if pd.notna(email) and email else ""
-
-
-def parse_cc_emails(cc_string: str) -> List[Dict[str, str]]:
-    """
-    Parse comma-separated CC emails into Brevo format
-    
-    Args:
-        cc_string: Comma or semicolon separated emails
-    
-    Returns:
-        List of dicts with 'email' key for Brevo API
-    """
-    if not cc_string or pd.isna(cc_string):
-        return []
-    
-    emails = [clean_email(e) for e in str(cc_string).replace(';', ',').split(',')]
-    return [{"email": e} for e in emails if e]
-
-
 def now_iso() -> str:
     """Return current timestamp in ISO format"""
     return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
 
 
-def send_email_brevo(
+def build_payload(
     to_email: str,
     to_name: str,
     cc_emails: List[Dict[str, str]],
     team: str = "",
     custom_message: Optional[str] = None
-) -> Tuple[bool, str]:
+) -> dict:
     """
-    Send email via Brevo API with CC support
+    Build the Brevo /v3/smtp/email payload for one recipient
     
     Args:
         to_email: Primary recipient email
@@ -75,11 +70,8 @@ def send_email_brevo(
         custom_message: Custom message to override default (optional)
     
     Returns:
-        (success: bool, info: str) - info is messageId or error message
+        Payload dict for the Brevo API
     """
-    if not BREVO_API_KEY:
-        return False, "Missing BREVO_API_KEY"
-    
     # Use custom message or default
     message = custom_message or os.getenv("EMAIL_MESSAGE", config.DEFAULT_MESSAGE)
     
@@ -101,49 +93,58 @@ def send_email_brevo(
             message=message,
             reply_team=config.REPLY_TO_NAME,
             contact_email=config.REPLY_TO_EMAIL
-        )
+        ),
+        "tags": message_tags(CAMPAIGN),
     }
     
     # Add CC recipients if provided
     if cc_emails:
         payload["cc"] = cc_emails
     
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "api-key": BREVO_API_KEY
-    }
+    return payload
+
+
+def send_email_brevo(
+    to_email: str,
+    to_name: str,
+    cc_emails: List[Dict[str, str]],
+    team: str = "",
+    custom_message: Optional[str] = None
+) -> SendResult:
+    """
+    Send email via Brevo API with CC support
     
-    try:
-        response = requests.post(BREVO_URL, json=payload, headers=headers, timeout=30)
-        
-        if 200 <= response.status_code < 300:
-            try:
-                msg_id = response.json().get("messageId", "OK")
-            except Exception:
-                msg_id = "OK"
-            return True, msg_id
-        else:
-            try:
-                error_msg = response.json().get("message", response.text)
-            except Exception:
-                error_msg = response.text
-            return False, f"HTTP {response.status_code}: {error_msg}"
+    Args:
+        to_email: Primary recipient email
+        to_name: Primary recipient name
+        cc_emails: List of CC recipients
+        team: Team name (optional)
+        custom_message: Custom message to override default (optional)
     
-    except requests.exceptions.Timeout:
-        return False, "Request timeout"
-    except requests.exceptions.RequestException as e:
-        return False, f"Request error: {str(e)}"
-    except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+    Returns:
+        SendResult - info is messageId or error message; queued is set when
+        Brevo was unavailable and the email was parked in the outbox instead
+    """
+    if not SENDERS:
+        return SendResult(False, MISSING_KEY_ERROR, None, 0.0)
+    
+    payload = build_payload(to_email, to_name, cc_emails, team, custom_message)
+    result = BREAKER.send(payload, BREVO_API_KEY)
+    return result
 
 
 # ========================================
 # MAIN PROCESSING
 # ========================================
 
-def process_csv(csv_path: str) -> None:
-    """Process CSV file and send emails with CC"""
+def process_csv(csv_path: str, enqueue: bool = False, adaptive: bool = False) -> None:
+    """Process CSV file and send emails with CC
+    
+    With enqueue=True, payloads go into the shared outbox instead of being
+    sent; `python -m common.quota drain` sends them within the daily quota.
+    With adaptive=True, emails are sent concurrently under an AIMD limit
+    (common/aimd.py) instead of sleeping SECONDS_BETWEEN_EMAILS between sends.
+    """
     
     if not os.path.exists(csv_path):
         print(f"❌ Error: File not found: {csv_path}")
@@ -189,30 +190,44 @@ def process_csv(csv_path: str) -> None:
     if config.GLOBAL_CC_EMAILS:
         print(f"📋 Global CC: {', '.join(config.GLOBAL_CC_EMAILS)}")
     
+    # Validate all recipients up front (syntax, duplicates, suppression list)
+    suppression = SuppressionList.load()
+    to_send = validate_frame(
+        to_send,
+        to_col=config.RECIPIENT_EMAIL_COL,
+        cc_col=config.CC_EMAILS_COL,
+        extra_cc=[e for e in config.GLOBAL_CC_EMAILS if e],
+        suppression=suppression,
+    )
+    rejected_total = sum(len(r) for r in to_send["_rejected"])
+    if rejected_total:
+        print(f"🚫 Removed {rejected_total} bad recipient(s) before sending "
+              f"({len(suppression)} on suppression list)")
+    
+    scheduler = QuotaScheduler() if enqueue else None
+    
     # Counters
     sent_count = 0
     error_count = 0
+    parked_count = 0  # Parked in the outbox while Brevo was down
+    adaptive_jobs = []  # (row index, payload) sent after the loop in adaptive mode
     
     # Process each row
     for idx, row in to_send.iterrows():
-        recipient_email = clean_email(row[config.RECIPIENT_EMAIL_COL])
+        recipient_email = row["_to"]
         recipient_name = str(row[config.RECIPIENT_NAME_COL]).strip()
         team = str(row.get(config.TEAM_COL, "")).strip()
-        cc_string = str(row.get(config.CC_EMAILS_COL, "")).strip()
         
-        # Validate recipient email
-        if not recipient_email or "@" not in recipient_email:
-            print(f"⚠️  Row {idx}: Invalid email '{recipient_email}' - skipping")
+        for email, reason in row["_rejected"]:
+            print(f"⚠️  Row {idx}: Dropped {reason} address '{email}'")
+        
+        # Skip rows whose primary recipient was rejected
+        if not recipient_email:
+            print(f"⚠️  Row {idx}: No valid recipient email - skipping")
             error_count += 1
             continue
         
-        # Parse CC emails from CSV
-        cc_emails = parse_cc_emails(cc_string)
-        
-        # Add global CC emails
-        for global_cc in config.GLOBAL_CC_EMAILS:
-            if global_cc and {"email": clean_email(global_cc)} not in cc_emails:
-                cc_emails.append({"email": clean_email(global_cc)})
+        cc_emails = [{"email": e} for e in row["_cc"]]
         
         # In test mode, override recipient
         actual_to = config.TEST_TO if config.TEST_MODE else recipient_email
@@ -226,27 +241,73 @@ def process_csv(csv_path: str) -> None:
         if team:
             print(f"   Team: {team}")
         
+        if scheduler is not None:
+            outbox_id = scheduler.enqueue(CAMPAIGN, build_payload(
+                to_email=actual_to,
+                to_name=recipient_name,
+                cc_emails=cc_emails if not config.TEST_MODE else [],
+                team=team
+            ))
+            sent_count += 1
+            df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | queued #{outbox_id}"
+            print(f"   📥 Queued in outbox (#{outbox_id})")
+            continue
+        
+        if adaptive:
+            adaptive_jobs.append((idx, build_payload(
+                to_email=actual_to,
+                to_name=recipient_name,
+                cc_emails=cc_emails if not config.TEST_MODE else [],
+                team=team
+            )))
+            continue
+        
         # Send email
-        success, info = send_email_brevo(
+        result = send_email_brevo(
             to_email=actual_to,
             to_name=recipient_name,
             cc_emails=cc_emails if not config.TEST_MODE else [],
             team=team
         )
         
-        if success:
+        if result.ok:
             sent_count += 1
-            timestamp_info = f"{now_iso()} | <{info}>"
+            timestamp_info = f"{now_iso()} | <{result.info}>"
             df.at[idx, config.MAIL_SENT_COL] = timestamp_info
-            print(f"   ✅ Sent successfully (ID: {info})")
+            print(f"   ✅ Sent successfully (ID: {result.info})")
+        elif result.queued is not None:
+            parked_count += 1
+            df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | queued #{result.queued}"
+            print(f"   ⏸  Brevo unavailable - queued for retry (#{result.queued})")
         else:
             error_count += 1
-            print(f"   ❌ Failed: {info}")
+            print(f"   ❌ Failed: {result.info}")
         
-        # Rate limiting
-        if idx != to_send.index[-1]:
+        # Rate limiting (not needed while failing fast)
+        if idx != to_send.index[-1] and result.latency:
             time.sleep(config.SECONDS_BETWEEN_EMAILS)
     
+    limiter = None
+    if adaptive_jobs:
+        def job_done(job, result):
+            nonlocal sent_count, error_count, parked_count
+            idx, payload = job
+            to = payload["to"][0]["email"]
+            if result.ok:
+                sent_count += 1
+                df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | <{result.info}>"
+                print(f"   ✅ {to}: Sent successfully (ID: {result.info})")
+            elif result.queued is not None:
+                parked_count += 1
+                df.at[idx, config.MAIL_SENT_COL] = f"{now_iso()} | queued #{result.queued}"
+                print(f"   ⏸  {to}: Brevo unavailable - queued for retry (#{result.queued})")
+            else:
+                error_count += 1
+                print(f"   ❌ {to}: Failed: {result.info}")
+        
+        print(f"\n🚀 Sending {len(adaptive_jobs)} email(s) with adaptive concurrency...")
+        limiter = send_adaptive(adaptive_jobs, lambda job: BREAKER.send(job[1], BREVO_API_KEY), job_done)
+    
     # Save updated CSV
     try:
         df.drop(columns=["_send_now_clean"], inplace=True, errors="ignore")
@@ -259,9 +320,19 @@ def process_csv(csv_path: str) -> None:
     print(f"\n" + "="*50)
     print(f"📊 SUMMARY")
     print(f"="*50)
-    print(f"✅ Successfully sent: {sent_count}")
+    if enqueue:
+        print(f"📥 Queued in outbox: {sent_count}")
+    else:
+        print(f"✅ Successfully sent: {sent_count}")
     print(f"❌ Errors: {error_count}")
-    print(f"📧 Total processed: {sent_count + error_count}")
+    if parked_count:
+        print(f"⏸  Queued for retry (Brevo unavailable): {parked_count} - "
+              f"run `python -m common.quota drain` later")
+    print(f"📧 Total processed: {sent_count + error_count + parked_count}")
+    if limiter is not None:
+        print(f"⚙️  Adaptive sending: {limiter.summary()}")
+    if len(SENDERS) > 1 and not enqueue:
+        print(f"🔑 Senders: {SENDERS.summary()}")
 
 
 # ========================================
@@ -273,12 +344,19 @@ if __name__ == "__main__":
     print("📧 Brevo Email Sender with CC Support")
     print("="*50)
     
-    csv_path = sys.argv[1] if len(sys.argv) > 1 else "recipients.csv"
+    parser = argparse.ArgumentParser(description="Send emails with CC via Brevo")
+    parser.add_argument("csv", nargs="?", default="recipients.csv", help="Recipients CSV")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="Queue emails in the shared outbox instead of sending now")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Send concurrently, adapting to Brevo latency/rate limits "
+                             "instead of SECONDS_BETWEEN_EMAILS")
+    args = parser.parse_args()
     
-    if not BREVO_API_KEY:
+    if not SENDERS and not args.enqueue:
         print("❌ Error: BREVO_API_KEY not set")
         print("   Set it in config.py OR as environment variable")
         sys.exit(1)
     
-    process_csv(csv_path)
+    process_csv(args.csv, enqueue=args.enqueue, adaptive=args.adaptive)
     print("\n✨ Done!")
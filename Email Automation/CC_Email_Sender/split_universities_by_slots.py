@@ -2,12 +2,21 @@
 """Split university_teams.json into two files:
 1. With payment info (allocated_slots > 0)
 2. Without payment info (allocated_slots == 0)
+
+With --changes CHANGES.csv only the listed universities are updated in the
+existing split files (University, New Slots, optionally Bkash and Name - e.g.
+slot_changes.csv from waitlist.py): records that cross zero slots move between
+the two files, and the moves are listed.
 """
 import argparse
 import csv
-import json
 import os
 import sys
+from pathlib import Path
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import jsonio
 
 
 def normalize_university_name(name):
@@ -36,49 +45,41 @@ def load_payment_info(csv_file, encoding='utf-8-sig'):
 def split_and_add_payment(json_file, payment_map, 
                          with_slots_file='university_teams_with_payment.json',
                          zero_slots_file='university_teams_zero_slots.json',
-                         encoding='utf-8'):
-    """Split JSON by allocated_slots and add payment info where needed."""
-    with open(json_file, 'r', encoding=encoding) as f:
-        data = json.load(f)
-    
-    with_payment = []
-    zero_slots = []
-    
+                         encoding='utf-8', pretty=True):
+    """Split JSON by allocated_slots and add payment info where needed.
+
+    Entries are streamed from json_file straight into the two output files.
+    """
     matched = 0
     unmatched = []
     
-    for entry in data:
-        uni = entry.get('university', '')
-        slots = entry.get('allocated_slots', 0)
-        
-        if slots > 0:
-            # Add payment info for universities with slots
-            key = normalize_university_name(uni)
-            if key in payment_map:
-                entry['payment_info'] = payment_map[key]
-                matched += 1
+    with jsonio.ArrayWriter(with_slots_file, pretty=pretty, encoding=encoding) as with_payment, \
+            jsonio.ArrayWriter(zero_slots_file, pretty=pretty, encoding=encoding) as zero_slots:
+        for entry in jsonio.iter_array(json_file, encoding=encoding):
+            uni = entry.get('university', '')
+            slots = entry.get('allocated_slots', 0)
+            
+            if slots > 0:
+                # Add payment info for universities with slots
+                key = normalize_university_name(uni)
+                if key in payment_map:
+                    entry['payment_info'] = payment_map[key]
+                    matched += 1
+                else:
+                    unmatched.append(uni)
+                with_payment.write(entry)
             else:
-                unmatched.append(uni)
-            with_payment.append(entry)
-        else:
-            # No payment info needed for zero slots
-            # Remove payment_info if it exists
-            entry.pop('payment_info', None)
-            zero_slots.append(entry)
-    
-    # Write both files
-    with open(with_slots_file, 'w', encoding=encoding) as f:
-        json.dump(with_payment, f, indent=2, ensure_ascii=False)
-    
-    with open(zero_slots_file, 'w', encoding=encoding) as f:
-        json.dump(zero_slots, f, indent=2, ensure_ascii=False)
+                # No payment info needed for zero slots
+                # Remove payment_info if it exists
+                entry.pop('payment_info', None)
+                zero_slots.write(entry)
     
     # Print summary
     print(f'\n✓ Split complete!')
-    print(f'  • Total universities: {len(data)}')
-    print(f'  • With allocated slots (>0): {len(with_payment)} → {with_slots_file}')
-    print(f'  • With zero slots: {len(zero_slots)} → {zero_slots_file}')
-    print(f'\n✓ Payment info added to {matched}/{len(with_payment)} universities with slots')
+    print(f'  • Total universities: {with_payment.count + zero_slots.count}')
+    print(f'  • With allocated slots (>0): {with_payment.count} → {with_slots_file}')
+    print(f'  • With zero slots: {zero_slots.count} → {zero_slots_file}')
+    print(f'\n✓ Payment info added to {matched}/{with_payment.count} universities with slots')
     
     if unmatched:
         print(f'\n⚠ {len(unmatched)} universities with slots but no payment info:')
@@ -90,6 +91,117 @@ def split_and_add_payment(json_file, payment_map,
     return 0
 
 
+def load_changes(csv_file, encoding='utf-8-sig'):
+    """Change set rows: (university, new slots, payment info or None)."""
+    changes = []
+    with open(csv_file, newline='', encoding=encoding) as f:
+        for row in csv.DictReader(f):
+            uni = (row.get('University') or row.get('University Name') or '').strip()
+            slots = (row.get('New Slots') or row.get('Slots') or '').strip()
+            if not uni or not slots:
+                continue
+            payment_info = None
+            bkash = (row.get('Bkash') or '').strip()
+            if bkash:
+                payment_info = {'bkash_account': bkash}
+                name = (row.get('Name') or '').strip()
+                if name:
+                    payment_info['account_holder_name'] = name
+            changes.append((uni, int(slots), payment_info))
+    return changes
+
+
+def apply_changes(changes, payment_map,
+                  with_slots_file='university_teams_with_payment.json',
+                  zero_slots_file='university_teams_zero_slots.json',
+                  json_file='university_teams.json',
+                  encoding='utf-8', pretty=True):
+    """Apply a change set to the existing split files instead of re-splitting.
+
+    Each change is a dict lookup; only the files whose records actually
+    changed are rewritten. Universities found in neither file are taken from
+    json_file.
+
+    Returns:
+        list of (university, from file, to file) for the records that moved
+    """
+    files = {with_slots_file: jsonio.load(with_slots_file, encoding=encoding),
+             zero_slots_file: jsonio.load(zero_slots_file, encoding=encoding)}
+    where = {normalize_university_name(e.get('university', '')): (path, i)
+             for path, entries in files.items() for i, e in enumerate(entries)}
+    source = None
+    dirty = set()
+    moves = []
+    unmatched = []
+    applied = 0
+    unchanged = 0
+
+    for uni, slots, payment_info in changes:
+        key = normalize_university_name(uni)
+        if key in where:
+            old_file, i = where[key]
+            entry = files[old_file][i]
+        else:
+            if source is None:
+                source = {normalize_university_name(e.get('university', '')): e
+                          for e in jsonio.iter_array(json_file, encoding=encoding)}
+            if key not in source:
+                print(f'⚠ {uni}: not in {json_file}, skipped')
+                continue
+            old_file, i, entry = None, None, source[key]
+
+        before = (entry.get('allocated_slots'), dict(entry.get('payment_info') or {}))
+        entry['allocated_slots'] = slots
+        if slots > 0:
+            new_file = with_slots_file
+            payment_info = payment_info or payment_map.get(key) or entry.get('payment_info')
+            if payment_info:
+                entry['payment_info'] = payment_info
+            else:
+                unmatched.append(uni)
+        else:
+            new_file = zero_slots_file
+            entry.pop('payment_info', None)
+
+        if new_file == old_file and before == (slots, dict(entry.get('payment_info') or {})):
+            unchanged += 1  # e.g. slot_changes.csv applied twice
+            continue
+        applied += 1
+        dirty.add(new_file)
+        if new_file != old_file:
+            # Leave a hole rather than shifting every index after it
+            if old_file is not None:
+                files[old_file][i] = None
+                dirty.add(old_file)
+            files[new_file].append(entry)
+            where[key] = (new_file, len(files[new_file]) - 1)
+            moves.append((entry['university'], old_file, new_file))
+
+    for path in dirty:
+        jsonio.dump([e for e in files[path] if e is not None], path, pretty=pretty, encoding=encoding)
+
+    print(f'\n✓ Applied {applied} change(s), {unchanged} already up to date; '
+          f'rewrote {len(dirty)} file(s)')
+    if moves:
+        print(f'\n🔀 {len(moves)} record(s) moved:')
+        for uni, old_file, new_file in moves:
+            print(f'  - {uni}: {old_file or "(new)"} → {new_file}')
+    if unmatched:
+        print(f'\n⚠ {len(unmatched)} universities with slots but no payment info:')
+        for u in unmatched:
+            print(f'  - {u}')
+    return moves
+
+
+def write_moves(moves, csv_file):
+    tmp = f'{csv_file}.tmp'
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['University', 'From', 'To'])
+        writer.writerows((uni, old_file or '', new_file) for uni, old_file, new_file in moves)
+    os.replace(tmp, csv_file)
+
+
 def main(argv=None):
     p = argparse.ArgumentParser(description='Split university JSON by allocated slots and add payment info')
     p.add_argument('--csv', default='Final_Slot_With_Bkash.csv', help='CSV file with payment info')
@@ -100,8 +212,29 @@ def main(argv=None):
                    help='Output file for universities with zero slots')
     p.add_argument('--csv-encoding', default='utf-8-sig', help='CSV encoding')
     p.add_argument('--json-encoding', default='utf-8', help='JSON encoding')
+    p.add_argument('--compact', action='store_true',
+                   help='Write compact JSON (the split files are only read by send_slot_emails.py)')
+    p.add_argument('--changes', help='Only apply this change set (University, New Slots[, Bkash, Name]) '
+                                     'to the existing split files')
+    p.add_argument('--moves', default='slot_moves.csv',
+                   help='With --changes: records that moved between the two files')
     args = p.parse_args(argv)
     
+    if args.changes:
+        for path in (args.changes, args.with_payment, args.zero_slots):
+            if not os.path.isfile(path):
+                print(f'Error: file not found: {path} (run a full split first)')
+                return 2
+        # Payment info for universities that gain slots, if the CSV is around
+        payment_map = (load_payment_info(args.csv, encoding=args.csv_encoding)
+                       if os.path.isfile(args.csv) else {})
+        moves = apply_changes(load_changes(args.changes), payment_map,
+                              args.with_payment, args.zero_slots, args.json,
+                              encoding=args.json_encoding, pretty=not args.compact)
+        write_moves(moves, args.moves)
+        print(f'✓ Created {args.moves}')
+        return 0
+    
     if not os.path.isfile(args.csv):
         print(f'Error: CSV file not found: {args.csv}')
         return 1
@@ -114,7 +247,7 @@ def main(argv=None):
     
     return split_and_add_payment(args.json, payment_map, 
                                 args.with_payment, args.zero_slots,
-                                encoding=args.json_encoding)
+                                encoding=args.json_encoding, pretty=not args.compact)
 
 
 if __name__ == '__main__':
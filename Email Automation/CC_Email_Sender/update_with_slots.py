@@ -1,5 +1,10 @@
-import json
 import csv
+import sys
+from pathlib import Path
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import jsonio
 
 # Read final_slot.csv and create a dictionary
 slots_dict = {}
@@ -11,30 +16,29 @@ with open('final_slot.csv', 'r', encoding='utf-8') as f:
             slots = int(row[1].strip())
             slots_dict[university] = slots
 
-# Read university_teams.json
-with open('university_teams.json', 'r', encoding='utf-8') as f:
-    university_data = json.load(f)
 
-# Add allocated_slots field to each university
-for uni in university_data:
-    uni_name = uni['university']
-    uni['allocated_slots'] = slots_dict.get(uni_name, 0)
+def with_allocated_slots(entries, summary_writer):
+    """Add allocated_slots to each university and write its summary row."""
+    for uni in entries:
+        uni['allocated_slots'] = slots_dict.get(uni['university'], 0)
+        summary_writer.writerow([
+            uni['university'],
+            uni['team_count'],
+            uni['allocated_slots']
+        ])
+        yield uni
 
-# Write updated JSON back
-with open('university_teams.json', 'w', encoding='utf-8') as f:
-    json.dump(university_data, f, indent=2, ensure_ascii=False)
 
-# Create new CSV with university, teams (applied), and allocated slots
+# Stream university_teams.json back to itself with the new field, and
+# create a CSV with university, teams (applied), and allocated slots
+# in the same pass (university_teams.json is reviewed by hand - keep it pretty)
 with open('university_summary.csv', 'w', encoding='utf-8', newline='') as f:
     writer = csv.writer(f)
     writer.writerow(['University', 'Teams (Applied)', 'Allocated Slots'])
-    
-    for uni in university_data:
-        writer.writerow([
-            uni['university'],
-            uni['team_count'],
-            uni['allocated_slots']
-        ])
+    jsonio.dump_array(
+        with_allocated_slots(jsonio.iter_array('university_teams.json'), writer),
+        'university_teams.json', pretty=True, indent=2
+    )
 
 print("✓ Updated university_teams.json with allocated_slots field")
 print("✓ Created university_summary.csv with university, teams (applied), and allocated slots")
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Move declined and unpaid slots to the next universities on the waitlist.
+
+Universities that don't confirm their teams or pay by CONFIRMATION_DEADLINE
+(iupc_slot_config.py) lose those slots. Instead of editing final_slot.csv by
+hand, every university that could still take a slot (fewer slots than
+registered teams, never released any) sits in a priority queue keyed by the
+score of its next slot, ``score / (slots + 1)`` - the same highest-averages
+rule that shares seats proportionally to the score. A released seat goes to
+the top of the queue and the university is pushed back with its new key, so
+each seat costs O(log n) whatever the number of universities.
+
+The score is the university's decayed_score from
+../../slot_allocation/university_ratings.csv (ratings.py) when present, else
+its number of registered teams.
+
+Outputs:
+- final_slot.csv, updated in place
+- slot_changes.csv - only the universities whose slots changed in this run
+  (University, Old Slots, New Slots, Reason)
+
+Email just those universities instead of everyone:
+    python3 split_universities_by_slots.py --changes slot_changes.csv
+    python3 send_slot_emails.py --only slot_changes.csv
+
+Usage:
+    python3 waitlist.py --decline "SOME UNIVERSITY" --keep "OTHER UNIVERSITY=1" [--dry-run]
+    python3 waitlist.py --unpaid          # after the deadline, from payment_rollup.json
+"""
+import argparse
+import csv
+import heapq
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import jsonio
+from iupc_slot_config import CONFIRMATION_DEADLINE, WAITLIST_PAYMENT_HOURS
+from split_universities_by_slots import normalize_university_name
+
+DEFAULT_SCORES = Path(__file__).resolve().parent.parent.parent / 'slot_allocation' / 'university_ratings.csv'
+DEFAULT_STATE = 'waitlist_state.json'
+DEFAULT_ROLLUP = 'payment_rollup.json'  # from reconcile_payments.py
+
+CHANGE_COLUMNS = ['University', 'Old Slots', 'New Slots', 'Reason']
+WAITLIST = 'Waitlist'
+
+
+# ========================================
+# INPUTS
+# ========================================
+
+def load_slots(path):
+    """{university: slots} from final_slot.csv (no header), in file order."""
+    slots = {}
+    if not os.path.exists(path):
+        return slots
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) == 2:
+                slots[normalize_university_name(row[0])] = int(row[1].strip())
+    return slots
+
+
+def save_slots(slots, path):
+    """final_slot.csv without the universities that dropped to zero."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for university, count in slots.items():
+            if count > 0:
+                writer.writerow([university, count])
+    os.replace(tmp, path)
+
+
+def load_teams(path):
+    """{university: registered teams} from university_teams.json."""
+    return {normalize_university_name(e['university']): e.get('team_count', len(e.get('teams', [])))
+            for e in jsonio.iter_array(path)}
+
+
+def load_scores(path, column='decayed_score'):
+    """{university: score} from a ratings CSV, or None if it doesn't exist."""
+    if not path or not os.path.exists(path):
+        return None
+    scores = {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            name = row.get('university') or row.get('University') or ''
+            value = (row.get(column) or '').strip()
+            if name and value:
+                scores[normalize_university_name(name)] = float(value)
+    return scores
+
+
+def load_state(path):
+    state = jsonio.load(path) if os.path.exists(path) else {}
+    return set(state.get('closed', [])), dict(state.get('granted', {}))
+
+
+def save_state(closed, granted, path):
+    jsonio.dump({'closed': sorted(closed), 'granted': granted}, path)
+
+
+# ========================================
+# WAITLIST
+# ========================================
+
+class Waitlist:
+    """Priority queue of universities that can take one more slot."""
+
+    def __init__(self, slots, teams, scores=None, closed=(), cap=None):
+        self.slots = dict(slots)
+        self.teams = teams
+        self.scores = scores if scores is not None else teams
+        self.closed = set(closed)
+        self.cap = cap
+        self.old = {}      # university -> slots before its first change in this run
+        self.reasons = {}  # university -> why it changed
+        self.version = {}  # lazy deletion: heap entries with an older version are stale
+        self.heap = [self._entry(u) for u in teams if self._eligible(u)]
+        heapq.heapify(self.heap)
+
+    def _limit(self, university):
+        limit = self.teams.get(university, 0)
+        return min(limit, self.cap) if self.cap is not None else limit
+
+    def _eligible(self, university):
+        return university not in self.closed and self.slots.get(university, 0) < self._limit(university)
+
+    def _entry(self, university):
+        slots = self.slots.get(university, 0)
+        priority = self.scores.get(university, 0.0) / (slots + 1)
+        waiting = self.teams.get(university, 0) - slots
+        # Highest priority first, then most teams still waiting, then by name
+        return (-priority, -waiting, university, self.version.get(university, 0))
+
+    def _set(self, university, count, reason):
+        self.old.setdefault(university, self.slots.get(university, 0))
+        self.slots[university] = count
+        self.reasons[university] = reason
+        self.version[university] = self.version.get(university, 0) + 1
+
+    def grant_next(self):
+        """Give one seat to the top of the queue; returns the university or None."""
+        while self.heap:
+            *_, university, version = heapq.heappop(self.heap)
+            if version != self.version.get(university, 0) or not self._eligible(university):
+                continue  # superseded by a newer entry, or closed meanwhile
+            self._set(university, self.slots.get(university, 0) + 1, WAITLIST)
+            if self._eligible(university):
+                heapq.heappush(self.heap, self._entry(university))
+            return university
+        return None
+
+    def release(self, university, keep, reason):
+        """
+        Cut a university down to ``keep`` slots and hand the rest on.
+
+        The university leaves the waitlist for good. Returns the seats that
+        nobody could take (everyone else is full).
+        """
+        university = normalize_university_name(university)
+        self.closed.add(university)
+        freed = self.slots.get(university, 0) - keep
+        if freed <= 0:
+            return 0
+        self._set(university, keep, reason)
+        unfilled = 0
+        for _ in range(freed):
+            if self.grant_next() is None:
+                unfilled += 1
+        return unfilled
+
+    def changes(self):
+        """Rows for the universities whose slots differ from the start of the run."""
+        return [{'University': u, 'Old Slots': old, 'New Slots': self.slots[u],
+                 'Reason': self.reasons[u]}
+                for u, old in self.old.items() if self.slots[u] != old]
+
+
+def unpaid_events(slots, rollup_path, granted, grace):
+    """(university, paid teams) for everyone who paid for fewer teams than allocated.
+
+    Universities that got a waitlist seat within ``grace`` are left alone -
+    they haven't had time to pay yet.
+    """
+    if not os.path.exists(rollup_path):
+        raise SystemExit(f"❌ Error: {rollup_path} not found - run reconcile_payments.py first")
+    totals = jsonio.load(rollup_path).get('totals', {})
+    now = datetime.now()
+    events = []
+    for university, t in totals.items():
+        key = normalize_university_name(university)
+        since = granted.get(key)
+        if since and now - datetime.fromisoformat(since) < grace:
+            continue
+        if t['paid'] < slots.get(key, 0):
+            events.append((key, t['paid']))
+    return events
+
+
+def write_changes(rows, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CHANGE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def _keep_arg(value):
+    university, sep, count = value.rpartition('=')
+    if not sep or not count.strip().isdigit():
+        raise argparse.ArgumentTypeError(f"expected UNIVERSITY=SLOTS, got '{value}'")
+    return university, int(count)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Reallocate declined and unpaid slots from the waitlist')
+    p.add_argument('--decline', nargs='+', default=[], metavar='UNIVERSITY',
+                   help='Universities giving up all their slots')
+    p.add_argument('--keep', nargs='+', type=_keep_arg, default=[], metavar='UNIVERSITY=SLOTS',
+                   help='Universities keeping only some of their slots')
+    p.add_argument('--unpaid', action='store_true',
+                   help='Release slots not paid for by CONFIRMATION_DEADLINE (from the payment rollup)')
+    p.add_argument('--force', action='store_true', help='With --unpaid: even before the deadline')
+    p.add_argument('--grace-hours', type=float, default=WAITLIST_PAYMENT_HOURS,
+                   help='With --unpaid: spare universities given a waitlist seat this recently '
+                        '(default: WAITLIST_PAYMENT_HOURS, their payment deadline)')
+    p.add_argument('--slots', default='final_slot.csv', help='Slot allocation to update')
+    p.add_argument('--json', default='university_teams.json', help='Registered teams per university')
+    p.add_argument('--scores', default=str(DEFAULT_SCORES),
+                   help='Ratings CSV ordering the waitlist (default: registered teams if missing)')
+    p.add_argument('--score-col', default='decayed_score', help='Score column in --scores')
+    p.add_argument('--cap', type=int, help='Max slots per university from the waitlist')
+    p.add_argument('--rollup', default=DEFAULT_ROLLUP, help='Payment rollup state')
+    p.add_argument('--state', default=DEFAULT_STATE, help='Released universities and waitlist grants')
+    p.add_argument('--changes', default='slot_changes.csv', help='Delta of this run')
+    p.add_argument('--dry-run', action='store_true', help='Show the delta without writing anything')
+    args = p.parse_args(argv)
+
+    events = [(u, 0, 'Declined') for u in args.decline]
+    events += [(u, n, 'Declined (partial)') for u, n in args.keep]
+
+    slots = load_slots(args.slots)
+    closed, granted = load_state(args.state)
+    if args.unpaid:
+        deadline = datetime.fromisoformat(CONFIRMATION_DEADLINE)
+        if datetime.now() < deadline and not args.force:
+            print(f"⚠ Deadline {CONFIRMATION_DEADLINE} not reached yet - pass --force to release anyway")
+            return 1
+        unpaid = unpaid_events(slots, args.rollup, granted, timedelta(hours=args.grace_hours))
+        events += [(u, paid, 'Unpaid') for u, paid in unpaid]
+    if not events:
+        p.error('nothing to release: pass --decline, --keep or --unpaid')
+
+    teams = load_teams(args.json)
+    scores = load_scores(args.scores, args.score_col)
+    print(f"📊 Waitlist ordered by {'ratings from ' + args.scores if scores is not None else 'registered teams'}")
+    waitlist = Waitlist(slots, teams, scores, closed, args.cap)
+
+    unfilled = 0
+    for university, keep, reason in events:
+        if normalize_university_name(university) not in teams:
+            print(f"⚠ {university}: not in {args.json}, skipped")
+            continue
+        unfilled += waitlist.release(university, keep, reason)
+
+    rows = waitlist.changes()
+    print(f"\n🔁 {len(events)} release(s), {len(rows)} universities changed:")
+    for row in rows:
+        print(f"   • {row['University']}: {row['Old Slots']} → {row['New Slots']} ({row['Reason']})")
+    if unfilled:
+        print(f"⚠ {unfilled} seat(s) left unfilled - every other university is full")
+    if args.dry_run:
+        print("\n📝 DRY RUN - nothing written")
+        return 0
+
+    now = datetime.now().isoformat(timespec='seconds')
+    granted.update({row['University']: now for row in rows if row['Reason'] == WAITLIST})
+    save_slots(waitlist.slots, args.slots)
+    save_state(waitlist.closed, granted, args.state)
+    write_changes(rows, args.changes)
+    print(f"\n✓ Updated {args.slots}")
+    print(f"✓ Created {args.changes}")
+    if rows:
+        print(f"   Next: python3 split_universities_by_slots.py --changes {args.changes}")
+        print(f"         python3 send_slot_emails.py --only {args.changes}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
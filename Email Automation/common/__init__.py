@@ -0,0 +1,5 @@
+"""Shared helpers for the CC and Bulk email senders.
+
+Scripts in the sibling folders add the parent directory to ``sys.path`` and
+import from here, e.g. ``from common.records import University``.
+"""
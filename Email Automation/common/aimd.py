@@ -0,0 +1,156 @@
+"""
+Adaptive send concurrency (AIMD) instead of a fixed SECONDS_BETWEEN_EMAILS.
+
+The right pace depends on the Brevo plan and on how busy the API is, so a
+fixed delay is either too slow or trips the rate limit. ``AIMDLimiter`` keeps
+a limit on requests in flight and adjusts it from each ``SendResult``:
+
+- success with normal latency  -> +increase per window (additive increase)
+- 429, 5xx, network error or a latency spike (> spike_factor x the running
+  average)                     -> limit x decrease (multiplicative decrease),
+  at most once per average round trip so one burst of errors counts once
+
+``send_adaptive()`` runs a send loop under the limiter on a thread pool.
+Requests that failed with a retryable error are put back in the queue (up to
+``max_attempts``), since probing for the limit is expected to hit 429s. A
+retry is held back with exponential backoff and jitter - cutting the limit
+alone doesn't slow down failures that take no time. A 429 that was answered
+without a request (no latency) doesn't use up an attempt; payloads the
+circuit breaker already parked in the outbox, and sends refused because every
+key used up its daily limit, are not retried.
+Results are handed to ``on_done`` on the calling thread, so callers can update
+DataFrames and print without locks.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional, TypeVar
+
+from common.brevo import QUOTA_EXHAUSTED_ERROR, SendResult
+
+T = TypeVar("T")
+
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests."""
+
+    def __init__(self, initial: float = 2, minimum: float = 1, maximum: float = 16,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 spike_factor: float = 3.0, min_spike: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.spike_factor = spike_factor
+        self.min_spike = min_spike          # latencies below this are never spikes
+        self.avg_latency: Optional[float] = None
+        self.peak = self.limit
+        self.cuts = 0
+        self._last_cut = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> int:
+        """Number of requests allowed in flight right now."""
+        return max(1, int(self.limit))
+
+    def _is_spike(self, latency: float) -> bool:
+        return (self.avg_latency is not None
+                and latency > self.min_spike
+                and latency > self.spike_factor * self.avg_latency)
+
+    def on_result(self, result: SendResult) -> None:
+        with self._lock:
+            congested = (not result.ok and result.retryable) or self._is_spike(result.latency)
+            if congested:
+                # One cut per round trip: errors from the same burst count once
+                now = time.monotonic()
+                if now - self._last_cut >= (self.avg_latency or 0.0):
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.cuts += 1
+                    self._last_cut = now
+            elif result.ok:
+                # +increase once the whole window has been acknowledged
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+                self.peak = max(self.peak, self.limit)
+            if result.ok and not self._is_spike(result.latency):
+                self.avg_latency = (result.latency if self.avg_latency is None
+                                    else 0.8 * self.avg_latency + 0.2 * result.latency)
+
+    def summary(self) -> str:
+        avg = f"{self.avg_latency:.2f}s" if self.avg_latency is not None else "n/a"
+        return (f"final concurrency {self.current} (peak {int(self.peak)}, "
+                f"{self.cuts} slow-down(s), avg latency {avg})")
+
+
+def backoff_delay(tries: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Seconds to hold back the tries-th retry: base * 2**(tries - 1), capped, half of it jittered."""
+    delay = min(cap, base * 2 ** (tries - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def send_adaptive(
+    items: Iterable[T],
+    send_fn: Callable[[T], SendResult],
+    on_done: Callable[[T, SendResult], None],
+    limiter: Optional[AIMDLimiter] = None,
+    max_attempts: int = 3,
+    backoff: float = 1.0,
+    max_backoff: float = 30.0,
+) -> AIMDLimiter:
+    """
+    Send items concurrently under an AIMD limit.
+
+    Args:
+        items: Work items (e.g. DataFrame index labels or payload tuples)
+        send_fn: Sends one item, returns SendResult (called on worker threads)
+        on_done: Called on this thread with the final result for each item
+        limiter: AIMDLimiter to use (a default one is created if None)
+        max_attempts: Tries per item for retryable failures (429/5xx/network)
+        backoff: Delay before an item's first retry, doubled on each further retry
+        max_backoff: Longest delay before a retry
+
+    Returns:
+        The limiter, for its final limit and counters
+    """
+    limiter = limiter or AIMDLimiter()
+    queue = deque((item, 1, 0) for item in items)  # (item, attempt, retries so far)
+    held = []                                        # heap of (ready at, seq, item, attempt, retries)
+    seq = itertools.count()
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=int(limiter.maximum)) as pool:
+        while queue or held or in_flight:
+            now = time.monotonic()
+            while held and held[0][0] <= now:
+                _, _, *entry = heapq.heappop(held)
+                queue.append(tuple(entry))
+            while queue and len(in_flight) < limiter.current:
+                item, attempt, retries = queue.popleft()
+                in_flight[pool.submit(send_fn, item)] = (item, attempt, retries)
+            if not in_flight:
+                time.sleep(max(0.0, held[0][0] - now))  # only held-back retries left
+                continue
+            timeout = max(0.0, held[0][0] - time.monotonic()) if held else None
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, attempt, retries = in_flight.pop(future)
+                result = future.result()
+                limiter.on_result(result)
+                retry = (not result.ok and result.retryable and result.queued is None
+                         and result.info != QUOTA_EXHAUSTED_ERROR)
+                # A 429 without latency was refused locally; Brevo never saw it
+                requested = not (result.status == 429 and result.latency == 0)
+                if retry and (attempt < max_attempts or not requested):
+                    ready = time.monotonic() + backoff_delay(retries + 1, backoff, max_backoff)
+                    heapq.heappush(held, (ready, next(seq), item,
+                                          attempt + 1 if requested else attempt, retries + 1))
+                else:
+                    on_done(item, result)
+    return limiter
@@ -0,0 +1,145 @@
+"""
+Circuit breaker around the Brevo transport.
+
+When Brevo is down every send waits for the full request timeout, so a long
+send loop can spend hours timing out row after row. ``CircuitBreaker`` wraps
+``post_email()``:
+
+    closed     normal sending; consecutive outage failures (timeouts,
+               connection errors, 5xx) are counted
+    open       after ``failure_threshold`` of them, sends fail immediately and
+               the payload is parked in the shared outbox
+               (``python -m common.quota drain`` sends it later)
+    half-open  once the cooldown is over, the next send is a probe with a
+               short timeout; success closes the circuit, failure reopens it
+               with a doubled cooldown (up to ``max_cooldown``)
+
+Rate limits (429) and other 4xx answers mean Brevo is up, and a missing API
+key never reached it, so none of them count as outage failures.
+
+Probes only happen on sends made after the cooldown. A send loop that
+moves on as soon as a send fails fast parks the rest of its run within
+milliseconds; those emails go out with the next ``drain``, not mid-run.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+from common.brevo import DEFAULT_TIMEOUT, MISSING_KEY_ERROR, SendResult, post_email
+from common.quota import QuotaScheduler
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+CIRCUIT_OPEN_ERROR = "Circuit open: Brevo unavailable"
+
+
+def is_outage(result: SendResult) -> bool:
+    """Failures that say the API is down rather than that the request was bad."""
+    if result.ok or result.info == MISSING_KEY_ERROR:
+        return False
+    return result.status is None or result.status >= 500
+
+
+class CircuitBreaker:
+    """Fail fast while Brevo is down and resume by itself once it is back."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        probe_timeout: float = 10.0,
+        send_fn: Callable[..., SendResult] = post_email,
+        campaign: Optional[str] = None,
+        park: bool = True,
+        outbox: Optional[QuotaScheduler] = None,
+    ):
+        """
+        Args:
+            failure_threshold: Consecutive outage failures that open the circuit
+            cooldown: Seconds before the first half-open probe
+            max_cooldown: Upper bound for the cooldown after failed probes
+            probe_timeout: Request timeout used for probes
+            send_fn: Transport, called as send_fn(payload, api_key, timeout=...)
+            campaign: Outbox campaign name for parked payloads
+            park: Queue payloads that failed because of an outage in the outbox
+            outbox: QuotaScheduler to park them in (default outbox if None)
+        """
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self.send_fn = send_fn
+        self.campaign = campaign
+        self.park = park
+        self.outbox = outbox
+        self.state = CLOSED
+        self.failures = 0
+        self.fast_failed = 0
+        self.parked = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        print(f"🔌 Brevo looks down - failing fast, next probe in {self.cooldown:.0f}s")
+
+    def _admit(self):
+        """Decide how to handle a send: (allowed, timeout, is_probe)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True, DEFAULT_TIMEOUT, False
+            if (self.state == OPEN and not self._probing
+                    and time.monotonic() - self._opened_at >= self.cooldown):
+                self.state = HALF_OPEN
+                self._probing = True
+                return True, self.probe_timeout, True
+            return False, 0.0, False
+
+    def _record(self, result: SendResult, probe: bool) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+            if is_outage(result):
+                self.failures += 1
+                if probe:
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                    self._open()
+                elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                    self._open()
+            else:
+                if self.state != CLOSED:
+                    print("🔌 Brevo is back - circuit closed")
+                self.state = CLOSED
+                self.failures = 0
+                self.cooldown = self.base_cooldown
+
+    def _park(self, payload: dict, result: SendResult) -> SendResult:
+        if self.park:
+            if self.outbox is None:
+                self.outbox = QuotaScheduler()
+            result.queued = self.outbox.enqueue(self.campaign or "retry", payload)
+            self.parked += 1
+        return result
+
+    def send(self, payload: dict, api_key: str) -> SendResult:
+        """Send one payload through the breaker (same contract as post_email)."""
+        allowed, timeout, probe = self._admit()
+        if not allowed:
+            self.fast_failed += 1
+            return self._park(payload, SendResult(False, CIRCUIT_OPEN_ERROR, None, 0.0))
+        result = self.send_fn(payload, api_key, timeout=timeout)
+        self._record(result, probe)
+        if is_outage(result) and self.state != CLOSED:
+            return self._park(payload, result)
+        return result
+
+    def summary(self) -> str:
+        return (f"circuit {self.state}, {self.fast_failed} send(s) failed fast, "
+                f"{self.parked} parked in the outbox for retry")
@@ -0,0 +1,94 @@
+"""
+Minimal Brevo transactional email transport shared by the senders.
+
+``post_email()`` posts one ``/v3/smtp/email`` payload (the same JSON the
+scripts build today) and reports the outcome the same way the per-script
+``send_email_brevo()`` functions do, plus the HTTP status and latency so
+callers can make pacing decisions.
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+BREVO_URL = "https://api.brevo.com/v3/smtp/email"
+DEFAULT_TIMEOUT = 30
+
+# Local configuration error: no request was made, so it says nothing about Brevo
+MISSING_KEY_ERROR = "Missing BREVO_API_KEY"
+# No request was made either: every sender key used up its daily limit (common/senders.py)
+QUOTA_EXHAUSTED_ERROR = "All sender keys used up their daily limit"
+
+
+@dataclass(slots=True)
+class SendResult:
+    """Outcome of one API call."""
+    ok: bool
+    info: str                  # messageId on success, error message otherwise
+    status: Optional[int]      # HTTP status, None for timeouts/connection errors
+    latency: float             # seconds
+    queued: Optional[int] = None  # outbox id if the payload was parked for a later retry
+
+    @property
+    def retryable(self) -> bool:
+        """Rate limits, server errors and network failures are worth retrying."""
+        if self.info == MISSING_KEY_ERROR:
+            return False
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+def key_id(api_key: str) -> str:
+    """Short, non-secret identifier for an API key (safe to store on disk)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def headers_for(api_key: str) -> dict:
+    return {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "api-key": api_key,
+    }
+
+
+def post_email(payload: dict, api_key: str, timeout: float = DEFAULT_TIMEOUT,
+               session=None, url: str = BREVO_URL) -> SendResult:
+    """
+    Send one transactional email payload via Brevo.
+
+    Args:
+        payload: /v3/smtp/email JSON body
+        api_key: Brevo API key
+        timeout: Request timeout in seconds
+        session: Optional requests.Session to reuse connections
+
+    Returns:
+        SendResult
+    """
+    if not api_key:
+        return SendResult(False, MISSING_KEY_ERROR, None, 0.0)
+
+    http = session or requests
+    start = time.monotonic()
+    try:
+        r = http.post(url, json=payload, headers=headers_for(api_key), timeout=timeout)
+        latency = time.monotonic() - start
+        if 200 <= r.status_code < 300:
+            try:
+                msg_id = r.json().get("messageId", "OK")
+            except Exception:
+                msg_id = "OK"
+            return SendResult(True, msg_id, r.status_code, latency)
+        try:
+            error_msg = r.json().get("message", r.text)
+        except Exception:
+            error_msg = r.text
+        return SendResult(False, f"HTTP {r.status_code}: {error_msg}", r.status_code, latency)
+    except requests.exceptions.Timeout:
+        return SendResult(False, "Request timeout", None, time.monotonic() - start)
+    except requests.exceptions.RequestException as e:
+        return SendResult(False, f"Request error: {str(e)}", None, time.monotonic() - start)
+    except Exception as e:
+        return SendResult(False, f"Unexpected error: {str(e)}", None, time.monotonic() - start)
@@ -0,0 +1,139 @@
+"""
+Recipient dedup and CC coalescing across overlapping teams.
+
+Team-based senders send one email per team, so a coach or member on several
+teams gets several nearly identical emails. ``plan_messages()`` builds a
+recipient -> messages index and, depending on the policy, merges messages so
+each person gets fewer copies:
+
+    none          one message per team (current behaviour; still reports overlaps)
+    by-to         merge teams that share the same primary (To) recipient
+    by-recipient  merge a team into another whose recipients include all of
+                  its own (same people, or a subset), so nobody is CC'd with
+                  strangers
+    linked        merge every group of teams linked by any chain of shared
+                  recipients, so each address receives exactly one message;
+                  members of unrelated teams see each other's addresses, so
+                  this is opt-in and best used with ``max_teams_per_message``
+
+A merged message keeps the first team's To address and CCs everyone else.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+POLICIES = ("none", "by-to", "by-recipient", "linked")
+
+
+@dataclass(slots=True)
+class PlannedMessage:
+    """One API call: the teams it covers and its recipients."""
+    teams: Tuple[str, ...]
+    to: str
+    cc: Tuple[str, ...]
+
+    @property
+    def display_name(self) -> str:
+        """Team name(s) for greetings/subjects, e.g. 'A, B and C'."""
+        if len(self.teams) == 1:
+            return self.teams[0]
+        return ", ".join(self.teams[:-1]) + " and " + self.teams[-1]
+
+
+@dataclass
+class CoalescePlan:
+    """Result of plan_messages()."""
+    policy: str
+    messages: List[PlannedMessage]
+    original_count: int
+    recipient_index: Dict[str, List[int]] = field(default_factory=dict)
+
+    @property
+    def saved_calls(self) -> int:
+        return self.original_count - len(self.messages)
+
+    def overlapping_recipients(self) -> Dict[str, int]:
+        """Recipients that appeared in more than one original team message."""
+        return {e: len(ids) for e, ids in self.recipient_index.items() if len(ids) > 1}
+
+    def print_report(self) -> None:
+        overlaps = self.overlapping_recipients()
+        print(f"📬 Coalescing policy: {self.policy}")
+        print(f"   Team messages: {self.original_count} → API calls: {len(self.messages)} "
+              f"(saved {self.saved_calls})")
+        if overlaps:
+            worst = sorted(overlaps.items(), key=lambda kv: -kv[1])[:5]
+            print(f"   {len(overlaps)} recipient(s) are on several teams, e.g. "
+                  + ", ".join(f"{e} ×{n}" for e, n in worst))
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def plan_messages(
+    teams: Sequence[Tuple[str, Sequence[str]]],
+    policy: str = "none",
+    max_teams_per_message: Optional[int] = None,
+) -> CoalescePlan:
+    """
+    Plan the API calls for a team-based campaign.
+
+    Args:
+        teams: (team_name, emails) pairs; emails[0] is the team's To address.
+            Emails should already be normalized (see recipients.clean_recipients)
+        policy: One of POLICIES
+        max_teams_per_message: Cap on teams merged into one message (None = no cap)
+
+    Returns:
+        CoalescePlan with the messages to send, in first-seen team order
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown coalescing policy '{policy}' (choose from {', '.join(POLICIES)})")
+
+    teams = [(name, list(emails)) for name, emails in teams if emails]
+
+    # recipient -> indexes of the team messages that include them
+    index: Dict[str, List[int]] = defaultdict(list)
+    for i, (_, emails) in enumerate(teams):
+        for email in dict.fromkeys(emails):
+            index[email].append(i)
+
+    # Group team indexes with a disjoint set
+    parent = list(range(len(teams)))
+    if policy == "by-recipient":
+        # Each team joins the largest team containing all of its recipients
+        # (itself if none); subsets are transitive, so that team is its root
+        for i, (_, emails) in enumerate(teams):
+            containing = set.intersection(*(set(index[e]) for e in emails))
+            parent[i] = max(containing, key=lambda j: (len(set(teams[j][1])), -j))
+    elif policy != "none":
+        for email, ids in index.items():
+            if policy == "by-to":
+                ids = [i for i in ids if teams[i][1][0] == email]
+            for other in ids[1:]:
+                a, b = _find(parent, ids[0]), _find(parent, other)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(teams)):
+        groups[_find(parent, i)].append(i)
+
+    messages = []
+    for members in sorted(groups.values(), key=lambda m: m[0]):
+        step = max_teams_per_message or len(members)
+        for start in range(0, len(members), step):
+            chunk = members[start:start + step]
+            recipients = list(dict.fromkeys(e for i in chunk for e in teams[i][1]))
+            messages.append(PlannedMessage(
+                teams=tuple(teams[i][0] for i in chunk),
+                to=recipients[0],
+                cc=tuple(recipients[1:]),
+            ))
+
+    return CoalescePlan(policy, messages, len(teams), dict(index))
@@ -0,0 +1,260 @@
+"""
+Contact normalization and linking registrations through shared contacts.
+
+Registration forms are typed by hand: one university shows up under
+several spellings, but its registrations still share coach emails and
+phone numbers. ``link_groups()`` joins groups (e.g. normalized university
+names) that share any contact key, using a disjoint-set forest with path
+halving and union by size, so a whole form is linked in near-linear time.
+
+``find_member_conflicts()`` builds an inverted index from every member's
+normalized email and phone to the registrations listing it, in one pass
+over the form, and reports contacts that appear on several teams.
+
+Usage (from the ``Email Automation`` folder):
+    python -m common.contacts conflicts "path/to/form.csv" [--out member_conflicts.csv]
+"""
+
+import argparse
+import re
+import sys
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from common.recipients import normalize_email, normalize_series, valid_mask
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(value) -> str:
+    """Bangladeshi mobile number as 11 digits ('01XXXXXXXXX'), or '' if unusable.
+
+    Accepts spaces/dashes, a +88/88 country code and a dropped leading 0.
+    """
+    if value is None:
+        return ""
+    text = str(value).strip()
+    if text.endswith(".0"):
+        # Read from a float column by pandas
+        text = text[:-2]
+    digits = _NON_DIGITS.sub("", text)
+    if len(digits) == 13 and digits.startswith("880"):
+        digits = digits[2:]
+    elif len(digits) == 10 and digits.startswith("1"):
+        digits = "0" + digits
+    return digits if len(digits) == 11 and digits.startswith("01") else ""
+
+
+def normalize_phone_series(phones: pd.Series) -> pd.Series:
+    """Vectorized normalize_phone() over a column."""
+    text = phones.fillna("").astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    digits = text.str.replace(_NON_DIGITS.pattern, "", regex=True)
+    lengths = digits.str.len()
+    digits = digits.mask((lengths == 13) & digits.str.startswith("880"), digits.str[2:])
+    digits = digits.mask((lengths == 10) & digits.str.startswith("1"), "0" + digits)
+    return digits.where((digits.str.len() == 11) & digits.str.startswith("01"), "")
+
+
+def contact_keys(email=None, phone=None) -> List[str]:
+    """Typed keys ('email:...', 'phone:...') for the usable contacts of one row."""
+    keys = []
+    email = normalize_email(email)
+    if email:
+        keys.append(f"email:{email}")
+    phone = normalize_phone(phone)
+    if phone:
+        keys.append(f"phone:{phone}")
+    return keys
+
+
+class DisjointSet:
+    """Union-find over hashable items, added on first use."""
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.size: Dict[Hashable, int] = {}
+
+    def add(self, item: Hashable) -> None:
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+
+    def find(self, item: Hashable) -> Hashable:
+        self.add(item)
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]  # path halving
+            item = parent[item]
+        return item
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return ra
+
+
+def link_groups(
+    memberships: Iterable[Tuple[str, Iterable[str]]],
+) -> Tuple[List[List[str]], Dict[str, Set[str]]]:
+    """
+    Join groups that share a contact key.
+
+    Args:
+        memberships: (group, contact keys) per registration row
+
+    Returns:
+        (components, shared) - components lists the groups of every set with
+        more than one group, in first-seen order; shared maps each contact key
+        used by several groups to those groups (the links, for review)
+    """
+    forest = DisjointSet()
+    seen: Dict[str, None] = {}
+    groups_by_key: Dict[str, Set[str]] = {}
+    for group, keys in memberships:
+        seen.setdefault(group)
+        node = ("group", group)
+        forest.add(node)
+        for key in keys:
+            forest.union(node, ("contact", key))
+            groups_by_key.setdefault(key, set()).add(group)
+
+    components: Dict[Hashable, List[str]] = {}
+    for group in seen:
+        components.setdefault(forest.find(("group", group)), []).append(group)
+    shared = {key: groups for key, groups in groups_by_key.items() if len(groups) > 1}
+    return [c for c in components.values() if len(c) > 1], shared
+
+
+# ========================================
+# MEMBER CONFLICTS
+# ========================================
+
+# Conflict kinds
+DUPLICATE_SUBMISSION = "duplicate submission"  # same team name submitted again
+CROSS_TEAM = "cross-team"                      # one person on different teams
+
+
+def member_columns(columns: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """(email columns, phone columns) of team members, found by header."""
+    email_cols, phone_cols = [], []
+    for col in columns:
+        name = str(col).lower()
+        if "member" not in name:
+            continue
+        if "email" in name:
+            email_cols.append(col)
+        elif "mobile" in name or "phone" in name:
+            phone_cols.append(col)
+    return email_cols, phone_cols
+
+
+def _stacked(df: pd.DataFrame, cols: Sequence[str]) -> pd.Series:
+    """Non-empty cells of several columns as one Series indexed by row label."""
+    if not cols:
+        return pd.Series(dtype=object)
+    stacked = df[list(cols)].stack()
+    return stacked.reset_index(level=1, drop=True).astype(str)
+
+
+def find_member_conflicts(
+    df: pd.DataFrame,
+    label_col: str = "Team Name",
+    email_cols: Optional[Sequence[str]] = None,
+    phone_cols: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Contacts that appear on more than one registration.
+
+    Args:
+        df: Form responses, one registration per row
+        label_col: Column naming the registration (team name)
+        email_cols, phone_cols: Member contact columns (default: member_columns())
+
+    Returns:
+        DataFrame with Contact, Kind, Count and Registrations ("Team (row N)",
+        N being the spreadsheet row) - one row per conflicting contact
+    """
+    if email_cols is None or phone_cols is None:
+        found_email, found_phone = member_columns(df.columns)
+        email_cols = found_email if email_cols is None else email_cols
+        phone_cols = found_phone if phone_cols is None else phone_cols
+
+    emails = normalize_series(_stacked(df, email_cols))
+    emails = "email:" + emails[valid_mask(emails)]
+    phones = normalize_phone_series(_stacked(df, phone_cols))
+    phones = "phone:" + phones[phones != ""]
+
+    # Inverted index: contact -> registrations, one entry per (row, contact)
+    index = pd.DataFrame({"contact": pd.concat([emails, phones])})
+    index["row"] = index.index
+    index = index.drop_duplicates()
+    index = index[index.groupby("contact")["row"].transform("size") > 1]
+    columns = ["Contact", "Kind", "Count", "Registrations"]
+    if index.empty:
+        return pd.DataFrame(columns=columns)
+
+    labels = df[label_col].fillna("").astype(str).str.strip()
+    # +2: header line plus 1-based spreadsheet rows
+    rows = pd.Series(range(2, len(df) + 2), index=df.index).astype(str)
+    index["name"] = labels.loc[index["row"]].to_numpy()
+    index["key"] = index["name"].str.lower()
+    index["entry"] = index["name"] + " (row " + rows.loc[index["row"]].to_numpy() + ")"
+
+    grouped = index.groupby("contact", sort=True)
+    report = pd.DataFrame({
+        "Kind": grouped["key"].nunique().map(lambda n: DUPLICATE_SUBMISSION if n == 1 else CROSS_TEAM),
+        "Count": grouped.size(),
+        "Registrations": grouped["entry"].agg("; ".join),
+    })
+    return report.rename_axis("Contact").reset_index()[columns]
+
+
+def report_conflicts(conflicts: pd.DataFrame, out_path=None, show: int = 10) -> None:
+    """Print a conflict summary and optionally save the full report as CSV."""
+    if out_path:
+        # Written even when empty, so an old report never outlives its fixes
+        conflicts.to_csv(out_path, index=False, encoding="utf-8")
+    if conflicts.empty:
+        print("✓ No member is registered on more than one team")
+        return
+    kinds = conflicts["Kind"].value_counts()
+    print(f"⚠ {len(conflicts)} member contact(s) appear on several registrations "
+          f"({kinds.get(CROSS_TEAM, 0)} cross-team, "
+          f"{kinds.get(DUPLICATE_SUBMISSION, 0)} duplicate submissions)")
+    for _, c in conflicts.sort_values("Kind").head(show).iterrows():
+        print(f"  - [{c['Kind']}] {c['Contact']}: {c['Registrations']}")
+    if len(conflicts) > show:
+        print(f"  ... and {len(conflicts) - show} more")
+    if out_path:
+        print(f"  Full report: {out_path}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Registration contact checks')
+    sub = p.add_subparsers(dest='command', required=True)
+    c = sub.add_parser('conflicts', help='Members registered on several teams')
+    c.add_argument('csv', help='Form responses CSV')
+    c.add_argument('--team-col', default='Team Name', help='Column with the team name')
+    c.add_argument('--out', help='Write the full report to this CSV')
+    args = p.parse_args(argv)
+
+    df = pd.read_csv(args.csv, dtype=str)
+    if args.team_col not in df.columns:
+        print(f"❌ Error: Missing column '{args.team_col}' in CSV")
+        return 1
+    email_cols, phone_cols = member_columns(df.columns)
+    print(f"📄 {len(df)} registrations, {len(email_cols)} email and {len(phone_cols)} phone column(s)")
+    conflicts = find_member_conflicts(df, args.team_col, email_cols, phone_cols)
+    # Without a report file, list every conflict on screen
+    report_conflicts(conflicts, args.out, show=10 if args.out else len(conflicts))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
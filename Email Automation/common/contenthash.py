@@ -0,0 +1,142 @@
+"""
+Per-recipient content hashes, for resending only what a correction changed.
+
+After a wrong link or deadline in the config, or a changed slot count or
+bKash number for one university, the only option used to be resending the
+whole campaign. Senders now store a hash of every recipient's rendered
+subject, bodies and recipient list when the email goes out. A correction
+run renders everything again in memory, compares the hashes and sends only
+to recipients whose email would differ - one fixed row costs one API call.
+
+Hashes live in the ``content_hashes`` table of the shared outbox database,
+one row per (campaign, recipient key).
+
+Usage (from the ``Email Automation`` folder):
+    python -m common.contenthash list [--campaign NAME]
+    python -m common.contenthash forget --campaign NAME [--key KEY]
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+from common.quota import DEFAULT_DB, now_iso
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_hashes (
+    campaign    TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    hash        TEXT NOT NULL,
+    message_id  TEXT,
+    sent_at     TEXT NOT NULL,
+    PRIMARY KEY (campaign, key)
+);
+"""
+
+# Status of a recipient in a correction run
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+def content_hash(*parts: str) -> str:
+    """Hash of an email's rendered parts (subject, bodies, recipients, ...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ContentLedger:
+    """Last sent content hash per campaign and recipient."""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = str(db_path)
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def hashes(self, campaign: str) -> Dict[str, str]:
+        db = self._connect()
+        try:
+            return dict(db.execute("SELECT key, hash FROM content_hashes WHERE campaign = ?",
+                                   (campaign,)).fetchall())
+        finally:
+            db.close()
+
+    def compare(self, campaign: str, digests: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+        """{key: NEW | CHANGED | UNCHANGED} for (key, hash) pairs of a fresh render."""
+        known = self.hashes(campaign)
+        return {
+            key: NEW if key not in known else CHANGED if known[key] != digest else UNCHANGED
+            for key, digest in digests
+        }
+
+    def record(self, campaign: str, key: str, digest: str, message_id: Optional[str] = None) -> None:
+        db = self._connect()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?, ?)",
+                           (campaign, key, digest, message_id, now_iso()))
+        finally:
+            db.close()
+
+    def rows(self, campaign: Optional[str] = None):
+        sql = "SELECT campaign, key, hash, message_id, sent_at FROM content_hashes"
+        params = ()
+        if campaign:
+            sql += " WHERE campaign = ?"
+            params = (campaign,)
+        db = self._connect()
+        try:
+            return db.execute(sql + " ORDER BY campaign, key", params).fetchall()
+        finally:
+            db.close()
+
+    def forget(self, campaign: str, key: Optional[str] = None) -> int:
+        sql, params = "DELETE FROM content_hashes WHERE campaign = ?", (campaign,)
+        if key is not None:
+            sql, params = sql + " AND key = ?", (campaign, key)
+        db = self._connect()
+        try:
+            with db:
+                return db.execute(sql, params).rowcount
+        finally:
+            db.close()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Show or reset sent-content hashes')
+    p.add_argument('--db', default=str(DEFAULT_DB), help='Outbox SQLite file')
+    sub = p.add_subparsers(dest='command', required=True)
+    ls = sub.add_parser('list', help='Show stored hashes')
+    ls.add_argument('--campaign')
+    f = sub.add_parser('forget', help='Drop hashes so the next correction run resends')
+    f.add_argument('--campaign', required=True)
+    f.add_argument('--key', help='Only this recipient key')
+    args = p.parse_args(argv)
+
+    ledger = ContentLedger(args.db)
+    if args.command == 'list':
+        rows = ledger.rows(args.campaign)
+        for campaign, key, digest, message_id, sent_at in rows:
+            print(f"{sent_at}  [{campaign}] {key:<48} {digest[:12]}  {message_id or ''}")
+        print(f"\n{len(rows)} recipient(s)")
+        return 0
+
+    print(f"🗑  Forgot {ledger.forget(args.campaign, args.key)} hash(es)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
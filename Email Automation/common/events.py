@@ -0,0 +1,467 @@
+"""
+Delivery events from Brevo transactional webhooks.
+
+After a send all we keep is the ``messageId``. ``serve`` runs a small local
+HTTP receiver for Brevo's webhook (delivered, soft/hard bounce, blocked,
+opened, ...) and stores every event in the ``events`` table of the shared
+outbox database, indexed by message id, recipient, campaign and university.
+
+- request handlers only put events on a queue; one writer thread inserts
+  everything queued so far in one transaction, so during a burst the
+  events that arrive while a commit runs share the next commit
+- a request is answered 200 only after its events were committed; if the
+  write fails Brevo gets a 500 and retries, so nothing is dropped. Retries
+  and duplicates are ignored by a unique index; malformed events are logged
+  and skipped
+- hard bounces, blocks, invalid addresses and spam complaints are added to
+  the pre-send suppression list (common/recipients.py)
+
+Campaign and university come from the message's tags: senders tag their
+payloads with ``message_tags(CAMPAIGN, university)``.
+
+Usage (from the ``Email Automation`` folder):
+    python -m common.events serve [--port 8787] [--token SECRET]
+    python -m common.events stats [--by campaign|university] [--campaign NAME]
+    python -m common.events message <messageId or email>
+    python -m common.events generate [--count 1000] [--concurrency 20]
+"""
+
+import argparse
+import json
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from common.quota import DEFAULT_DB, now_iso
+from common.recipients import SuppressionList, normalize_email
+
+DEFAULT_PORT = 8787
+UNIVERSITY_TAG = "university:"
+
+# Events after which an address must not be emailed again
+SUPPRESS_EVENTS = {"hard_bounce", "blocked", "invalid_email", "spam"}
+
+# Most events committed in one transaction
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id   TEXT,
+    email        TEXT    NOT NULL,
+    event        TEXT    NOT NULL,
+    campaign     TEXT,
+    university   TEXT,
+    reason       TEXT,
+    ts           INTEGER NOT NULL,
+    received_at  TEXT    NOT NULL
+);
+-- COALESCE: a unique index never matches two NULL message ids
+CREATE UNIQUE INDEX IF NOT EXISTS events_key ON events (COALESCE(message_id, ''), email, event, ts);
+CREATE INDEX IF NOT EXISTS events_email ON events (email);
+CREATE INDEX IF NOT EXISTS events_campaign ON events (campaign, event);
+CREATE INDEX IF NOT EXISTS events_university ON events (university, event);
+"""
+
+INSERT = ("INSERT OR IGNORE INTO events (message_id, email, event, campaign, university, "
+          "reason, ts, received_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def message_tags(campaign: str, university: Optional[str] = None) -> List[str]:
+    """Brevo ``tags`` for a payload, so its events can be attributed later."""
+    tags = [campaign]
+    if university:
+        tags.append(f"{UNIVERSITY_TAG}{university}")
+    return tags
+
+
+def parse_tags(tags) -> Tuple[Optional[str], Optional[str]]:
+    """(campaign, university) from a webhook's tags."""
+    campaign = university = None
+    for tag in tags or []:
+        if tag.startswith(UNIVERSITY_TAG):
+            university = university or tag[len(UNIVERSITY_TAG):]
+        else:
+            campaign = campaign or tag
+    return campaign, university
+
+
+def _timestamp(value) -> int:
+    """Unix seconds from a webhook's ts_event/ts: a number or an ISO date."""
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        try:
+            return int(float(value))
+        except (ValueError, OverflowError):
+            pass
+        try:
+            return int(datetime.fromisoformat(str(value)).timestamp())
+        except ValueError:
+            pass
+    raise ValueError(f"bad timestamp {value!r}")
+
+
+def event_row(event: dict, received_at: str) -> tuple:
+    """Webhook JSON -> events row; ValueError if the event is malformed."""
+    email = event.get("email")
+    if not isinstance(email, str) or "@" not in email:
+        raise ValueError(f"bad email {email!r}")
+    tags = event.get("tags") or ([event["tag"]] if event.get("tag") else [])
+    if isinstance(tags, str):
+        tags = [tags]
+    if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+        raise ValueError(f"bad tags {tags!r}")
+    campaign, university = parse_tags(tags)
+    ts = event.get("ts_event") or event.get("ts") or int(time.time())
+    message_id, reason = event.get("message-id"), event.get("reason")
+    return (
+        None if message_id is None else str(message_id),
+        normalize_email(email),
+        str(event.get("event", "unknown")),
+        campaign,
+        university,
+        None if reason is None else str(reason),
+        _timestamp(ts),
+        received_at,
+    )
+
+
+# ========================================
+# STORE
+# ========================================
+
+class EventStore:
+    """Webhook events on disk, next to the outbox."""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = str(db_path)
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def insert(self, events: Iterable[dict], db: Optional[sqlite3.Connection] = None) -> int:
+        """Insert webhook events in one transaction; returns rows added (duplicates skipped)."""
+        received_at = now_iso()
+        rows = []
+        for e in events:
+            try:
+                rows.append(event_row(e, received_at))
+            except ValueError as err:
+                # Brevo would resend it forever: log it and store the rest
+                print(f"⚠️  Skipped malformed event ({err}): {json.dumps(e, default=str)[:200]}")
+        own = db is None
+        db = db or self._connect()
+        try:
+            with db:
+                before = db.total_changes
+                db.executemany(INSERT, rows)
+                return db.total_changes - before
+        finally:
+            if own:
+                db.close()
+
+    def stats(self, by: str = "campaign", campaign: Optional[str] = None):
+        """Rows of (group, event, messages): distinct messages per group and event."""
+        column = {"campaign": "campaign", "university": "university"}[by]
+        where, params = "", ()
+        if campaign:
+            where, params = "WHERE campaign = ?", (campaign,)
+        db = self._connect()
+        try:
+            return db.execute(
+                f"SELECT COALESCE({column}, '-'), event, COUNT(DISTINCT COALESCE(message_id, email)) "
+                f"FROM events {where} GROUP BY {column}, event ORDER BY {column}, event",
+                params,
+            ).fetchall()
+        finally:
+            db.close()
+
+    def history(self, key: str):
+        """Events of one message id or recipient, oldest first."""
+        column = "email" if "@" in key and not key.startswith("<") else "message_id"
+        if column == "email":
+            key = normalize_email(key)
+        db = self._connect()
+        try:
+            return db.execute(
+                f"SELECT ts, event, email, message_id, campaign, university, reason "
+                f"FROM events WHERE {column} = ? ORDER BY ts, id", (key,),
+            ).fetchall()
+        finally:
+            db.close()
+
+    def suppressible(self) -> List[Tuple[str, str]]:
+        """(email, event) for every address with a suppressing event."""
+        marks = ",".join("?" * len(SUPPRESS_EVENTS))
+        db = self._connect()
+        try:
+            return db.execute(
+                f"SELECT email, MIN(event) FROM events WHERE event IN ({marks}) GROUP BY email",
+                sorted(SUPPRESS_EVENTS),
+            ).fetchall()
+        finally:
+            db.close()
+
+
+def suppress_bounced(events: Iterable[dict], suppression: Optional[SuppressionList] = None) -> int:
+    """Add addresses with suppressing events to the suppression list; returns new entries."""
+    bad = [(e.get("email"), e.get("event")) for e in events if e.get("event") in SUPPRESS_EVENTS]
+    if not bad:
+        return 0
+    if suppression is None:
+        suppression = SuppressionList.load()
+    added = sum(suppression.add(email, reason=event) for email, event in bad)
+    if added:
+        suppression.save()
+    return added
+
+
+# ========================================
+# RECEIVER
+# ========================================
+
+class _Pending:
+    """Events of one request, waiting for the writer to commit them."""
+    __slots__ = ("events", "done", "ok")
+
+    def __init__(self, events):
+        self.events = events
+        self.done = threading.Event()
+        self.ok = False
+
+
+class EventWriter(threading.Thread):
+    """Single writer: drains the queue and commits events in batches."""
+
+    def __init__(self, store: EventStore, suppression_path=None):
+        super().__init__(daemon=True)
+        self.store = store
+        self.suppression_path = suppression_path
+        self.queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self.written = 0
+        self.suppressed = 0
+
+    def submit(self, events: List[dict], timeout: float = 30.0) -> bool:
+        """Queue events and wait until they are committed."""
+        pending = _Pending(events)
+        self.queue.put(pending)
+        return pending.done.wait(timeout) and pending.ok
+
+    def stop(self) -> None:
+        self.queue.put(None)
+        self.join()
+
+    def run(self) -> None:
+        db = self.store._connect()
+        stopping = False
+        while not stopping:
+            # Block for the first request, then take whatever else is waiting
+            batch = [self.queue.get()]
+            size = len(batch[0].events) if batch[0] else 0
+            while size < BATCH_SIZE:
+                try:
+                    pending = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                size += len(pending.events) if pending else 0
+            if None in batch:
+                stopping = True
+                batch = [p for p in batch if p is not None]
+            events = [e for p in batch for e in p.events]
+            ok = True
+            try:
+                if events:
+                    self.written += self.store.insert(events, db)
+            except Exception as e:
+                # Keep the writer alive: these requests get a 500 and are retried
+                print(f"❌ Could not store {len(events)} event(s): {e}")
+                ok = False
+            if ok:
+                try:
+                    suppression = (SuppressionList.load(self.suppression_path)
+                                   if self.suppression_path else None)
+                    self.suppressed += suppress_bounced(events, suppression)
+                except Exception as e:
+                    # Events are stored; `suppress` can rebuild the list from them
+                    print(f"⚠️  Could not update the suppression list: {e}")
+            for p in batch:
+                p.ok = ok
+                p.done.set()
+        db.close()
+
+
+def make_handler(writer: EventWriter, token: Optional[str] = None):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, status: int, body: str = "") -> None:
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if token and parse_qs(urlparse(self.path).query).get("token", [None])[0] != token:
+                self._reply(403, '{"error": "bad token"}')
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null")
+            except (ValueError, json.JSONDecodeError):
+                self._reply(400, '{"error": "invalid JSON"}')
+                return
+            events = body if isinstance(body, list) else [body]
+            events = [e for e in events if isinstance(e, dict) and e.get("email")]
+            if writer.submit(events):
+                self._reply(200, json.dumps({"stored": len(events)}))
+            else:
+                # Brevo retries non-2xx answers
+                self._reply(500, '{"error": "not stored"}')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class EventServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Listen backlog: the default of 5 refuses connections during bursts
+    request_queue_size = 256
+
+
+def serve(port: int = DEFAULT_PORT, db_path=DEFAULT_DB, token: Optional[str] = None,
+          host: str = "127.0.0.1", suppression_path=None) -> None:
+    writer = EventWriter(EventStore(db_path), suppression_path)
+    writer.start()
+    server = EventServer((host, port), make_handler(writer, token))
+    print(f"📡 Listening for Brevo webhooks on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        writer.stop()
+        print(f"\n💾 Stored {writer.written} event(s), {writer.suppressed} address(es) suppressed")
+
+
+# ========================================
+# LOCAL EVENT GENERATOR
+# ========================================
+
+GENERATED_EVENTS = ["delivered"] * 12 + ["opened"] * 6 + ["soft_bounce", "hard_bounce", "blocked"]
+
+
+def fake_events(count: int, campaign: str = "test", universities: int = 5) -> List[dict]:
+    """Webhook payloads shaped like Brevo's, for exercising the receiver."""
+    now = int(time.time())
+    events = []
+    for i in range(count):
+        event = random.choice(GENERATED_EVENTS)
+        events.append({
+            "event": event,
+            "email": f"coach{i % max(1, count // 2)}@example.com",
+            "message-id": f"<{now}.{i}@smtp-relay.example>",
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "ts_event": now + i,
+            "tags": message_tags(campaign, f"University {i % universities}"),
+            "reason": "generated" if "bounce" in event or event == "blocked" else None,
+        })
+    return events
+
+
+def generate(url: str, count: int, concurrency: int, campaign: str) -> Tuple[int, int]:
+    """POST fake events concurrently; returns (accepted, rejected)."""
+    events = fake_events(count, campaign)
+
+    def post(event):
+        try:
+            return requests.post(url, json=event, timeout=60).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(post, events))
+    return sum(results), len(results) - sum(results)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Receive and query Brevo delivery events')
+    p.add_argument('--db', default=str(DEFAULT_DB), help='Outbox SQLite file')
+    sub = p.add_subparsers(dest='command', required=True)
+    s = sub.add_parser('serve', help='Run the webhook receiver')
+    s.add_argument('--host', default='127.0.0.1')
+    s.add_argument('--port', type=int, default=DEFAULT_PORT)
+    s.add_argument('--token', help='Require ?token=... on the webhook URL')
+    st = sub.add_parser('stats', help='Messages per event, grouped by campaign or university')
+    st.add_argument('--by', choices=['campaign', 'university'], default='campaign')
+    st.add_argument('--campaign')
+    m = sub.add_parser('message', help='Event history of a messageId or recipient')
+    m.add_argument('key')
+    sub.add_parser('suppress', help='Add every bounced/blocked address to the suppression list')
+    g = sub.add_parser('generate', help='Send fake events to a running receiver')
+    g.add_argument('--url', default=f'http://127.0.0.1:{DEFAULT_PORT}/')
+    g.add_argument('--count', type=int, default=1000)
+    g.add_argument('--concurrency', type=int, default=20)
+    g.add_argument('--campaign', default='test')
+    args = p.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.port, args.db, args.token, args.host)
+        return 0
+
+    if args.command == 'generate':
+        start = time.monotonic()
+        accepted, rejected = generate(args.url, args.count, args.concurrency, args.campaign)
+        print(f"📨 {accepted} accepted, {rejected} rejected in {time.monotonic() - start:.1f}s")
+        return 0 if not rejected else 1
+
+    store = EventStore(args.db)
+    if args.command == 'stats':
+        group = None
+        for name, event, count in store.stats(args.by, args.campaign):
+            if name != group:
+                print(f"\n{name}")
+                group = name
+            print(f"   {event:<16} {count}")
+        return 0
+
+    if args.command == 'message':
+        rows = store.history(args.key)
+        for ts, event, email, message_id, campaign, university, reason in rows:
+            when = datetime.fromtimestamp(ts).isoformat(timespec="seconds")
+            extra = f"  ({reason})" if reason else ""
+            print(f"{when}  {event:<14} {email:<36} [{campaign or '-'}] {university or ''}{extra}")
+        print(f"\n{len(rows)} event(s)")
+        return 0
+
+    suppression = SuppressionList.load()
+    added = sum(suppression.add(email, reason=event) for email, event in store.suppressible())
+    if added:
+        suppression.save()
+    print(f"🚫 Added {added} address(es) to the suppression list ({len(suppression)} total)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
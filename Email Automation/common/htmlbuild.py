@@ -0,0 +1,305 @@
+"""
+One-off build step for HTML email templates: inline the CSS, minify, cache.
+
+Many mail clients strip ``<style>`` blocks, and the indentation and the
+style block make up a large part of every message. ``compile_html()`` takes
+a ``str.format`` template (``{var}`` placeholders, ``{{``/``}}`` for literal
+braces) and returns an equivalent template where:
+
+- rules from ``<style>`` blocks are copied into each matching element's
+  ``style`` attribute (element styles already there still win); rules the
+  inliner cannot apply (@media, pseudo-classes, ``>``/``+`` combinators)
+  stay in a smaller ``<style>`` block
+- comments and indentation are removed and runs of whitespace collapsed;
+  class attributes are dropped once every rule has been inlined
+
+Supported selectors: ``tag``, ``.class``, ``#id``, compounds such as
+``div.box`` and descendant chains such as ``.footer a``.
+
+The result is cached on disk keyed by a hash of the source, so the work is
+done once per template change, not once per message or per run.
+"""
+
+import hashlib
+import html
+import os
+import re
+import string
+from functools import lru_cache
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / ".build_cache"
+
+# Bump when the compiler output changes so stale cache entries are ignored
+COMPILER_VERSION = "1"
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+             "link", "meta", "source", "track", "wbr"}
+RAW_TEXT_TAGS = {"pre", "textarea", "script"}
+
+# Placeholder markers: private-use characters that never occur in templates
+_OPEN, _CLOSE = "\ue000", "\ue001"
+_MARKER_RE = re.compile(f"{_OPEN}(\\d+){_CLOSE}")
+_SIMPLE_SELECTOR_RE = re.compile(r"^([a-zA-Z][a-zA-Z0-9]*)?((?:[.#][\w-]+)*)$")
+_STYLE_BLOCK_RE = re.compile(r"<style[^>]*>(.*?)</style>", re.S | re.I)
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+
+_formatter = string.Formatter()
+
+
+# ========================================
+# PLACEHOLDERS
+# ========================================
+
+def _protect(template: str) -> Tuple[str, List[str]]:
+    """Replace placeholders with markers and unescape literal braces."""
+    out, fields = [], []
+    for literal, name, spec, conv in _formatter.parse(template):
+        out.append(literal)
+        if name is not None:
+            field = name + (f"!{conv}" if conv else "") + (f":{spec}" if spec else "")
+            out.append(f"{_OPEN}{len(fields)}{_CLOSE}")
+            fields.append("{" + field + "}")
+    return "".join(out), fields
+
+
+def _restore(text: str, fields: List[str]) -> str:
+    """Escape literal braces again and put the placeholders back."""
+    text = text.replace("{", "{{").replace("}", "}}")
+    return _MARKER_RE.sub(lambda m: fields[int(m.group(1))], text)
+
+
+# ========================================
+# CSS
+# ========================================
+
+class Rule:
+    """One inlinable selector with its declarations."""
+    __slots__ = ("parts", "specificity", "order", "declarations")
+
+    def __init__(self, parts, order, declarations):
+        self.parts = parts              # [(tag, classes, id)], outermost first
+        self.order = order
+        self.declarations = declarations
+        ids = sum(1 for _, _, i in parts if i)
+        classes = sum(len(c) for _, c, _ in parts)
+        tags = sum(1 for t, _, _ in parts if t)
+        self.specificity = (ids, classes, tags)
+
+    def matches(self, element, ancestors) -> bool:
+        if not _matches_simple(self.parts[-1], element):
+            return False
+        remaining = len(self.parts) - 2
+        for ancestor in reversed(ancestors):
+            if remaining < 0:
+                break
+            if _matches_simple(self.parts[remaining], ancestor):
+                remaining -= 1
+        return remaining < 0
+
+
+def _matches_simple(part, element) -> bool:
+    tag, classes, id_ = part
+    el_tag, el_classes, el_id = element
+    return ((not tag or tag == el_tag)
+            and classes <= el_classes
+            and (not id_ or id_ == el_id))
+
+
+def _parse_simple(selector: str):
+    m = _SIMPLE_SELECTOR_RE.match(selector)
+    if not m or not selector:
+        return None
+    tag = (m.group(1) or "").lower()
+    tokens = re.findall(r"[.#][\w-]+", m.group(2))
+    classes = frozenset(t[1:] for t in tokens if t[0] == ".")
+    ids = [t[1:] for t in tokens if t[0] == "#"]
+    if len(ids) > 1:
+        return None
+    return tag, classes, ids[0] if ids else None
+
+
+def parse_declarations(text: str) -> Dict[str, str]:
+    """'a: 1; b: 2' -> {'a': '1', 'b': '2'} (later duplicates win)."""
+    out = {}
+    for decl in text.split(";"):
+        prop, sep, value = decl.partition(":")
+        if sep and prop.strip() and value.strip():
+            out[prop.strip().lower()] = " ".join(value.split())
+    return out
+
+
+def parse_css(css: str) -> Tuple[List[Rule], str]:
+    """Split a stylesheet into inlinable rules and leftover CSS text."""
+    css = _COMMENT_RE.sub("", css)
+    rules, leftover = [], []
+    pos = 0
+    while pos < len(css):
+        start = css.find("{", pos)
+        if start < 0:
+            break
+        prelude = css[pos:start].strip()
+        if prelude.startswith("@"):
+            # Keep at-rules (with their nested blocks) verbatim
+            depth, end = 0, start
+            while end < len(css):
+                depth += {"{": 1, "}": -1}.get(css[end], 0)
+                end += 1
+                if depth == 0:
+                    break
+            leftover.append(css[pos:end].strip())
+            pos = end
+            continue
+        end = css.find("}", start)
+        if end < 0:
+            break
+        body = css[start + 1:end]
+        declarations = parse_declarations(body)
+        for selector in prelude.split(","):
+            parts = [_parse_simple(p) for p in selector.split()]
+            if parts and all(parts):
+                rules.append(Rule(parts, len(rules), declarations))
+            elif selector.strip():
+                leftover.append(f"{selector.strip()}{{{body.strip()}}}")
+        pos = end + 1
+    return rules, "".join(leftover)
+
+
+def extract_css(template: str) -> str:
+    """Stylesheet text from a template's <style> blocks (braces unescaped)."""
+    source, _ = _protect(template)
+    return "\n".join(_STYLE_BLOCK_RE.findall(source))
+
+
+# ========================================
+# HTML
+# ========================================
+
+def _collapse(text: str) -> str:
+    if not text.strip():
+        # Indentation between tags; a plain space may separate inline elements
+        return "" if "\n" in text else " "
+    return re.sub(r"\s+", " ", text)
+
+
+class _Inliner(HTMLParser):
+
+    def __init__(self, rules: List[Rule], keep_classes: bool):
+        super().__init__(convert_charrefs=False)
+        self.rules = sorted(rules, key=lambda r: (r.specificity, r.order))
+        self.keep_classes = keep_classes
+        self.out: List[str] = []
+        self.stack: List[Tuple[str, frozenset, Optional[str]]] = []
+        self.in_style = False
+        self.raw_depth = 0
+
+    def _start(self, tag, attrs, self_closing):
+        attrs = dict(attrs)
+        element = (tag, frozenset((attrs.get("class") or "").split()), attrs.get("id"))
+        if tag == "style":
+            self.in_style = True
+            return
+        styles = {}
+        for rule in self.rules:
+            if rule.matches(element, self.stack):
+                styles.update(rule.declarations)
+        if styles or "style" in attrs:
+            styles.update(parse_declarations(attrs.get("style") or ""))
+            attrs["style"] = ";".join(f"{k}:{v}" for k, v in styles.items())
+        if not self.keep_classes:
+            attrs.pop("class", None)
+        rendered = "".join(
+            f" {k}" if v is None else f' {k}="{html.escape(v, quote=True)}"'
+            for k, v in attrs.items()
+        )
+        self.out.append(f"<{tag}{rendered}{'/' if self_closing else ''}>")
+        if tag in RAW_TEXT_TAGS:
+            self.raw_depth += 1
+        if tag not in VOID_TAGS and not self_closing:
+            self.stack.append(element)
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, True)
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self.in_style = False
+            return
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+        if tag in RAW_TEXT_TAGS:
+            self.raw_depth = max(0, self.raw_depth - 1)
+        self.out.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if self.in_style:
+            return
+        self.out.append(data if self.raw_depth else _collapse(data))
+
+    def handle_entityref(self, name):
+        self.out.append(f"&{name};")
+
+    def handle_charref(self, name):
+        self.out.append(f"&#{name};")
+
+    def handle_decl(self, decl):
+        self.out.append(f"<!{decl}>")
+
+    def handle_comment(self, data):
+        pass
+
+
+def compile_html(template: str, css: Optional[str] = None, use_cache: bool = True) -> str:
+    """
+    Inline CSS into a str.format HTML template and minify it.
+
+    Args:
+        template: HTML template with {var} placeholders and {{ }} literal braces
+        css: Stylesheet to apply instead of the template's own <style> blocks
+            (used for fragments inserted into a larger template)
+        use_cache: Read/write the compiled result under CACHE_DIR
+
+    Returns:
+        The compiled template; .format(**values) works exactly as before
+    """
+    return _compile_cached(template, css, use_cache)
+
+
+@lru_cache(maxsize=32)
+def _compile_cached(template: str, css: Optional[str], use_cache: bool) -> str:
+    digest = hashlib.sha256(
+        "\0".join((COMPILER_VERSION, template, css or "")).encode("utf-8")
+    ).hexdigest()[:16]
+    cache_file = CACHE_DIR / f"{digest}.html"
+    if use_cache and cache_file.exists():
+        return cache_file.read_text(encoding="utf-8")
+
+    source, fields = _protect(template)
+    stylesheet = css if css is not None else "\n".join(_STYLE_BLOCK_RE.findall(source))
+    rules, leftover = parse_css(stylesheet)
+
+    # Classes are only needed if some rules could not be inlined
+    inliner = _Inliner(rules, keep_classes=bool(leftover))
+    inliner.feed(source)
+    inliner.close()
+    compiled = "".join(inliner.out).strip()
+    if leftover and css is None:
+        style = f"<style>{leftover}</style>"
+        compiled = (compiled.replace("</head>", style + "</head>", 1) if "</head>" in compiled
+                    else style + compiled)
+    compiled = _restore(compiled, fields)
+
+    if use_cache:
+        CACHE_DIR.mkdir(exist_ok=True)
+        # Per-process temp name: render workers may compile at the same time
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(compiled, encoding="utf-8")
+        tmp.replace(cache_file)
+    return compiled
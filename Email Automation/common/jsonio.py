@@ -0,0 +1,169 @@
+"""
+JSON reading/writing for pipeline outputs.
+
+- Uses ``orjson`` when it is installed (pip install orjson), else the stdlib.
+- ``pretty=True`` keeps the indented format for files people open and review
+  (university_teams.json, sent_teams.json). ``pretty=False`` writes compact
+  JSON for machine-only artifacts that only the senders read back.
+- ``iter_array()`` / ``dump_array()`` stream a top-level JSON array one
+  element at a time, so large files never need a full in-memory build.
+- All writes go to a ``.tmp`` file first and are moved into place, so a
+  crash never leaves a half-written JSON behind.
+"""
+
+import json
+import os
+from typing import Any, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def backend_name() -> str:
+    """Name of the JSON backend in use."""
+    return "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any, pretty: bool = True, indent: int = 2) -> str:
+    """Serialize obj to a str (non-ASCII characters kept as-is)."""
+    if orjson is not None and (not pretty or indent == 2):
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    if pretty:
+        return json.dumps(obj, indent=indent, ensure_ascii=False)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(text):
+    """Parse a JSON document from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def load(path, encoding: str = "utf-8") -> Any:
+    """Load a whole JSON file."""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding=encoding) as f:
+        return json.load(f)
+
+
+def dump(obj: Any, path, pretty: bool = True, indent: int = 2, encoding: str = "utf-8") -> None:
+    """Write obj to path atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding=encoding) as f:
+        f.write(dumps(obj, pretty=pretty, indent=indent))
+    os.replace(tmp, path)
+
+
+def iter_array(path, encoding: str = "utf-8", chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding=encoding) as f:
+        buf = f.read(chunk_size).lstrip()
+        while not buf:
+            more = f.read(chunk_size)
+            if not more:
+                break
+            buf = more.lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a top-level JSON array")
+        buf = buf[1:]
+        eof = False
+        after_item = False  # an element was read: "," or "]" must follow
+        after_comma = False  # a "," was read: an element must follow
+        while True:
+            buf = buf.lstrip()
+            if not buf:
+                if eof:
+                    raise ValueError(f"{path}: truncated JSON array")
+                more = f.read(chunk_size)
+                eof = not more
+                buf = more
+                continue
+            if buf[0] == "]":
+                if after_comma:
+                    raise ValueError(f"{path}: expected an element before ']'")
+                return
+            if after_item:
+                if buf[0] != ",":
+                    raise ValueError(f"{path}: expected ',' or ']' after an element")
+                buf, after_item, after_comma = buf[1:], False, True
+                continue
+            if buf[0] == ",":
+                raise ValueError(f"{path}: expected an element before ','")
+            try:
+                item, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                item, end = None, -1
+            # A number not yet followed by a delimiter may be cut at the chunk
+            # boundary ("-7." of "-7.5e3") - read more before trusting it
+            complete = end >= 0 and (eof or (end < len(buf) and (buf[end].isspace() or buf[end] in ",]")))
+            if not complete:
+                if eof:
+                    raise ValueError(f"{path}: invalid or truncated JSON array")
+                more = f.read(chunk_size)
+                eof = not more
+                buf += more
+                continue
+            yield item
+            buf, after_item, after_comma = buf[end:], True, False
+
+
+class ArrayWriter:
+    """Write a JSON array one element at a time, atomically.
+
+    Pretty output is byte-identical to ``json.dump(items, f, indent=indent,
+    ensure_ascii=False)``. Use as a context manager; the file only replaces
+    ``path`` when the block exits without an exception.
+    """
+
+    def __init__(self, path, pretty: bool = True, indent: int = 2, encoding: str = "utf-8"):
+        self.path = path
+        self.pretty = pretty
+        self.indent = indent
+        self.encoding = encoding
+        self.count = 0
+        self._tmp = f"{path}.tmp"
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self._tmp, "w", encoding=self.encoding)
+        self._f.write("[")
+        return self
+
+    def write(self, item: Any) -> None:
+        text = dumps(item, pretty=self.pretty, indent=self.indent)
+        sep = "," if self.count else ""
+        if self.pretty:
+            pad = " " * self.indent
+            text = "\n" + "\n".join(pad + line for line in text.split("\n"))
+        self._f.write(sep + text)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._f.write("\n]" if self.pretty and self.count else "]")
+        finally:
+            self._f.close()
+        if exc_type is None:
+            os.replace(self._tmp, self.path)
+        else:
+            os.remove(self._tmp)
+        return False
+
+
+def dump_array(items: Iterable[Any], path, pretty: bool = True, indent: int = 2,
+               encoding: str = "utf-8") -> int:
+    """Stream items into path as a JSON array. Returns the item count."""
+    with ArrayWriter(path, pretty=pretty, indent=indent, encoding=encoding) as w:
+        for item in items:
+            w.write(item)
+    return w.count
@@ -0,0 +1,318 @@
+"""
+Shared daily-quota scheduler for several campaigns at once.
+
+Every sender used to act as if it owned the whole Brevo daily quota (300/day
+on the free plan). Instead, scripts can ``--enqueue`` their payloads into one
+outbox; ``drain`` then sends them in priority order - time-critical mail such
+as slot allocation and payment instructions before announcements - and
+stops at the daily limit. Leftovers are sent by the next day's run.
+
+State lives in an SQLite file next to ``.env`` so scripts in both folders
+share it:
+    outbox  - queued/sent/failed messages with campaign and priority
+    usage   - messages sent per (day, API key)
+
+API keys are never stored; usage is keyed by ``brevo.key_id()``.
+
+Usage (from the ``Email Automation`` folder):
+    python -m common.quota status
+    python -m common.quota drain [--max N] [--delay SECONDS] [--stuck-after SECONDS]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from common.brevo import SendResult, key_id, post_email
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+except ImportError:
+    pass
+
+DEFAULT_DB = Path(__file__).resolve().parent.parent / "outbox.sqlite3"
+
+# Brevo free plan
+DEFAULT_DAILY_LIMIT = 300
+
+# Lower number = sent first. Unknown campaigns get DEFAULT_PRIORITY.
+CAMPAIGN_PRIORITIES = {
+    "iupc-slot": 0,        # slot allocation + payment instructions (deadline-bound)
+    "iupc-payment": 0,
+    "cc-update": 5,
+    "dlsprint-start": 10,  # announcements
+    "bulk": 10,
+}
+DEFAULT_PRIORITY = 5
+
+# A message still 'sending' this long after it was claimed belongs to a run
+# that crashed (a send takes at most brevo.DEFAULT_TIMEOUT), so drain may
+# take it back; younger ones are in flight in another drain
+STUCK_AFTER = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign     TEXT    NOT NULL,
+    priority     INTEGER NOT NULL,
+    payload      TEXT    NOT NULL,
+    status       TEXT    NOT NULL DEFAULT 'queued',
+    enqueued_at  TEXT    NOT NULL,
+    sent_at      TEXT,
+    key_id       TEXT,
+    claimed_at   REAL,
+    message_id   TEXT,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_queue ON outbox (status, priority, id);
+CREATE TABLE IF NOT EXISTS usage (
+    day     TEXT    NOT NULL,
+    key_id  TEXT    NOT NULL,
+    sent    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, key_id)
+);
+"""
+
+
+def today() -> str:
+    """Quota day in local time (Brevo resets daily)."""
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def now_iso() -> str:
+    return datetime.now().astimezone().isoformat(timespec="seconds")
+
+
+def campaign_priority(campaign: str) -> int:
+    return CAMPAIGN_PRIORITIES.get(campaign, DEFAULT_PRIORITY)
+
+
+class QuotaScheduler:
+    """Priority outbox plus per-day, per-key usage counters on disk."""
+
+    def __init__(self, db_path=DEFAULT_DB, daily_limit: int = DEFAULT_DAILY_LIMIT):
+        self.db_path = str(db_path)
+        self.daily_limit = daily_limit
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that also locks out other processes."""
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    # ----------------------------------------
+    # Enqueue
+    # ----------------------------------------
+
+    def enqueue(self, campaign: str, payload: dict, priority: Optional[int] = None) -> int:
+        """Add one payload to the outbox; returns its id."""
+        if priority is None:
+            priority = campaign_priority(campaign)
+        with self._transaction() as db:
+            cur = db.execute(
+                "INSERT INTO outbox (campaign, priority, payload, enqueued_at) VALUES (?, ?, ?, ?)",
+                (campaign, priority, json.dumps(payload, ensure_ascii=False), now_iso()),
+            )
+            return cur.lastrowid
+
+    # ----------------------------------------
+    # Usage
+    # ----------------------------------------
+
+    def used_today(self, kid: str) -> int:
+        db = self._connect()
+        try:
+            row = db.execute("SELECT sent FROM usage WHERE day = ? AND key_id = ?",
+                             (today(), kid)).fetchone()
+            return row[0] if row else 0
+        finally:
+            db.close()
+
+    def remaining_today(self, kid: str) -> int:
+        return max(0, self.daily_limit - self.used_today(kid))
+
+    def record_use(self, kid: str, n: int = 1) -> None:
+        """Count sends made outside the outbox (direct script runs)."""
+        with self._transaction() as db:
+            self._add_usage(db, kid, n)
+
+    @staticmethod
+    def _add_usage(db, kid: str, n: int) -> None:
+        db.execute(
+            "INSERT INTO usage (day, key_id, sent) VALUES (?, ?, ?) "
+            "ON CONFLICT (day, key_id) DO UPDATE SET sent = sent + excluded.sent",
+            (today(), kid, n),
+        )
+
+    # ----------------------------------------
+    # Drain
+    # ----------------------------------------
+
+    def claim_next(self, kid: str):
+        """Reserve one quota unit and claim the highest-priority message.
+
+        Returns (id, campaign, payload) or None when the queue is empty or
+        the key's quota for today is used up.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT sent FROM usage WHERE day = ? AND key_id = ?",
+                             (today(), kid)).fetchone()
+            if (row[0] if row else 0) >= self.daily_limit:
+                return None
+            msg = db.execute(
+                "SELECT id, campaign, payload FROM outbox WHERE status = 'queued' "
+                "ORDER BY priority, id LIMIT 1"
+            ).fetchone()
+            if msg is None:
+                return None
+            db.execute("UPDATE outbox SET status = 'sending', key_id = ?, claimed_at = ? WHERE id = ?",
+                       (kid, time.time(), msg[0]))
+            self._add_usage(db, kid, 1)
+            return msg[0], msg[1], json.loads(msg[2])
+
+    def finish(self, msg_id: int, kid: str, result: SendResult) -> None:
+        """Record the outcome; refund the quota unit if Brevo rejected the call."""
+        with self._transaction() as db:
+            if result.ok:
+                db.execute("UPDATE outbox SET status = 'sent', sent_at = ?, message_id = ?, error = NULL "
+                           "WHERE id = ?", (now_iso(), result.info, msg_id))
+            else:
+                # Retryable failures go back to the queue, others are parked
+                status = "queued" if result.retryable else "failed"
+                db.execute("UPDATE outbox SET status = ?, error = ? WHERE id = ?",
+                           (status, result.info, msg_id))
+                self._add_usage(db, kid, -1)
+
+    def requeue_stuck(self, stuck_after: float = STUCK_AFTER) -> int:
+        """Put messages left in 'sending' by a crashed run back in the queue.
+
+        Only claims older than ``stuck_after`` seconds are taken back, so the
+        in-flight messages of a drain running in parallel are left alone.
+        """
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE outbox SET status = 'queued' WHERE status = 'sending' "
+                "AND (claimed_at IS NULL OR claimed_at < ?)",
+                (time.time() - stuck_after,),
+            ).rowcount
+
+    def drain(self, api_key: str, send_fn: Callable[[dict, str], SendResult] = post_email,
+              delay: float = 0.0, max_messages: Optional[int] = None) -> dict:
+        """Send queued messages in priority order until the queue or quota runs out.
+
+        Returns counters: sent, failed, retry (retryable failures, stopped early).
+        """
+        kid = key_id(api_key)
+        stats = {"sent": 0, "failed": 0, "retry": 0}
+        while max_messages is None or stats["sent"] + stats["failed"] < max_messages:
+            claimed = self.claim_next(kid)
+            if claimed is None:
+                break
+            msg_id, campaign, payload = claimed
+            result = send_fn(payload, api_key)
+            self.finish(msg_id, kid, result)
+            if result.ok:
+                stats["sent"] += 1
+                print(f"✅ [{campaign}] #{msg_id} sent (ID: {result.info})")
+            elif result.retryable:
+                # Rate limited / Brevo down - stop and let the next run retry
+                stats["retry"] += 1
+                print(f"⏸  [{campaign}] #{msg_id} deferred: {result.info}")
+                break
+            else:
+                stats["failed"] += 1
+                print(f"❌ [{campaign}] #{msg_id} failed: {result.info}")
+            if delay:
+                time.sleep(delay)
+        return stats
+
+    # ----------------------------------------
+    # Reporting
+    # ----------------------------------------
+
+    def status(self):
+        """Rows of (campaign, priority, status, count)."""
+        db = self._connect()
+        try:
+            return db.execute(
+                "SELECT campaign, priority, status, COUNT(*) FROM outbox "
+                "GROUP BY campaign, priority, status ORDER BY priority, campaign, status"
+            ).fetchall()
+        finally:
+            db.close()
+
+
+def record_direct_send(api_key: str, n: int = 1, db_path=DEFAULT_DB) -> None:
+    """Count emails a script sent itself (not via the outbox) against today's quota."""
+    if api_key:
+        QuotaScheduler(db_path).record_use(key_id(api_key), n)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Shared Brevo outbox with a daily quota')
+    p.add_argument('--db', default=str(DEFAULT_DB), help='Outbox SQLite file')
+    p.add_argument('--daily-limit', type=int, default=DEFAULT_DAILY_LIMIT,
+                   help='Emails per day per API key (default: Brevo free plan)')
+    sub = p.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='Show queued/sent counts and today\'s usage')
+    d = sub.add_parser('drain', help='Send queued emails in priority order within the quota')
+    d.add_argument('--max', type=int, default=None, help='Stop after this many emails')
+    d.add_argument('--delay', type=float, default=0.0, help='Delay between emails in seconds')
+    d.add_argument('--stuck-after', type=float, default=STUCK_AFTER,
+                   help='Re-queue messages claimed this many seconds ago and never finished')
+    args = p.parse_args(argv)
+
+    api_key = os.getenv('BREVO_API_KEY', '').strip()
+    scheduler = QuotaScheduler(args.db, daily_limit=args.daily_limit)
+
+    if args.command == 'status':
+        print(f"📦 Outbox: {args.db}")
+        for campaign, priority, status, count in scheduler.status():
+            print(f"   [{priority:>2}] {campaign:<16} {status:<8} {count}")
+        if api_key:
+            kid = key_id(api_key)
+            print(f"📊 Today: {scheduler.used_today(kid)}/{args.daily_limit} used for key {kid}")
+        return 0
+
+    if not api_key:
+        print("❌ Error: BREVO_API_KEY not set")
+        return 1
+    stuck = scheduler.requeue_stuck(args.stuck_after)
+    if stuck:
+        print(f"↩️  Re-queued {stuck} message(s) left over from an interrupted run")
+    kid = key_id(api_key)
+    print(f"📊 Quota left today: {scheduler.remaining_today(kid)}/{args.daily_limit}")
+    stats = scheduler.drain(api_key, delay=args.delay, max_messages=args.max)
+    print(f"\n✅ Sent: {stats['sent']}  ❌ Failed: {stats['failed']}  ⏸ Deferred: {stats['retry']}")
+    print(f"📊 Quota left today: {scheduler.remaining_today(kid)}/{args.daily_limit}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
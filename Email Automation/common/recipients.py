@@ -0,0 +1,208 @@
+"""
+Pre-send recipient validation.
+
+Runs before any API call so bad recipients never cost quota:
+- syntax check with one compiled pattern (vectorized over pandas columns)
+- lowercase + dedupe across To and CC
+- drop addresses on the local suppression list (earlier hard bounces)
+
+The suppression list is a JSON file next to ``.env`` so every sender in
+both folders shares it.
+"""
+
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from common import jsonio
+
+# Practical address syntax: local@domain.tld, no spaces, one '@'
+EMAIL_RE = re.compile(
+    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z]{2,}"
+)
+
+DEFAULT_SUPPRESSION_FILE = Path(__file__).resolve().parent.parent / "suppression.json"
+
+# Rejection reasons
+INVALID = "invalid"
+DUPLICATE = "duplicate"
+SUPPRESSED = "suppressed"
+
+
+def normalize_email(email) -> str:
+    """Strip and lowercase an address; missing values become ''."""
+    if email is None or (not isinstance(email, str) and pd.isna(email)):
+        return ""
+    return str(email).strip().lower()
+
+
+def is_valid_email(email: str) -> bool:
+    """Syntax check for an already normalized address."""
+    return bool(email) and EMAIL_RE.fullmatch(email) is not None
+
+
+def normalize_series(emails: pd.Series) -> pd.Series:
+    """Vectorized normalize_email() over a column."""
+    return emails.fillna("").astype(str).str.strip().str.lower()
+
+
+def valid_mask(emails: pd.Series) -> pd.Series:
+    """Vectorized is_valid_email() over a normalized column."""
+    return emails.str.fullmatch(EMAIL_RE.pattern).fillna(False).astype(bool)
+
+
+# ========================================
+# SUPPRESSION LIST
+# ========================================
+
+class SuppressionList:
+    """Addresses that must not be emailed again (hard bounces, blocks)."""
+
+    def __init__(self, path=DEFAULT_SUPPRESSION_FILE, entries: Optional[Dict[str, dict]] = None):
+        self.path = Path(path)
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_SUPPRESSION_FILE) -> "SuppressionList":
+        path = Path(path)
+        if path.exists():
+            return cls(path, jsonio.load(path).get("emails", {}))
+        return cls(path)
+
+    def save(self) -> None:
+        jsonio.dump({"emails": self.entries}, self.path, pretty=True, indent=2)
+
+    def add(self, email: str, reason: str = "hard_bounce") -> bool:
+        """Add an address; returns True if it was not suppressed before."""
+        email = normalize_email(email)
+        if not email or email in self.entries:
+            return False
+        self.entries[email] = {
+            "reason": reason,
+            "added": datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds"),
+        }
+        return True
+
+    def __contains__(self, email) -> bool:
+        return normalize_email(email) in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# ========================================
+# VALIDATION
+# ========================================
+
+def clean_recipients(
+    to: Iterable[str],
+    cc: Iterable[str] = (),
+    suppression: Optional[SuppressionList] = None,
+) -> Tuple[List[str], List[str], List[Tuple[str, str]]]:
+    """
+    Validate one message's recipients.
+
+    Addresses are lowercased, invalid/suppressed ones dropped and duplicates
+    removed across To and CC (To wins). If every To address is rejected, the
+    first surviving CC is promoted to To so the message still has a primary.
+
+    Returns:
+        (to, cc, rejected) - rejected is a list of (address, reason)
+    """
+    seen = set()
+    rejected = []
+
+    def keep(addresses):
+        out = []
+        for raw in addresses:
+            email = normalize_email(raw)
+            if not email:
+                continue
+            if not is_valid_email(email):
+                rejected.append((email, INVALID))
+            elif suppression is not None and email in suppression:
+                rejected.append((email, SUPPRESSED))
+            elif email in seen:
+                rejected.append((email, DUPLICATE))
+            else:
+                seen.add(email)
+                out.append(email)
+        return out
+
+    to_clean = keep(to)
+    cc_clean = keep(cc)
+    if not to_clean and cc_clean:
+        to_clean = [cc_clean.pop(0)]
+    return to_clean, cc_clean, rejected
+
+
+def validate_frame(
+    df: pd.DataFrame,
+    to_col: str,
+    cc_col: Optional[str] = None,
+    extra_cc: Iterable[str] = (),
+    suppression: Optional[SuppressionList] = None,
+) -> pd.DataFrame:
+    """
+    Validate the recipients of every row at once.
+
+    The To column is checked with vectorized string operations; CC lists
+    are exploded into one long column so they are checked the same way.
+    Unlike clean_recipients(), a rejected To is not replaced from CC - the
+    caller decides whether to skip the row.
+
+    Adds columns:
+        _to        - normalized To address, '' if rejected
+        _cc        - list of normalized, valid, de-duplicated CC addresses
+        _rejected  - list of (address, reason) pairs for the row
+    """
+    out = df.copy()
+    suppressed = set(suppression.entries) if suppression is not None else set()
+
+    to = normalize_series(out[to_col])
+    to_ok = valid_mask(to)
+    to_supp = to.isin(suppressed)
+
+    rejected = {idx: [] for idx in out.index}
+    for idx, email in to[(to != "") & ~to_ok].items():
+        rejected[idx].append((email, INVALID))
+    for idx, email in to[to_ok & to_supp].items():
+        rejected[idx].append((email, SUPPRESSED))
+    to = to.where(to_ok & ~to_supp, "")
+
+    # One row per (message, cc address)
+    if cc_col is not None and cc_col in out.columns:
+        cc_raw = out[cc_col].fillna("").astype(str).str.replace(";", ",", regex=False)
+    else:
+        cc_raw = pd.Series("", index=out.index)
+    extra = ",".join(extra_cc)
+    if extra:
+        cc_raw = cc_raw + "," + extra
+    cc = normalize_series(cc_raw.str.split(",").explode())
+    cc = cc[cc != ""]
+    cc_ok = valid_mask(cc)
+    for idx, email in cc[~cc_ok].items():
+        rejected[idx].append((email, INVALID))
+    cc_supp = cc_ok & cc.isin(suppressed)
+    for idx, email in cc[cc_supp].items():
+        rejected[idx].append((email, SUPPRESSED))
+    cc = cc[cc_ok & ~cc_supp]
+
+    # Dedupe within each row and against that row's To address
+    cc_frame = cc.rename("email").to_frame()
+    cc_frame["to"] = to.reindex(cc_frame.index)
+    cc_frame["row"] = cc_frame.index
+    dup = (cc_frame.duplicated(subset=["row", "email"])
+           | (cc_frame["email"] == cc_frame["to"])).to_numpy()
+    for idx, email in cc_frame["email"][dup].items():
+        rejected[idx].append((email, DUPLICATE))
+    cc_lists = cc_frame["email"][~dup].groupby(level=0).agg(list)
+
+    out["_to"] = to
+    out["_cc"] = [cc_lists.get(idx, []) for idx in out.index]
+    out["_rejected"] = [rejected[idx] for idx in out.index]
+    return out
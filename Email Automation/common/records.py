@@ -0,0 +1,152 @@
+"""
+Compact record types for teams and universities.
+
+The pipeline passes these around as nested dicts, one per university in
+``university_teams.json`` and one per team in ``team_emails.json``. These
+slotted dataclasses hold the same data with less memory per record:
+university names are interned (the same few strings repeat across thousands
+of rows) and email lists are stored as tuples.
+
+``from_dict()`` / ``to_dict()`` map to and from the existing file formats
+exactly, so a load followed by a dump leaves the JSON files unchanged.
+"""
+
+import sys
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from common import jsonio
+
+
+def _intern(value) -> str:
+    """Intern a string field; None/NaN-ish values become ''."""
+    if value is None:
+        return ""
+    return sys.intern(str(value).strip())
+
+
+@dataclass(slots=True)
+class Team:
+    """One registered team of a university (``teams[]`` entry)."""
+    team_name: str
+    coach_email: str
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Team":
+        return cls(d["team_name"], d.get("coach_email", ""))
+
+    def to_dict(self) -> dict:
+        return {"team_name": self.team_name, "coach_email": self.coach_email}
+
+
+@dataclass(slots=True)
+class PaymentInfo:
+    """bKash details for a university (``payment_info`` entry)."""
+    bkash_account: str
+    account_holder_name: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "PaymentInfo":
+        return cls(d.get("bkash_account", ""), d.get("account_holder_name"))
+
+    def to_dict(self) -> dict:
+        d = {"bkash_account": self.bkash_account}
+        # split_universities_by_slots.py omits an empty holder name,
+        # add_payment_info.py keeps it - preserve whichever we loaded
+        if self.account_holder_name is not None:
+            d["account_holder_name"] = self.account_holder_name
+        return d
+
+
+@dataclass(slots=True)
+class University:
+    """One entry of ``university_teams.json`` and its derived files."""
+    university: str
+    coach_emails: Tuple[str, ...]
+    team_count: int
+    teams: Tuple[Team, ...]
+    allocated_slots: Optional[int] = None
+    payment_info: Optional[PaymentInfo] = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "University":
+        payment = d.get("payment_info")
+        return cls(
+            university=_intern(d["university"]),
+            coach_emails=tuple(d.get("coach_emails", ())),
+            team_count=d.get("team_count", len(d.get("teams", ()))),
+            teams=tuple(Team.from_dict(t) for t in d.get("teams", ())),
+            allocated_slots=d.get("allocated_slots"),
+            payment_info=PaymentInfo.from_dict(payment) if payment is not None else None,
+        )
+
+    def to_dict(self) -> dict:
+        d = {
+            "university": self.university,
+            "coach_emails": list(self.coach_emails),
+            "team_count": self.team_count,
+            "teams": [t.to_dict() for t in self.teams],
+        }
+        # Same key order as the pipeline writes them
+        if self.allocated_slots is not None:
+            d["allocated_slots"] = self.allocated_slots
+        if self.payment_info is not None:
+            d["payment_info"] = self.payment_info.to_dict()
+        return d
+
+    @property
+    def slots(self) -> int:
+        """Allocated slots, treating a missing field as 0."""
+        return self.allocated_slots or 0
+
+
+@dataclass(slots=True)
+class TeamEmails:
+    """One entry of ``team_emails.json`` (DL Sprint)."""
+    team_name: str
+    emails: Tuple[str, ...]
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "TeamEmails":
+        return cls(d["team_name"], tuple(d.get("emails", ())))
+
+    def to_dict(self) -> dict:
+        return {"team_name": self.team_name, "emails": list(self.emails)}
+
+
+# ========================================
+# FILE HELPERS
+# ========================================
+
+def iter_universities(path, encoding: str = "utf-8") -> Iterator[University]:
+    """Stream ``university_teams*.json`` as University records."""
+    return (University.from_dict(d) for d in jsonio.iter_array(path, encoding=encoding))
+
+
+def load_universities(path, encoding: str = "utf-8") -> List[University]:
+    """Load ``university_teams*.json`` as University records."""
+    return list(iter_universities(path, encoding=encoding))
+
+
+def dump_universities(records: Iterable[University], path, pretty: bool = True,
+                      encoding: str = "utf-8") -> int:
+    """Write University records in the existing ``university_teams.json`` format."""
+    return jsonio.dump_array((r.to_dict() for r in records), path,
+                             pretty=pretty, indent=2, encoding=encoding)
+
+
+def iter_team_emails(path, encoding: str = "utf-8") -> Iterator[TeamEmails]:
+    """Stream ``team_emails.json`` / ``new_team_emails.json`` as TeamEmails records."""
+    return (TeamEmails.from_dict(d) for d in jsonio.iter_array(path, encoding=encoding))
+
+
+def load_team_emails(path, encoding: str = "utf-8") -> List[TeamEmails]:
+    """Load ``team_emails.json`` / ``new_team_emails.json`` as TeamEmails records."""
+    return list(iter_team_emails(path, encoding=encoding))
+
+
+def dump_team_emails(records: Iterable[TeamEmails], path, pretty: bool = True,
+                     encoding: str = "utf-8") -> int:
+    """Write TeamEmails records in the existing ``team_emails.json`` format."""
+    return jsonio.dump_array((r.to_dict() for r in records), path,
+                             pretty=pretty, indent=4, encoding=encoding)
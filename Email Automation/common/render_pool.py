@@ -0,0 +1,76 @@
+"""
+Render mail-merge payloads on a process pool.
+
+Building the subject/text/HTML for each recipient is pure CPU work, while
+sending is network I/O. ``render_stream()`` renders ahead on worker
+processes and yields finished payloads to the send loop as they become
+ready, so all cores render while the main process is busy with HTTP calls.
+
+The render function must be a top-level (picklable) function and the items
+must be picklable (records.University / records.TeamEmails are).
+"""
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+
+def default_workers() -> int:
+    """One worker per core, leaving one for the send loop."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def render_stream(
+    render_fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    prefetch: Optional[int] = None,
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Yield (item, render_fn(item)) pairs, rendered on a process pool.
+
+    Args:
+        render_fn: Top-level function that renders one item
+        items: Items to render
+        workers: Number of processes (None = one per core, <= 1 = render inline)
+        ordered: Yield in input order (deterministic). If False, yield as
+            soon as each render finishes
+        prefetch: Max renders in flight ahead of the consumer
+            (default: 4 per worker) - bounds memory for huge campaigns
+
+    Returns:
+        Iterator of (item, rendered) pairs
+    """
+    if workers is None:
+        workers = default_workers()
+    if workers <= 1:
+        for item in items:
+            yield item, render_fn(item)
+        return
+
+    window = prefetch or workers * 4
+    it = iter(items)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def fill():
+            while len(pending) < window:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                pending.append((item, pool.submit(render_fn, item)))
+
+        fill()
+        while pending:
+            if ordered:
+                item, fut = pending.popleft()
+                yield item, fut.result()
+            else:
+                wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+                for pair in [p for p in pending if p[1].done()]:
+                    pending.remove(pair)
+                    yield pair[0], pair[1].result()
+            fill()
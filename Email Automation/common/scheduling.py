@@ -0,0 +1,270 @@
+"""
+Server-side pacing with Brevo ``scheduledAt``.
+
+Instead of keeping a script open for the whole campaign just to sleep
+between requests, submit every message right away with its own
+``scheduledAt`` timestamp (start + i × interval) and let Brevo do the
+pacing. All messages of one submission share a ``batchId``, so the whole
+campaign can be cancelled with one API call.
+
+Submitted messages are recorded in the ``scheduled`` table of the shared
+outbox database so they can be listed, cancelled or rescheduled later
+(rescheduling = cancel + resubmit with new times).
+
+Usage (from the ``Email Automation`` folder):
+    python -m common.scheduling list [--campaign NAME]
+    python -m common.scheduling cancel --campaign NAME
+    python -m common.scheduling reschedule --campaign NAME --start 2026-01-20T09:00:00+06:00 [--interval 1.0]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional
+
+import requests
+
+from common.brevo import BREVO_URL, SendResult, headers_for, post_email
+from common.quota import DEFAULT_DB, record_direct_send
+
+# Brevo accepts scheduledAt up to 72 hours ahead
+MAX_SCHEDULE_AHEAD = timedelta(hours=72)
+
+# Default lead time so the first message is not already in the past on arrival
+DEFAULT_LEAD = timedelta(minutes=2)
+
+# Messages due this soon may go out before a cancel reaches Brevo - count them as sent
+CANCEL_MARGIN = timedelta(minutes=1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled (
+    message_id    TEXT PRIMARY KEY,
+    campaign      TEXT NOT NULL,
+    batch_id      TEXT NOT NULL,
+    recipient     TEXT NOT NULL,
+    scheduled_at  TEXT NOT NULL,
+    payload       TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'scheduled'
+);
+CREATE INDEX IF NOT EXISTS scheduled_campaign ON scheduled (campaign, status);
+"""
+
+
+def parse_start(value: Optional[str]) -> datetime:
+    """Parse an ISO start time (local time if no offset); None = now + lead."""
+    if not value:
+        return datetime.now().astimezone() + DEFAULT_LEAD
+    start = datetime.fromisoformat(value)
+    return start if start.tzinfo else start.astimezone()
+
+
+def schedule_times(n: int, start: datetime, interval: float) -> List[str]:
+    """ISO-8601 timestamps start, start + interval, ... for n messages."""
+    last = start + timedelta(seconds=interval * max(0, n - 1))
+    if last - datetime.now().astimezone() > MAX_SCHEDULE_AHEAD:
+        raise ValueError(
+            f"Campaign would end at {last.isoformat(timespec='seconds')}, more than "
+            f"{MAX_SCHEDULE_AHEAD} ahead (Brevo limit) - use a shorter interval or split it"
+        )
+    return [(start + timedelta(seconds=interval * i)).isoformat(timespec="seconds")
+            for i in range(n)]
+
+
+def new_batch_id() -> str:
+    return str(uuid.uuid4())
+
+
+class ScheduledLedger:
+    """Record of scheduled messages, stored next to the outbox."""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = str(db_path)
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def record(self, message_id: str, campaign: str, payload: dict) -> None:
+        db = self._connect()
+        try:
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO scheduled "
+                    "(message_id, campaign, batch_id, recipient, scheduled_at, payload, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 'scheduled')",
+                    (message_id, campaign, payload.get("batchId", ""),
+                     payload["to"][0]["email"], payload["scheduledAt"],
+                     json.dumps(payload, ensure_ascii=False)),
+                )
+        finally:
+            db.close()
+
+    def rows(self, campaign: Optional[str] = None, status: Optional[str] = "scheduled"):
+        """(message_id, campaign, batch_id, recipient, scheduled_at, payload, status) rows."""
+        sql = "SELECT message_id, campaign, batch_id, recipient, scheduled_at, payload, status FROM scheduled"
+        cond, params = [], []
+        if campaign:
+            cond.append("campaign = ?")
+            params.append(campaign)
+        if status:
+            cond.append("status = ?")
+            params.append(status)
+        if cond:
+            sql += " WHERE " + " AND ".join(cond)
+        db = self._connect()
+        try:
+            return db.execute(sql + " ORDER BY scheduled_at", params).fetchall()
+        finally:
+            db.close()
+
+    def settle(self, now: Optional[datetime] = None) -> int:
+        """Mark scheduled messages whose time has passed (or is about to) as sent."""
+        cutoff = (now or datetime.now().astimezone()) + CANCEL_MARGIN
+        due = [r[0] for r in self.rows() if datetime.fromisoformat(r[4]) <= cutoff]
+        if not due:
+            return 0
+        db = self._connect()
+        try:
+            with db:
+                db.executemany("UPDATE scheduled SET status = 'sent' WHERE message_id = ? AND status = 'scheduled'",
+                               [(m,) for m in due])
+        finally:
+            db.close()
+        return len(due)
+
+    def mark_batch(self, batch_id: str, status: str) -> int:
+        db = self._connect()
+        try:
+            with db:
+                return db.execute("UPDATE scheduled SET status = ? WHERE batch_id = ? AND status = 'scheduled'",
+                                  (status, batch_id)).rowcount
+        finally:
+            db.close()
+
+
+def submit_scheduled(
+    payloads: Iterable[dict],
+    api_key: str,
+    campaign: str,
+    start: datetime,
+    interval: float,
+    batch_id: Optional[str] = None,
+    ledger: Optional[ScheduledLedger] = None,
+    send_fn: Callable[[dict, str], SendResult] = post_email,
+    on_scheduled: Optional[Callable[[int, SendResult], None]] = None,
+) -> dict:
+    """
+    Submit a whole campaign at once, paced server-side by scheduledAt.
+
+    on_scheduled is called with (index in payloads, result) for every
+    accepted message.
+
+    Returns counters: scheduled, failed, plus the batch_id used.
+    """
+    payloads = list(payloads)
+    ledger = ledger or ScheduledLedger()
+    batch_id = batch_id or new_batch_id()
+    times = schedule_times(len(payloads), start, interval)
+    stats = {"scheduled": 0, "failed": 0, "batch_id": batch_id}
+
+    for i, (payload, when) in enumerate(zip(payloads, times)):
+        payload = dict(payload, scheduledAt=when, batchId=batch_id)
+        result = send_fn(payload, api_key)
+        to = payload["to"][0]["email"]
+        if result.ok:
+            ledger.record(result.info, campaign, payload)
+            record_direct_send(api_key)
+            stats["scheduled"] += 1
+            print(f"🗓  {to} at {when} (ID: {result.info})")
+            if on_scheduled is not None:
+                on_scheduled(i, result)
+        else:
+            stats["failed"] += 1
+            print(f"❌ {to}: {result.info}")
+    return stats
+
+
+def cancel_batch(batch_id: str, api_key: str, timeout: float = 30) -> SendResult:
+    """Cancel every not-yet-sent message of a batch (DELETE /smtp/email/{batchId})."""
+    try:
+        r = requests.delete(f"{BREVO_URL}/{batch_id}", headers=headers_for(api_key), timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        return SendResult(False, f"Request error: {str(e)}", None, 0.0)
+    ok = 200 <= r.status_code < 300
+    return SendResult(ok, "cancelled" if ok else f"HTTP {r.status_code}: {r.text}", r.status_code, 0.0)
+
+
+def cancel_campaign(campaign: str, api_key: str, ledger: Optional[ScheduledLedger] = None) -> List[dict]:
+    """
+    Cancel all scheduled batches of a campaign; returns the cancelled payloads.
+
+    Messages already due are marked sent first, so they are neither
+    returned nor resubmitted by a reschedule.
+    """
+    ledger = ledger or ScheduledLedger()
+    ledger.settle()
+    rows = ledger.rows(campaign)
+    payloads = []
+    for batch_id in dict.fromkeys(r[2] for r in rows):
+        result = cancel_batch(batch_id, api_key)
+        if result.ok:
+            n = ledger.mark_batch(batch_id, "cancelled")
+            print(f"🛑 Cancelled batch {batch_id} ({n} message(s))")
+            payloads.extend(json.loads(r[5]) for r in rows if r[2] == batch_id)
+        else:
+            print(f"❌ Could not cancel batch {batch_id}: {result.info}")
+    return payloads
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='List, cancel or reschedule scheduled Brevo emails')
+    p.add_argument('--db', default=str(DEFAULT_DB), help='Outbox SQLite file')
+    sub = p.add_subparsers(dest='command', required=True)
+    ls = sub.add_parser('list', help='Show scheduled messages')
+    ls.add_argument('--campaign')
+    c = sub.add_parser('cancel', help='Cancel every scheduled message of a campaign')
+    c.add_argument('--campaign', required=True)
+    r = sub.add_parser('reschedule', help='Cancel and resubmit a campaign with new times')
+    r.add_argument('--campaign', required=True)
+    r.add_argument('--start', help='New start time, ISO-8601 (default: in 2 minutes)')
+    r.add_argument('--interval', type=float, default=1.0, help='Seconds between messages')
+    args = p.parse_args(argv)
+
+    ledger = ScheduledLedger(args.db)
+    if args.command == 'list':
+        ledger.settle()
+        rows = ledger.rows(args.campaign)
+        for message_id, campaign, batch_id, recipient, when, _, status in rows:
+            print(f"{when}  [{campaign}] {recipient:<40} {status}  {message_id}")
+        print(f"\n{len(rows)} scheduled message(s)")
+        return 0
+
+    api_key = os.getenv('BREVO_API_KEY', '').strip()
+    if not api_key:
+        print("❌ Error: BREVO_API_KEY not set")
+        return 1
+
+    payloads = cancel_campaign(args.campaign, api_key, ledger)
+    if args.command == 'reschedule' and payloads:
+        for payload in payloads:
+            payload.pop('scheduledAt', None)
+            payload.pop('batchId', None)
+        stats = submit_scheduled(payloads, api_key, args.campaign,
+                                 parse_start(args.start), args.interval, ledger=ledger)
+        print(f"\n🗓  Rescheduled {stats['scheduled']} message(s), {stats['failed']} failed "
+              f"(batch {stats['batch_id']})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Pool of Brevo accounts / sender identities for one campaign.
+
+One API key caps a campaign at one account's rate and daily quota.
+``SenderPool`` spreads messages over several keys:
+
+- each recipient is mapped to a sender with consistent hashing (a hash ring
+  with virtual nodes), so the same address always goes out through the same
+  account and sender identity, and adding a key only moves ~1/n recipients
+- a sender that has used up its daily limit, or was rate limited (429) within
+  the last ``throttle_seconds``, is skipped: the message goes to the next
+  sender on the ring, and comes back once the key is usable again
+- if every sender with quota left is rate limited, the send waits for the
+  first one to come back (at most ``max_wait`` seconds in total) instead of
+  failing at once; only a pool whose daily limits are all used up fails
+  without a request (``QUOTA_EXHAUSTED_ERROR``)
+- usage is counted per key in the shared quota database (common/quota.py)
+
+Senders are read from ``senders.json`` next to ``.env`` (not in git)::
+
+    {"senders": [
+        {"api_key": "xkeysib-...", "from_email": "noreply@buetcsefest2026.com",
+         "from_name": "BUET CSE Fest 2026", "daily_limit": 300},
+        {"api_key": "xkeysib-...", "daily_limit": 300}
+    ]}
+
+or from ``BREVO_API_KEYS`` (comma-separated) in ``.env``; otherwise the pool
+holds just the script's ``BREVO_API_KEY``. ``from_email``/``from_name``
+override the payload's sender when set.
+
+Stored templates (--use-template) belong to one account, so use a single key
+with them.
+"""
+
+import bisect
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from common import jsonio
+from common.brevo import (DEFAULT_TIMEOUT, MISSING_KEY_ERROR, QUOTA_EXHAUSTED_ERROR, SendResult,
+                          key_id, post_email)
+from common.quota import DEFAULT_DAILY_LIMIT, QuotaScheduler
+
+DEFAULT_SENDERS_FILE = Path(__file__).resolve().parent.parent / "senders.json"
+
+VIRTUAL_NODES = 64
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+@dataclass
+class Sender:
+    """One Brevo API key, optionally with its own sender identity."""
+    api_key: str
+    from_email: Optional[str] = None
+    from_name: Optional[str] = None
+    daily_limit: int = DEFAULT_DAILY_LIMIT
+    kid: str = field(init=False)
+    used: Optional[int] = field(default=None, init=False)  # today's usage, loaded lazily
+    sent: int = field(default=0, init=False)               # sent by this run
+    throttled_until: float = field(default=0.0, init=False)
+
+    def __post_init__(self):
+        self.kid = key_id(self.api_key)
+
+
+class SenderPool:
+    """Consistent-hash routing of recipients over several senders."""
+
+    def __init__(self, senders: List[Sender], quota: Optional[QuotaScheduler] = None,
+                 throttle_seconds: float = 60.0, vnodes: int = VIRTUAL_NODES,
+                 send_fn=post_email, max_wait: float = 300.0):
+        self.senders = senders
+        self.send_fn = send_fn
+        self.quota = quota
+        self.throttle_seconds = throttle_seconds
+        self.max_wait = max_wait  # longest one send waits for rate-limited keys
+        self._ring = sorted(
+            (_hash(f"{s.kid}#{v}"), i) for i, s in enumerate(senders) for v in range(vnodes)
+        )
+        self._points = [h for h, _ in self._ring]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_api_key: str = "", path=DEFAULT_SENDERS_FILE) -> "SenderPool":
+        """Senders from senders.json, else BREVO_API_KEYS, else default_api_key."""
+        path = Path(path)
+        if path.exists():
+            senders = [Sender(**entry) for entry in jsonio.load(path).get("senders", [])]
+        else:
+            keys = [k.strip() for k in os.getenv("BREVO_API_KEYS", "").split(",") if k.strip()]
+            senders = [Sender(k) for k in (keys or [default_api_key]) if k]
+        return cls(senders)
+
+    def __len__(self) -> int:
+        return len(self.senders)
+
+    def _quota(self) -> QuotaScheduler:
+        if self.quota is None:
+            self.quota = QuotaScheduler()
+        return self.quota
+
+    def _has_quota(self, sender: Sender) -> bool:
+        if sender.used is None:
+            sender.used = self._quota().used_today(sender.kid)
+        return sender.used < sender.daily_limit
+
+    def _available(self, sender: Sender, now: float) -> bool:
+        return self._has_quota(sender) and sender.throttled_until <= now
+
+    def throttle_wait(self) -> Optional[float]:
+        """Seconds until a sender with quota left is usable again, or None if none has quota."""
+        now = time.monotonic()
+        with self._lock:
+            waits = [max(0.0, s.throttled_until - now) for s in self.senders if self._has_quota(s)]
+        return min(waits) if waits else None
+
+    def route(self, recipient: str) -> List[Sender]:
+        """Senders in ring order for a recipient: its home sender first."""
+        if not self.senders:
+            return []
+        start = bisect.bisect(self._points, _hash(recipient.strip().lower()))
+        order = []
+        for k in range(len(self._ring)):
+            idx = self._ring[(start + k) % len(self._ring)][1]
+            if idx not in order:
+                order.append(idx)
+                if len(order) == len(self.senders):
+                    break
+        return [self.senders[i] for i in order]
+
+    def pick(self, recipient: str) -> Optional[Sender]:
+        """First usable sender for a recipient, or None if all are exhausted/throttled."""
+        now = time.monotonic()
+        with self._lock:
+            for sender in self.route(recipient):
+                if self._available(sender, now):
+                    return sender
+        return None
+
+    def send(self, payload: dict, api_key: str = "", timeout: float = DEFAULT_TIMEOUT) -> SendResult:
+        """
+        Send one payload through the recipient's sender (post_email contract).
+
+        api_key is ignored - the pool picks the key. Rate-limited sends are
+        retried once on each remaining sender; when all of them are rate
+        limited, the send sleeps until the first one is usable and tries again.
+        """
+        if not self.senders:
+            return SendResult(False, MISSING_KEY_ERROR, None, 0.0)
+        recipient = payload["to"][0]["email"]
+        tried = set()
+        result = None
+        waited = 0.0
+        while True:
+            sender = self.pick(recipient)
+            if sender is None or sender.kid in tried:
+                wait = self.throttle_wait()
+                if wait is None:
+                    return SendResult(False, QUOTA_EXHAUSTED_ERROR, 429, 0.0)
+                if waited + wait > self.max_wait:
+                    # Still rate limited: report it with the time spent, so loops pace themselves
+                    if result is None:
+                        return SendResult(False, "All sender keys are rate limited", 429, waited)
+                    return SendResult(result.ok, result.info, result.status, result.latency + waited)
+                time.sleep(wait)
+                waited += wait
+                tried.clear()
+                continue
+            tried.add(sender.kid)
+
+            if sender.from_email:
+                name = sender.from_name or payload.get("sender", {}).get("name")
+                payload = dict(payload, sender={"name": name, "email": sender.from_email})
+            result = self.send_fn(payload, sender.api_key, timeout=timeout)
+
+            with self._lock:
+                if result.ok:
+                    sender.used += 1
+                    sender.sent += 1
+                elif result.status == 429:
+                    sender.throttled_until = time.monotonic() + self.throttle_seconds
+            if result.ok:
+                self._quota().record_use(sender.kid)
+                return result
+            if result.status != 429:
+                return result
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{s.kid}: {s.sent} sent ({s.used if s.used is not None else '?'}/{s.daily_limit} today)"
+            for s in self.senders
+        )
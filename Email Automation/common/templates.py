@@ -0,0 +1,213 @@
+"""
+Brevo stored templates for the local ``str.format`` email templates.
+
+Rendering and uploading the full HTML body (style block included) for every
+recipient is wasted work: the body only differs in a few values. With
+``ensure_template()`` a local template is uploaded to Brevo once and every
+send carries just ``templateId`` and the per-recipient ``params``.
+
+Local templates keep using ``{var}`` placeholders; they are converted to
+Brevo's ``{{ params.var }}`` syntax on upload. A hash of the converted
+subject/body/sender is stored in the ``templates`` table of the outbox
+database, so a template is only re-uploaded after it was edited locally.
+
+Brevo escapes params by default; placeholders whose name ends in ``_html``
+are marked ``| safe`` so pre-built HTML fragments (team lists) render as HTML.
+
+Usage (from the ``Email Automation`` folder):
+    python -m common.templates list
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import string
+import sys
+from typing import Dict, Iterable, Optional
+
+import requests
+
+from common.brevo import DEFAULT_TIMEOUT, headers_for, key_id
+from common.quota import DEFAULT_DB, now_iso
+
+TEMPLATES_URL = "https://api.brevo.com/v3/smtp/templates"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    name         TEXT NOT NULL,
+    key_id       TEXT NOT NULL,
+    template_id  INTEGER NOT NULL,
+    hash         TEXT NOT NULL,
+    synced_at    TEXT NOT NULL,
+    PRIMARY KEY (name, key_id)
+);
+"""
+
+_formatter = string.Formatter()
+
+
+def fields(template: str) -> list:
+    """Placeholder names used by a str.format template, in order, without repeats."""
+    return list(dict.fromkeys(
+        name for _, name, _, _ in _formatter.parse(template) if name
+    ))
+
+
+def to_brevo(template: str) -> str:
+    """Convert '{var}' placeholders to '{{ params.var }}' (and '{{'/'}}' back to braces)."""
+    out = []
+    for literal, name, _, _ in _formatter.parse(template):
+        out.append(literal)
+        if name:
+            safe = " | safe" if name.endswith("_html") else ""
+            out.append(f"{{{{ params.{name}{safe} }}}}")
+    return "".join(out)
+
+
+def template_params(values: dict, *templates: str) -> dict:
+    """The subset of values referenced by the given templates, as strings."""
+    used = dict.fromkeys(name for t in templates for name in fields(t))
+    return {name: str(values[name]) for name in used}
+
+
+def template_hash(definition: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(definition, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+class TemplateRegistry:
+    """Local name -> Brevo template id mapping, per API key."""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = str(db_path)
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def get(self, name: str, kid: str):
+        """(template_id, hash) or None."""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            return db.execute("SELECT template_id, hash FROM templates WHERE name = ? AND key_id = ?",
+                              (name, kid)).fetchone()
+        finally:
+            db.close()
+
+    def put(self, name: str, kid: str, template_id: int, digest: str) -> None:
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO templates VALUES (?, ?, ?, ?, ?)",
+                           (name, kid, template_id, digest, now_iso()))
+        finally:
+            db.close()
+
+    def rows(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            return db.execute("SELECT name, key_id, template_id, hash, synced_at FROM templates "
+                              "ORDER BY name").fetchall()
+        finally:
+            db.close()
+
+
+def ensure_template(
+    name: str,
+    subject: str,
+    html: str,
+    sender: dict,
+    reply_to: Optional[dict],
+    api_key: str,
+    registry: Optional[TemplateRegistry] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> int:
+    """
+    Make sure Brevo has an up-to-date copy of a local template.
+
+    Args:
+        name: Local template name (also used as the Brevo template name)
+        subject, html: str.format templates ('{var}' placeholders)
+        sender, reply_to: {"name", "email"} dicts
+        api_key: Brevo API key
+
+    Returns:
+        Brevo template id
+
+    Raises:
+        RuntimeError: if the create/update call fails
+    """
+    registry = registry or TemplateRegistry()
+    kid = key_id(api_key)
+    definition = {
+        "templateName": name,
+        "subject": to_brevo(subject),
+        "htmlContent": to_brevo(html),
+        "sender": sender,
+        "isActive": True,
+    }
+    if reply_to:
+        definition["replyTo"] = reply_to["email"]
+    digest = template_hash(definition)
+
+    known = registry.get(name, kid)
+    if known and known[1] == digest:
+        return known[0]
+
+    try:
+        if known:
+            r = requests.put(f"{TEMPLATES_URL}/{known[0]}", json=definition,
+                             headers=headers_for(api_key), timeout=timeout)
+            template_id = known[0]
+            action = "Updated"
+        else:
+            r = requests.post(TEMPLATES_URL, json=definition, headers=headers_for(api_key), timeout=timeout)
+            template_id = r.json().get("id") if 200 <= r.status_code < 300 else None
+            action = "Created"
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Template sync failed for '{name}': {e}") from e
+    if not 200 <= r.status_code < 300:
+        raise RuntimeError(f"Template sync failed for '{name}': HTTP {r.status_code}: {r.text}")
+
+    registry.put(name, kid, template_id, digest)
+    print(f"🧩 {action} Brevo template '{name}' (ID: {template_id})")
+    return template_id
+
+
+def template_payload(
+    template_id: int,
+    to: Iterable[dict],
+    params: Dict[str, str],
+    cc: Iterable[dict] = (),
+    tags: Iterable[str] = (),
+) -> dict:
+    """/v3/smtp/email body that references a stored template."""
+    payload = {"templateId": template_id, "to": list(to), "params": params}
+    cc = list(cc)
+    if cc:
+        payload["cc"] = cc
+    tags = list(tags)
+    if tags:
+        payload["tags"] = tags
+    return payload
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Show Brevo templates synced from local templates')
+    p.add_argument('--db', default=str(DEFAULT_DB), help='Outbox SQLite file')
+    sub = p.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='Show synced templates')
+    args = p.parse_args(argv)
+
+    rows = TemplateRegistry(args.db).rows()
+    for name, kid, template_id, digest, synced_at in rows:
+        print(f"{name:<24} ID {template_id:<6} key {kid}  hash {digest[:12]}  synced {synced_at}")
+    print(f"\n{len(rows)} template(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
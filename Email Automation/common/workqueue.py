@@ -0,0 +1,401 @@
+"""
+Lease-based work queue for splitting one campaign over several workers.
+
+``send_bulk.py`` and ``send_to_new_teams.py`` assume one process owns the
+CSV / ``sent_teams.json``. With ``--worker`` they instead load their emails
+into a shared queue and any number of processes (on one machine, or machines
+sharing the SQLite file) send it together:
+
+- items are grouped into batches; a worker claims one batch at a time under
+  a lease that expires after ``lease_seconds``
+- while sending, a heartbeat thread renews the lease; a worker stops before
+  the next send once it no longer holds its lease
+- each item is marked done as soon as it was sent, and only by the lease
+  holder, so a crashed worker's batch is picked up by another worker after
+  its lease expired, without resending the finished items
+- retryable failures stay pending (up to ``max_attempts`` sends) and are
+  picked up again with the next claim of their batch
+
+Adding items is idempotent (keyed by ``item_key``), so every worker can load
+the same campaign at startup; the first one fills the queue.
+
+Lease times are wall-clock (``time.time()``), so workers on different
+machines need reasonably synced clocks.
+
+Usage (from the ``Email Automation`` folder):
+    python -m common.workqueue status [--campaign NAME]
+    python -m common.workqueue release --campaign NAME   # drop all leases
+    python -m common.workqueue clear --campaign NAME     # forget a campaign
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from common.brevo import SendResult
+from common.quota import DEFAULT_DB, now_iso
+
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_BATCH_SIZE = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign     TEXT    NOT NULL,
+    item_key     TEXT    NOT NULL,
+    batch        INTEGER NOT NULL,
+    payload      TEXT    NOT NULL,
+    status       TEXT    NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    info         TEXT,
+    worker       TEXT,
+    finished_at  TEXT,
+    UNIQUE (campaign, item_key)
+);
+CREATE INDEX IF NOT EXISTS work_items_batch ON work_items (campaign, batch, status);
+CREATE TABLE IF NOT EXISTS work_leases (
+    campaign     TEXT    NOT NULL,
+    batch        INTEGER NOT NULL,
+    worker       TEXT    NOT NULL,
+    expires_at   REAL    NOT NULL,
+    PRIMARY KEY (campaign, batch)
+);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Campaign items in leased batches, stored in the shared outbox database."""
+
+    def __init__(self, campaign: str, db_path=DEFAULT_DB,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = 3):
+        self.campaign = campaign
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that also locks out other processes."""
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    # ----------------------------------------
+    # Loading
+    # ----------------------------------------
+
+    def add(self, items: Iterable[Tuple[str, dict]], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Add (item_key, payload) pairs; keys already in the queue are skipped.
+
+        Returns the number of new items.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT MAX(batch) FROM work_items WHERE campaign = ?",
+                             (self.campaign,)).fetchone()
+            batch = (row[0] or 0) + 1
+            added = 0
+            for key, payload in items:
+                cur = db.execute(
+                    "INSERT OR IGNORE INTO work_items (campaign, item_key, batch, payload) "
+                    "VALUES (?, ?, ?, ?)",
+                    (self.campaign, key, batch + added // batch_size,
+                     json.dumps(payload, ensure_ascii=False)),
+                )
+                added += cur.rowcount
+            return added
+
+    # ----------------------------------------
+    # Leases
+    # ----------------------------------------
+
+    def claim(self, worker: str) -> Optional["Lease"]:
+        """Lease the first batch with pending items that nobody else holds."""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT i.batch FROM work_items i "
+                "LEFT JOIN work_leases l ON l.campaign = i.campaign AND l.batch = i.batch "
+                "WHERE i.campaign = ? AND i.status = 'pending' "
+                "AND (l.batch IS NULL OR l.expires_at < ? OR l.worker = ?) "
+                "ORDER BY i.batch LIMIT 1",
+                (self.campaign, now, worker),
+            ).fetchone()
+            if row is None:
+                return None
+            batch = row[0]
+            db.execute("INSERT OR REPLACE INTO work_leases VALUES (?, ?, ?, ?)",
+                       (self.campaign, batch, worker, now + self.lease_seconds))
+            items = db.execute(
+                "SELECT id, item_key, payload FROM work_items "
+                "WHERE campaign = ? AND batch = ? AND status = 'pending' ORDER BY id",
+                (self.campaign, batch),
+            ).fetchall()
+        return Lease(self, worker, batch,
+                     [(i, key, json.loads(payload)) for i, key, payload in items])
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest lease expiry among batches that still have pending items."""
+        db = self._connect()
+        try:
+            return db.execute(
+                "SELECT MIN(l.expires_at) FROM work_leases l JOIN work_items i "
+                "ON i.campaign = l.campaign AND i.batch = l.batch "
+                "WHERE l.campaign = ? AND i.status = 'pending'", (self.campaign,),
+            ).fetchone()[0]
+        finally:
+            db.close()
+
+    def _renew(self, worker: str, batch: int) -> bool:
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE work_leases SET expires_at = ? WHERE campaign = ? AND batch = ? "
+                "AND worker = ? AND expires_at >= ?",
+                (time.time() + self.lease_seconds, self.campaign, batch, worker, time.time()),
+            ).rowcount == 1
+
+    def _release(self, worker: str, batch: int) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM work_leases WHERE campaign = ? AND batch = ? AND worker = ?",
+                       (self.campaign, batch, worker))
+
+    def _finish(self, worker: str, batch: int, item_id: int, result: SendResult) -> bool:
+        """Record one send, only while the worker still holds the lease."""
+        with self._transaction() as db:
+            held = db.execute(
+                "SELECT 1 FROM work_leases WHERE campaign = ? AND batch = ? AND worker = ?",
+                (self.campaign, batch, worker),
+            ).fetchone()
+            if held is None:
+                return False
+            if result.ok or result.queued is not None:
+                status = "done"
+                info = result.info if result.ok else f"queued #{result.queued}"
+            else:
+                attempts = db.execute("SELECT attempts FROM work_items WHERE id = ?",
+                                      (item_id,)).fetchone()[0] + 1
+                status = ("pending" if result.retryable and attempts < self.max_attempts
+                          else "failed")
+                info = result.info
+            db.execute(
+                "UPDATE work_items SET status = ?, attempts = attempts + 1, info = ?, worker = ?, "
+                "finished_at = ? WHERE id = ?",
+                (status, info, worker, now_iso() if status != "pending" else None, item_id),
+            )
+            return True
+
+    # ----------------------------------------
+    # Reporting
+    # ----------------------------------------
+
+    def counts(self) -> dict:
+        db = self._connect()
+        try:
+            return dict(db.execute(
+                "SELECT status, COUNT(*) FROM work_items WHERE campaign = ? GROUP BY status",
+                (self.campaign,),
+            ).fetchall())
+        finally:
+            db.close()
+
+    def results(self) -> List[Tuple[str, str, Optional[str], Optional[str]]]:
+        """(item_key, status, info, finished_at) for every item of the campaign."""
+        db = self._connect()
+        try:
+            return db.execute(
+                "SELECT item_key, status, info, finished_at FROM work_items "
+                "WHERE campaign = ? ORDER BY id", (self.campaign,),
+            ).fetchall()
+        finally:
+            db.close()
+
+    def leases(self):
+        db = self._connect()
+        try:
+            return db.execute("SELECT batch, worker, expires_at FROM work_leases "
+                              "WHERE campaign = ? ORDER BY batch", (self.campaign,)).fetchall()
+        finally:
+            db.close()
+
+    def release_all(self) -> int:
+        with self._transaction() as db:
+            return db.execute("DELETE FROM work_leases WHERE campaign = ?",
+                              (self.campaign,)).rowcount
+
+    def clear(self) -> int:
+        with self._transaction() as db:
+            db.execute("DELETE FROM work_leases WHERE campaign = ?", (self.campaign,))
+            return db.execute("DELETE FROM work_items WHERE campaign = ?",
+                              (self.campaign,)).rowcount
+
+
+class Lease:
+    """One claimed batch; use as a context manager to renew it in the background."""
+
+    def __init__(self, queue: WorkQueue, worker: str, batch: int, items: list):
+        self.queue = queue
+        self.worker = worker
+        self.batch = batch
+        self.items = items  # [(item_id, item_key, payload)]
+        self.held = True
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue._renew(self.worker, self.batch):
+                    self.held = False
+                    return
+            except sqlite3.Error:
+                # Database busy: try again on the next beat, the lease has slack
+                continue
+
+    def __enter__(self) -> "Lease":
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        if self.held:
+            self.queue._release(self.worker, self.batch)
+
+    def finish(self, item_id: int, result: SendResult) -> bool:
+        """Record a send; False (and the lease is dropped) if it was lost meanwhile."""
+        if not self.queue._finish(self.worker, self.batch, item_id, result):
+            self.held = False
+        return self.held
+
+
+def run_worker(
+    queue: WorkQueue,
+    send_fn: Callable[[dict], SendResult],
+    on_done: Optional[Callable[[str, dict, SendResult], None]] = None,
+    worker: Optional[str] = None,
+    delay: float = 0.0,
+) -> dict:
+    """
+    Claim batches and send their items until no item is pending.
+
+    Batches leased by other workers are waited for: if their worker died, the
+    lease expires and this worker takes over the rest of the batch.
+
+    Args:
+        queue: WorkQueue of the campaign
+        send_fn: Sends one payload, returns SendResult
+        on_done: Called with (item_key, payload, result) after each send
+        worker: Worker id (default: hostname-pid)
+        delay: Seconds to sleep between sends
+
+    Returns:
+        Counters: sent, failed, retry, batches, lost (leases lost mid-batch)
+    """
+    worker = worker or default_worker_id()
+    stats = {"sent": 0, "failed": 0, "retry": 0, "batches": 0, "lost": 0}
+    while True:
+        lease = queue.claim(worker)
+        if lease is None:
+            expiry = queue.next_expiry()
+            if expiry is None:
+                break
+            time.sleep(min(max(0.0, expiry - time.time()) + 0.1, queue.lease_seconds / 3))
+            continue
+        stats["batches"] += 1
+        print(f"🔒 {worker}: batch {lease.batch} ({len(lease.items)} item(s))")
+        deferred = 0
+        with lease:
+            for item_id, key, payload in lease.items:
+                if not lease.held:
+                    break
+                result = send_fn(payload)
+                if not lease.finish(item_id, result):
+                    break
+                if result.ok or result.queued is not None:
+                    stats["sent"] += 1
+                elif result.retryable:
+                    stats["retry"] += 1
+                    deferred += 1
+                else:
+                    stats["failed"] += 1
+                if on_done is not None:
+                    on_done(key, payload, result)
+                if delay and result.latency:
+                    time.sleep(delay)
+        if not lease.held:
+            stats["lost"] += 1
+            print(f"⚠️  {worker}: lost the lease on batch {lease.batch}, another worker took over")
+        elif deferred:
+            # Rate limited / Brevo down - back off before the batch is claimed again
+            time.sleep(queue.lease_seconds / 6)
+    return stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Inspect the lease-based campaign work queue')
+    p.add_argument('--db', default=str(DEFAULT_DB), help='Outbox SQLite file')
+    sub = p.add_subparsers(dest='command', required=True)
+    s = sub.add_parser('status', help='Show item counts and active leases')
+    s.add_argument('--campaign')
+    r = sub.add_parser('release', help='Drop every lease of a campaign (workers all stopped)')
+    r.add_argument('--campaign', required=True)
+    c = sub.add_parser('clear', help='Remove a campaign from the queue')
+    c.add_argument('--campaign', required=True)
+    args = p.parse_args(argv)
+
+    if args.command == 'status':
+        db = sqlite3.connect(args.db, timeout=30)
+        try:
+            db.executescript(SCHEMA)
+            campaigns = ([args.campaign] if args.campaign else
+                         [r[0] for r in db.execute("SELECT DISTINCT campaign FROM work_items")])
+        finally:
+            db.close()
+        now = time.time()
+        for campaign in campaigns:
+            queue = WorkQueue(campaign, args.db)
+            counts = ", ".join(f"{k} {v}" for k, v in sorted(queue.counts().items()))
+            print(f"📦 {campaign}: {counts or 'empty'}")
+            for batch, worker, expires_at in queue.leases():
+                state = "expired" if expires_at < now else f"{expires_at - now:.0f}s left"
+                print(f"   🔒 batch {batch:<4} {worker:<32} {state}")
+        return 0
+
+    queue = WorkQueue(args.campaign, args.db)
+    if args.command == 'release':
+        print(f"🔓 Released {queue.release_all()} lease(s)")
+    else:
+        print(f"🗑  Removed {queue.clear()} item(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import sys
+import time
+from pathlib import Path
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.aimd import send_adaptive
+from common.brevo import QUOTA_EXHAUSTED_ERROR, SendResult
+
+
+def run(results, **kwargs):
+    """send_adaptive over one item answered from results; returns (final result, send times)."""
+    times, done = [], []
+
+    def send(item):
+        times.append(time.monotonic())
+        return results.pop(0)
+
+    send_adaptive(["x"], send, lambda item, result: done.append(result), **kwargs)
+    return done[0], times
+
+
+def test_retry_is_held_back():
+    ok = SendResult(True, "<id>", 201, 0.01)
+    result, times = run([SendResult(False, "busy", 503, 0.01), ok], backoff=0.2)
+    assert result.ok
+    assert times[1] - times[0] >= 0.1  # at least half the backoff
+
+
+def test_local_429_does_not_use_up_attempts():
+    local = SendResult(False, "rate limited", 429, 0.0)
+    ok = SendResult(True, "<id>", 201, 0.01)
+    result, times = run([local] * 4 + [ok], max_attempts=1, backoff=0.01)
+    assert result.ok and len(times) == 5
+
+
+def test_exhausted_daily_limit_is_not_retried():
+    result, times = run([SendResult(False, QUOTA_EXHAUSTED_ERROR, 429, 0.0)], backoff=0.01)
+    assert result.info == QUOTA_EXHAUSTED_ERROR and len(times) == 1
@@ -0,0 +1,43 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import jsonio
+
+ITEMS = [1, 23, 456, -7.5e3, "x", True, None, {"a": [1, 2.25e-3]}, [], "", 0.5, -0.0]
+
+
+@pytest.mark.parametrize("pretty", [True, False])
+@pytest.mark.parametrize("chunk_size", list(range(1, 40)) + [jsonio.READ_CHUNK_SIZE])
+def test_iter_array_chunk_sizes(tmp_path, chunk_size, pretty):
+    path = tmp_path / "items.json"
+    path.write_text(json.dumps(ITEMS, indent=2 if pretty else None))
+    assert list(jsonio.iter_array(path, chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7])
+def test_iter_array_truncated(tmp_path, chunk_size):
+    path = tmp_path / "items.json"
+    path.write_text("[1, 2, 3")
+    with pytest.raises(ValueError):
+        list(jsonio.iter_array(path, chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, jsonio.READ_CHUNK_SIZE])
+def test_iter_array_leading_whitespace(tmp_path, chunk_size):
+    path = tmp_path / "items.json"
+    path.write_text(" \n\t" * 20 + "[ \n" + " " * 30 + "1, 2]")
+    assert list(jsonio.iter_array(path, chunk_size=chunk_size)) == [1, 2]
+
+
+@pytest.mark.parametrize("text", ["[1,,2]", "[,1]", "[1,]", "[1 2]", "[-7.]"])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, jsonio.READ_CHUNK_SIZE])
+def test_iter_array_rejects_bad_separators(tmp_path, chunk_size, text):
+    path = tmp_path / "items.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(jsonio.iter_array(path, chunk_size=chunk_size))
@@ -0,0 +1,61 @@
+import sys
+import time
+from pathlib import Path
+
+# Shared helpers live in ../common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.brevo import QUOTA_EXHAUSTED_ERROR, SendResult
+from common.quota import QuotaScheduler
+from common.senders import Sender, SenderPool
+
+PAYLOAD = {"to": [{"email": "coach@example.com"}], "subject": "Hi"}
+
+
+class FakeBrevo:
+    """send_fn answering from a list of statuses, then 201."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def __call__(self, payload, api_key, timeout=None):
+        self.calls += 1
+        status = self.statuses.pop(0) if self.statuses else 201
+        if status == 201:
+            return SendResult(True, f"<msg{self.calls}>", 201, 0.01)
+        return SendResult(False, "Too many requests", status, 0.01)
+
+
+def make_pool(tmp_path, send_fn, daily_limit=100, **kwargs):
+    return SenderPool([Sender("key-1", daily_limit=daily_limit)],
+                      quota=QuotaScheduler(tmp_path / "outbox.sqlite3"), send_fn=send_fn, **kwargs)
+
+
+def test_single_throttled_key_waits_and_retries(tmp_path):
+    brevo = FakeBrevo([429])
+    pool = make_pool(tmp_path, brevo, throttle_seconds=0.2)
+    start = time.monotonic()
+    first = pool.send(PAYLOAD)
+    assert first.ok and brevo.calls == 2
+    assert time.monotonic() - start >= 0.2
+    # Later sends go out normally instead of failing without a request
+    results = [pool.send(PAYLOAD) for _ in range(5)]
+    assert all(r.ok for r in results) and brevo.calls == 7
+
+
+def test_still_throttled_after_max_wait_reports_the_time_spent(tmp_path):
+    brevo = FakeBrevo([429] * 10)
+    pool = make_pool(tmp_path, brevo, throttle_seconds=0.1, max_wait=0.25)
+    result = pool.send(PAYLOAD)
+    assert not result.ok and result.status == 429
+    assert result.latency >= 0.2
+    assert brevo.calls == 3
+
+
+def test_daily_limit_used_up_fails_without_a_request(tmp_path):
+    brevo = FakeBrevo([])
+    pool = make_pool(tmp_path, brevo, daily_limit=1)
+    assert pool.send(PAYLOAD).ok
+    result = pool.send(PAYLOAD)
+    assert not result.ok and result.info == QUOTA_EXHAUSTED_ERROR
+    assert brevo.calls == 1
@@ -0,0 +1,273 @@
+"""
+University strength ratings across past contests.
+
+Every standings snapshot (one scraped standings CSV per contest, oldest
+first) is joined to the registered universities (standings_join.py) and
+reduced to per-university arrays - best rank and max solved, shape
+universities × contests. Two configurable scores are computed from them:
+
+- decayed: the university's best-team percentile per contest
+  (1 = won, ~0 = last), averaged with weight ``decay ** age`` so recent
+  contests count more; contests a university missed don't count against it
+- elo: Elo-like ratings where, in every contest, each university "plays"
+  every other one present and wins if its best team ranked higher; each
+  contest is one vectorized update over the pairwise matrix
+
+Both are running values: the decayed score keeps its weighted sums, so a
+new contest scales them by ``decay`` and adds one column, and Elo applies
+one more update. Arrays, running sums and ratings are cached in an .npz
+file together with each contest's content hash and a hash of the name
+mapping and team list the standings were joined with - adding a contest
+reuses everything before it; changing an earlier file, a parameter, a
+mapping entry or the registered universities recomputes.
+
+Usage:
+    python ratings.py contests/2024_prelim.csv contests/2025_onsite.csv [--decay 0.7] [--k 32]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from standings_join import (DEFAULT_CACHE, DEFAULT_TEAMS_JSON, UniversityIndex, join_standings,
+                            load_cache, load_standings, save_cache)
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_RATINGS_CACHE = HERE / "ratings_cache.npz"
+
+DEFAULT_DECAY = 0.7
+DEFAULT_K = 32.0
+INITIAL_ELO = 1500.0
+
+
+def file_digest(path):
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def join_digest(mapping_cache, teams_json):
+    """Hash of what standings are joined with: the name mapping and university_teams.json."""
+    h = hashlib.sha1(json.dumps(mapping_cache, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(Path(teams_json).read_bytes())
+    return h.hexdigest()
+
+
+def contest_columns(joined, universities):
+    """(best rank, max solved) per university for one contest, NaN where absent, and team count."""
+    matched = joined[joined["university"].notna()]
+    per_uni = matched.groupby("university").agg(best_rank=("rank", "min"), solved=("solved", "max"))
+    per_uni = per_uni.reindex(universities)
+    return (per_uni["best_rank"].to_numpy(dtype=float),
+            per_uni["solved"].to_numpy(dtype=float),
+            len(joined))
+
+
+def percentile(best_rank, n_teams):
+    """1 for the winner down to ~0 for the last team; NaN where absent."""
+    return 1.0 - (best_rank - 1.0) / max(n_teams, 1)
+
+
+def elo_update(ratings, best_rank, k=DEFAULT_K):
+    """One contest as a round robin between the universities present in it."""
+    present = ~np.isnan(best_rank)
+    m = int(present.sum())
+    if m < 2:
+        return ratings
+    r = ratings[present]
+    x = best_rank[present]
+    # expected[i, j]: chance i finishes above j
+    expected = 1.0 / (1.0 + 10.0 ** ((r[None, :] - r[:, None]) / 400.0))
+    actual = (x[:, None] < x[None, :]) + 0.5 * (x[:, None] == x[None, :])
+    np.fill_diagonal(expected, 0.0)
+    np.fill_diagonal(actual, 0.0)
+    updated = ratings.copy()
+    updated[present] = r + k * (actual - expected).sum(axis=1) / (m - 1)
+    return updated
+
+
+class RatingModel:
+    """Contest arrays plus running decayed sums and Elo ratings."""
+
+    def __init__(self, decay=DEFAULT_DECAY, k=DEFAULT_K):
+        self.decay = decay
+        self.k = k
+        self.universities = []
+        self.contests = []   # contest ids, oldest first
+        self.digests = []
+        self.join_digest = ""  # join_digest() the cached contests were joined with
+        self.n_teams = np.zeros(0)
+        self.best_rank = np.zeros((0, 0))  # universities × contests
+        self.solved = np.zeros((0, 0))
+        self.weighted = np.zeros(0)        # sum of decay**age * percentile
+        self.weights = np.zeros(0)         # sum of decay**age over attended contests
+        self.elo = np.zeros(0)
+
+    # ----------------------------------------
+    # Cache
+    # ----------------------------------------
+
+    @classmethod
+    def load(cls, path, decay=DEFAULT_DECAY, k=DEFAULT_K):
+        """Cached model, or an empty one if missing or built with other parameters."""
+        model = cls(decay, k)
+        if not os.path.exists(path):
+            return model
+        with np.load(path) as data:
+            if float(data["decay"]) != decay or float(data["k"]) != k:
+                return model
+            model.universities = data["universities"].tolist()
+            model.contests = data["contests"].tolist()
+            model.digests = data["digests"].tolist()
+            model.join_digest = str(data["join_digest"]) if "join_digest" in data.files else ""
+            for name in ("n_teams", "best_rank", "solved", "weighted", "weights", "elo"):
+                setattr(model, name, data[name])
+        return model
+
+    def save(self, path):
+        tmp = f"{path}.tmp.npz"  # np.savez adds .npz otherwise
+        np.savez(tmp, decay=self.decay, k=self.k,
+                 universities=np.array(self.universities, dtype=str),
+                 contests=np.array(self.contests, dtype=str),
+                 digests=np.array(self.digests, dtype=str),
+                 join_digest=np.array(self.join_digest, dtype=str),
+                 n_teams=self.n_teams, best_rank=self.best_rank, solved=self.solved,
+                 weighted=self.weighted, weights=self.weights, elo=self.elo)
+        os.replace(tmp, path)
+
+    def reusable_prefix(self, contests):
+        """How many leading (id, digest) pairs match the cache."""
+        n = 0
+        for cached, wanted in zip(zip(self.contests, self.digests), contests):
+            if cached != wanted:
+                break
+            n += 1
+        return n
+
+    # ----------------------------------------
+    # Updates
+    # ----------------------------------------
+
+    def _grow(self, universities):
+        known = set(self.universities)
+        new = [u for u in universities if u not in known]
+        if not new:
+            return
+        extra = len(new)
+        self.universities = self.universities + new
+        pad = np.full((extra, self.best_rank.shape[1]), np.nan)
+        self.best_rank = np.vstack([self.best_rank, pad])
+        self.solved = np.vstack([self.solved, pad])
+        self.weighted = np.concatenate([self.weighted, np.zeros(extra)])
+        self.weights = np.concatenate([self.weights, np.zeros(extra)])
+        self.elo = np.concatenate([self.elo, np.full(extra, INITIAL_ELO)])
+
+    def _accumulate(self, best_rank, n_teams):
+        # Every earlier contest gets one step older
+        attended = ~np.isnan(best_rank)
+        self.weighted = self.decay * self.weighted + np.where(attended, percentile(best_rank, n_teams), 0.0)
+        self.weights = self.decay * self.weights + attended
+        self.elo = elo_update(self.elo, best_rank, self.k)
+
+    def add_contest(self, contest_id, digest, joined):
+        """Append one contest (newer than all cached ones) and update the scores."""
+        self._grow(sorted(joined["university"].dropna().unique()))
+        best_rank, solved, n_teams = contest_columns(joined, self.universities)
+        self.contests.append(contest_id)
+        self.digests.append(digest)
+        self.n_teams = np.append(self.n_teams, n_teams)
+        self.best_rank = np.column_stack([self.best_rank, best_rank])
+        self.solved = np.column_stack([self.solved, solved])
+        self._accumulate(best_rank, n_teams)
+
+    def truncate(self, n):
+        """Keep only the first n contests, replaying the running scores from the arrays."""
+        if n == len(self.contests):
+            return
+        self.contests, self.digests = self.contests[:n], self.digests[:n]
+        self.n_teams = self.n_teams[:n]
+        self.best_rank, self.solved = self.best_rank[:, :n], self.solved[:, :n]
+        count = len(self.universities)
+        self.weighted, self.weights = np.zeros(count), np.zeros(count)
+        self.elo = np.full(count, INITIAL_ELO)
+        for j in range(n):
+            self._accumulate(self.best_rank[:, j], self.n_teams[j])
+
+    # ----------------------------------------
+    # Results
+    # ----------------------------------------
+
+    def ratings(self):
+        """One row per university, strongest first."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            decayed = np.where(self.weights > 0, self.weighted / self.weights, np.nan)
+        attended = ~np.isnan(self.best_rank)
+        last = np.full(len(self.universities), np.nan)
+        if self.best_rank.size:
+            # Best rank in the most recent contest each university attended
+            idx = attended.shape[1] - 1 - np.argmax(attended[:, ::-1], axis=1)
+            last = np.where(attended.any(axis=1), self.best_rank[np.arange(len(last)), idx], np.nan)
+        table = pd.DataFrame({
+            "university": self.universities,
+            "contests": attended.sum(axis=1),
+            "decayed_score": np.round(decayed, 4),
+            "elo": np.round(self.elo, 1),
+            "last_best_rank": last,
+            "best_solved": np.where(attended, self.solved, 0).max(axis=1, initial=0),
+        })
+        table = table[table["contests"] > 0]
+        return table.sort_values(["decayed_score", "elo"], ascending=False).reset_index(drop=True)
+
+
+def update_ratings(paths, model, index, mapping_cache, teams_json=DEFAULT_TEAMS_JSON):
+    """Bring model up to date with the contest files (oldest first); returns contests added."""
+    wanted = [(Path(p).stem, file_digest(p)) for p in paths]
+    # An edited mapping or team list can move rows between universities in any contest
+    same_join = model.join_digest == join_digest(mapping_cache, teams_json)
+    keep = model.reusable_prefix(wanted) if same_join else 0
+    model.truncate(keep)
+    for (contest_id, digest), path in list(zip(wanted, paths))[keep:]:
+        joined, _, unmatched = join_standings(load_standings(path), index, mapping_cache)
+        if unmatched:
+            print(f"⚠ {contest_id}: {len(unmatched)} institution(s) not matched (see standings_join.py)")
+        model.add_contest(contest_id, digest, joined)
+    # After the run: names matched just now are in the mapping saved next to the cache
+    model.join_digest = join_digest(mapping_cache, teams_json)
+    return len(wanted) - keep
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Rate universities across past contest standings")
+    p.add_argument("standings", nargs="+", help="Standings CSVs, oldest contest first")
+    p.add_argument("--decay", type=float, default=DEFAULT_DECAY,
+                   help="Weight kept per contest of age (1 = all contests equal)")
+    p.add_argument("--k", type=float, default=DEFAULT_K, help="Elo update size")
+    p.add_argument("--teams-json", default=str(DEFAULT_TEAMS_JSON), help="university_teams.json")
+    p.add_argument("--mapping", default=str(DEFAULT_CACHE), help="Standings name mapping cache")
+    p.add_argument("--cache", default=str(DEFAULT_RATINGS_CACHE), help="Ratings cache (.npz)")
+    p.add_argument("-o", "--out", default=str(HERE / "university_ratings.csv"), help="Ratings CSV")
+    args = p.parse_args(argv)
+
+    index = UniversityIndex.from_teams_json(args.teams_json)
+    mapping = load_cache(args.mapping)
+    model = RatingModel.load(args.cache, args.decay, args.k)
+    cached = len(model.contests)
+    added = update_ratings(args.standings, model, index, mapping, args.teams_json)
+    save_cache(mapping, args.mapping)
+    model.save(args.cache)
+
+    print(f"📊 {len(model.contests)} contest(s): {len(model.contests) - added} from cache, "
+          f"{added} computed (cache had {cached})")
+    table = model.ratings()
+    table.to_csv(args.out, index=False, encoding="utf-8")
+    print(f"✓ Created {args.out} ({len(table)} universities)")
+    print(table.head(10).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
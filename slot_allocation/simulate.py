@@ -0,0 +1,267 @@
+"""
+What-if simulator for slot allocation rules.
+
+Evaluates many allocation rules at once, as NumPy arrays of shape
+(parameter sets × universities). One rule is:
+
+- the host university gets ``host`` slots outside the pool
+- every registered university gets ``base`` slots (0 or 1) - as long as
+  the pool has a seat for each
+- the rest of the ``seats`` pool is shared by score, largest remainder first,
+  never above ``cap`` or the university's registered team count; seats
+  a capped university can't take go to the others
+- score = weight × strength + (1 - weight) × registration share, where
+  strength comes from ratings.py (decayed_score) and universities flagged
+  for integrity concerns have their score scaled by (1 - penalty)
+
+Parameter sets are the full grid of the given values, or --samples random
+sets drawn within their ranges. Reported:
+
+- simulation_universities.csv: per-university slot distribution over all sets
+  (mean, min, p10, median, p90, max, share of sets with a slot)
+- simulation_params.csv: every set with its fairness metrics - Gini of slots
+  per registered team, Spearman correlation of slots with strength,
+  universities left without a slot, and slots moved vs final_slot.csv
+
+Usage:
+    python simulate.py --cap 3 4 5 --host 6 8 --penalty 0 0.5 1 --weight 0.3 0.5 0.7 \\
+        --flagged "SOME UNIVERSITY" [--samples 5000]
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from standings_join import DEFAULT_TEAMS_JSON
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_RATINGS = HERE / "university_ratings.csv"
+DEFAULT_CURRENT = DEFAULT_TEAMS_JSON.parent / "final_slot.csv"
+
+PARAMS = ("seats", "host", "base", "cap", "weight", "penalty")
+
+
+def name_key(name):
+    return " ".join(str(name).upper().split())
+
+
+# ========================================
+# INPUTS
+# ========================================
+
+def load_inputs(teams_json, ratings_path, host_name):
+    """Universities with team counts and strengths (0 where unrated)."""
+    with open(teams_json, encoding="utf-8") as f:
+        entries = json.load(f)
+    table = pd.DataFrame({
+        "university": [e["university"] for e in entries],
+        "teams": [e.get("team_count", len(e.get("teams", []))) for e in entries],
+    })
+    table = table[table["teams"] > 0].reset_index(drop=True)
+    if Path(ratings_path).exists():
+        ratings = pd.read_csv(ratings_path)
+        strength = dict(zip(ratings["university"].map(name_key), ratings["decayed_score"]))
+        table["strength"] = table["university"].map(name_key).map(strength).fillna(0.0)
+        print(f"📊 Strength for {int((table['strength'] > 0).sum())}/{len(table)} universities from {ratings_path}")
+    else:
+        table["strength"] = 0.0
+        print(f"⚠ {ratings_path} not found (run ratings.py) - allocating by registrations only")
+    table["host"] = table["university"].map(name_key) == name_key(host_name)
+    return table
+
+
+def load_current(path):
+    """{university key: slots} from final_slot.csv (no header), or None."""
+    if not Path(path).exists():
+        return None
+    current = pd.read_csv(path, header=None, names=["university", "slots"])
+    return dict(zip(current["university"].map(name_key), current["slots"]))
+
+
+def parameter_sets(values, samples=0, seed=0):
+    """(P, len(PARAMS)) array: the full grid, or random sets within each range."""
+    if samples:
+        rng = np.random.default_rng(seed)
+        columns = []
+        for name in PARAMS:
+            lo, hi = min(values[name]), max(values[name])
+            if name in ("weight", "penalty"):
+                columns.append(rng.uniform(lo, hi, samples))
+            else:
+                columns.append(rng.integers(lo, hi + 1, samples).astype(float))
+        return np.column_stack(columns)
+    return np.array(list(itertools.product(*(values[name] for name in PARAMS))), dtype=float)
+
+
+# ========================================
+# ALLOCATION
+# ========================================
+
+def largest_remainder(score, limit, seats):
+    """
+    Share seats[p] by score[p] under limit[p] for every parameter set p at once.
+
+    Rounds down first; seats left by rounding go one each to the largest
+    remainders; seats a capped university can't take are shared again.
+    """
+    P, U = score.shape
+    rows = np.arange(P)[:, None]
+    alloc = np.zeros((P, U))
+    for _ in range(U + 2):
+        room = limit - alloc
+        remaining = seats - alloc.sum(axis=1)
+        open_ = room > 0
+        if not ((remaining > 0) & open_.any(axis=1)).any():
+            break
+        weight = np.where(open_, score, 0.0)
+        total = weight.sum(axis=1, keepdims=True)
+        share = np.divide(np.maximum(remaining, 0)[:, None] * weight, total,
+                          out=np.zeros_like(weight), where=total > 0)
+        give = np.minimum(np.floor(share), room)
+        if not give.any():
+            # Only fractions left: one seat each to the largest remainders
+            frac = np.where(open_, share - np.floor(share) + 1e-9 * score, -np.inf)
+            order = np.argsort(-frac, axis=1)
+            rank = np.empty_like(order)
+            rank[rows, order] = np.arange(U)
+            give = ((rank < remaining[:, None]) & open_).astype(float)
+        alloc += give
+    return alloc
+
+
+def allocate(table, params, flagged):
+    """(P, U) slots for every parameter set."""
+    p = dict(zip(PARAMS, params.T))
+    teams = table["teams"].to_numpy(dtype=float)[None, :]
+    host = table["host"].to_numpy()[None, :]
+    is_flagged = table["university"].map(name_key).isin({name_key(f) for f in flagged}).to_numpy()[None, :]
+
+    strength = table["strength"].to_numpy(dtype=float)
+    strength = strength / strength.sum() if strength.sum() > 0 else strength
+    registrations = teams[0] / teams[0].sum()
+    # Without ratings, only registrations can decide
+    weight = p["weight"][:, None] if strength.sum() > 0 else np.zeros((len(params), 1))
+    score = weight * strength[None, :] + (1 - weight) * registrations[None, :]
+    score = score * np.where(is_flagged, 1 - p["penalty"][:, None], 1.0)
+    score = score + 1e-12  # universities with no score still take leftover seats
+
+    limit = np.minimum(p["cap"][:, None], teams)
+    base = np.minimum(p["base"][:, None], limit)
+    base = np.where(host, 0, base)
+    base = np.where(base.sum(axis=1, keepdims=True) <= p["seats"][:, None], base, 0)
+    host_slots = np.where(host, np.minimum(p["host"][:, None], teams), 0)
+    limit = np.where(host, 0, limit)  # the host takes no pool seats
+
+    pool = p["seats"] - base.sum(axis=1)
+    return host_slots + base + largest_remainder(score, limit - base, np.maximum(pool, 0))
+
+
+# ========================================
+# METRICS
+# ========================================
+
+def gini(values):
+    """Gini coefficient of each row (0 = equal)."""
+    v = np.sort(values, axis=1)
+    n = v.shape[1]
+    cum = np.cumsum(v, axis=1)
+    total = cum[:, -1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        g = (n + 1 - 2 * (cum.sum(axis=1) / total)) / n
+    return np.where(total > 0, g, 0.0)
+
+
+def spearman(values, reference):
+    """Rank correlation of each row with one reference vector."""
+    def ranks(a):
+        return pd.DataFrame(a).rank(axis=1).to_numpy()
+    x = ranks(values)
+    y = ranks(reference[None, :])[0]
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean()
+    denom = np.sqrt((x ** 2).sum(axis=1) * (y ** 2).sum())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denom > 0, (x * y).sum(axis=1) / denom, np.nan)
+
+
+def metrics(table, params, alloc, current=None):
+    teams = table["teams"].to_numpy(dtype=float)
+    result = pd.DataFrame(params, columns=PARAMS)
+    result["gini_per_team"] = np.round(gini(alloc / teams), 4)
+    result["strength_rank_corr"] = np.round(spearman(alloc, table["strength"].to_numpy()), 4)
+    result["without_slot"] = (alloc == 0).sum(axis=1)
+    result["allocated"] = alloc.sum(axis=1).astype(int)
+    if current is not None:
+        now = table["university"].map(name_key).map(current).fillna(0).to_numpy()
+        pool = ~table["host"].to_numpy()  # the host is set by its own rule
+        result["moved_vs_current"] = np.abs(alloc[:, pool] - now[pool]).sum(axis=1).astype(int)
+    return result
+
+
+def distribution(table, alloc):
+    q = np.percentile(alloc, [10, 50, 90], axis=0)
+    return pd.DataFrame({
+        "university": table["university"],
+        "teams": table["teams"],
+        "strength": table["strength"].round(4),
+        "mean": alloc.mean(axis=0).round(2),
+        "min": alloc.min(axis=0).astype(int),
+        "p10": q[0], "median": q[1], "p90": q[2],
+        "max": alloc.max(axis=0).astype(int),
+        "share_with_slot": (alloc > 0).mean(axis=0).round(3),
+    }).sort_values("mean", ascending=False)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Evaluate many slot allocation rules at once")
+    p.add_argument("--seats", type=int, nargs="+", help="Pool size(s) (default: total of final_slot.csv)")
+    p.add_argument("--host", type=int, nargs="+", default=[8], help="Host university slots")
+    p.add_argument("--host-name", default="BUET", help="Host university")
+    p.add_argument("--base", type=int, nargs="+", default=[0], help="Slots every registered university gets")
+    p.add_argument("--cap", type=int, nargs="+", default=[3, 4, 5], help="Max slots per university")
+    p.add_argument("--weight", type=float, nargs="+", default=[0.3, 0.5, 0.7],
+                   help="Weight of strength vs registrations")
+    p.add_argument("--penalty", type=float, nargs="+", default=[0.0, 0.5, 1.0],
+                   help="Score reduction for flagged universities")
+    p.add_argument("--flagged", nargs="*", default=[], help="Universities with integrity concerns")
+    p.add_argument("--samples", type=int, default=0, help="Random parameter sets instead of the grid")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--teams-json", default=str(DEFAULT_TEAMS_JSON), help="university_teams.json")
+    p.add_argument("--ratings", default=str(DEFAULT_RATINGS), help="university_ratings.csv from ratings.py")
+    p.add_argument("--current", default=str(DEFAULT_CURRENT), help="Published allocation to compare with")
+    p.add_argument("--out-dir", default=str(HERE), help="Where to write the reports")
+    args = p.parse_args(argv)
+
+    table = load_inputs(args.teams_json, args.ratings, args.host_name)
+    current = load_current(args.current)
+    seats = args.seats or ([int(sum(current.values()))] if current else None)
+    if not seats:
+        p.error("--seats is required without final_slot.csv")
+    values = {"seats": seats, "host": args.host, "base": args.base, "cap": args.cap,
+              "weight": args.weight, "penalty": args.penalty}
+
+    started = time.perf_counter()
+    params = parameter_sets(values, args.samples, args.seed)
+    alloc = allocate(table, params, args.flagged)
+    result = metrics(table, params, alloc, current)
+    dist = distribution(table, alloc)
+    elapsed = time.perf_counter() - started
+
+    out = Path(args.out_dir)
+    result.to_csv(out / "simulation_params.csv", index=False)
+    dist.to_csv(out / "simulation_universities.csv", index=False)
+    print(f"✓ {len(params)} allocation(s) × {len(table)} universities in {elapsed:.2f}s")
+    print(f"✓ Created {out / 'simulation_params.csv'} and {out / 'simulation_universities.csv'}")
+    print("\nFairest rules (lowest Gini of slots per team):")
+    print(result.sort_values("gini_per_team").head(5).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
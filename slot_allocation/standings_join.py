@@ -0,0 +1,304 @@
+"""
+Join scraped standings to registered universities.
+
+standings.csv (from scrap.py) prints institutions the way BAPS OJ has them,
+university_teams.json uses the names from our registration form. This stage
+maps every standings institution to one registered university:
+
+1. the mapping cache (standings_mapping.json) - earlier matches and manual fixes
+2. the same normalized token set ("University of Dhaka" == "Dhaka University")
+3. the same acronym of three letters or more, printed as the whole name
+   ("BUET") or in parentheses ("... (SUST)") - never generated from the
+   initials of a printed multi-word name ("Barishal University" is not "BU")
+4. the best candidate from an inverted token index by weighted token overlap
+   (rare tokens count more), if it is clearly ahead of the runner-up and of
+   the same kind (a college never matches a university)
+
+Only names not in the cache are resolved, so a new scrape costs one index
+lookup per new institution. Unmatched names are listed for review; add them
+to the cache by hand (null = not a registered university).
+
+Per-university features (best rank, max/mean solved, teams, teams in top N)
+are then one groupby over the joined table.
+
+Usage:
+    python standings_join.py [--standings standings.csv] [--top 10 30 60]
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_TEAMS_JSON = HERE.parent / "Email Automation" / "CC_Email_Sender" / "university_teams.json"
+DEFAULT_CACHE = HERE / "standings_mapping.json"
+
+# Words that don't tell universities apart
+STOPWORDS = {"of", "and", "the", "for", "at", "in"}
+GENERIC = {"university", "institute", "college", "school", "bangladesh", "technology",
+           "science", "engineering"}
+KINDS = {"university", "college", "institute", "school", "polytechnic"}
+
+MIN_SCORE = 0.5   # weighted Jaccard similarity of the token sets
+MIN_MARGIN = 0.15  # lead over the runner-up
+MIN_ACRONYM = 3    # two-letter initials ("BU") are shared by too many names
+
+_PARENS = re.compile(r"\(([^)]*)\)")
+_WORD = re.compile(r"[a-z0-9]+")
+
+TYPO_MAP = {
+    "bangaldesh": "bangladesh",
+    "engineerign": "engineering",
+    "gopalgonj": "gopalganj",
+}
+
+
+def tokens(name):
+    """Lowercase word tokens without stopwords, typos fixed, parentheses dropped."""
+    text = _PARENS.sub(" ", str(name).lower().replace("&", " and "))
+    words = [TYPO_MAP.get(w, w) for w in _WORD.findall(text)]
+    return [w for w in words if w not in STOPWORDS]
+
+
+def acronyms(name):
+    """Acronyms a name is known by: initials of its words and any '(ABC)' part."""
+    found = set()
+    words = tokens(name)
+    if len(words) > 1:
+        found.add("".join(w[0] for w in words))
+    for inner in _PARENS.findall(str(name)):
+        inner = "".join(_WORD.findall(inner.lower()))
+        if inner:
+            found.add(inner)
+    return found
+
+
+def printed_acronyms(printed):
+    """Acronyms a printed name is written as: the whole name if it is one word
+    ("BUET", "B.U.E.T.") and any '(ABC)' part - never the initials of its words."""
+    found = set()
+    outside = _PARENS.sub(" ", str(printed)).split()
+    if len(outside) == 1:
+        found.add("".join(_WORD.findall(outside[0].lower())))
+    for inner in _PARENS.findall(str(printed)):
+        found.add("".join(_WORD.findall(inner.lower())))
+    return {acr for acr in found if len(acr) >= MIN_ACRONYM}
+
+
+def name_key(name):
+    return " ".join(sorted(set(tokens(name))))
+
+
+class UniversityIndex:
+    """Inverted token index over the registered university names."""
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(n for n in names if n))
+        self.token_sets = [set(tokens(name)) for name in self.names]
+        self.by_key = {}
+        self.by_acronym = defaultdict(set)
+        self.postings = defaultdict(set)
+        for i, name in enumerate(self.names):
+            self.by_key.setdefault(name_key(name), i)
+            # A one-word registered name ("BUET") is an acronym itself
+            known = acronyms(name) | (self.token_sets[i] if len(self.token_sets[i]) == 1 else set())
+            for acr in known:
+                if len(acr) >= MIN_ACRONYM:
+                    self.by_acronym[acr].add(i)
+            for tok in self.token_sets[i]:
+                self.postings[tok].add(i)
+        # Rare tokens ("shahjalal") count more than common ones ("university")
+        n = max(len(self.names), 1)
+        self.weight = {tok: (0.1 if tok in GENERIC else 1.0) * math.log(1 + n / len(ids))
+                       for tok, ids in self.postings.items()}
+        self.total = [sum(self.weight[t] for t in toks) for toks in self.token_sets]
+
+    @classmethod
+    def from_teams_json(cls, path=DEFAULT_TEAMS_JSON):
+        with open(path, encoding="utf-8") as f:
+            return cls(entry["university"] for entry in json.load(f))
+
+    def match(self, printed):
+        """Registered name for a printed institution, or None."""
+        key = name_key(printed)
+        if not key:
+            return None
+        if key in self.by_key:
+            return self.names[self.by_key[key]]
+
+        # Printed as an acronym ("BUET") or with one in parentheses
+        for acr in printed_acronyms(printed):
+            ids = self.by_acronym.get(acr, ())
+            if len(ids) == 1:
+                return self.names[next(iter(ids))]
+
+        # Weighted token overlap, scored only against names sharing a token
+        words = set(tokens(printed))
+        kinds = words & KINDS
+        overlap = defaultdict(float)
+        for tok in words:
+            for i in self.postings.get(tok, ()):
+                overlap[i] += self.weight[tok]
+        total = sum(self.weight.get(tok, 1.0) for tok in words)
+        ranked = sorted(
+            ((shared / (total + self.total[i] - shared), i) for i, shared in overlap.items()
+             if not (kinds and self.token_sets[i] & KINDS and not kinds & self.token_sets[i])),
+            reverse=True)
+        if not ranked:
+            return None
+        best, best_id = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        if best >= MIN_SCORE and best - runner_up >= MIN_MARGIN:
+            return self.names[best_id]
+        return None
+
+
+# ========================================
+# MAPPING CACHE
+# ========================================
+
+def load_cache(path=DEFAULT_CACHE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cache(mapping, path=DEFAULT_CACHE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(mapping.items())), f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def resolve(printed_names, index, cache):
+    """
+    Map printed institution names to registered universities.
+
+    Only names missing from the cache are matched; matches are added to it.
+
+    Returns:
+        (mapping for the given names, newly matched count, unmatched names)
+    """
+    new, unmatched = 0, []
+    for printed in dict.fromkeys(printed_names):
+        if printed in cache:
+            continue
+        university = index.match(printed)
+        if university is None:
+            unmatched.append(printed)
+        else:
+            cache[printed] = university
+            new += 1
+    return {p: cache.get(p) for p in printed_names}, new, unmatched
+
+
+# ========================================
+# STANDINGS
+# ========================================
+
+def _find(columns, *words):
+    """First column whose header contains a word, trying words in order."""
+    for word in words:
+        for col in columns:
+            if word in str(col).lower():
+                return col
+    return None
+
+
+def load_standings(path, institution_col=None):
+    """
+    standings.csv as rank / team / institution / solved / penalty columns.
+
+    Columns are found by header; a missing rank is taken from row order.
+    """
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+    cols = list(raw.columns)
+    institution_col = institution_col or _find(cols, "institut", "university", "organization", "affiliation")
+    team_col = _find(cols, "team", "name")
+    if institution_col is None or institution_col not in cols:
+        raise SystemExit(f"❌ Error: No institution column in {path} (found {cols}); "
+                         f"pass --institution-col")
+
+    def number(col):
+        if col is None:
+            return pd.Series(float("nan"), index=raw.index)
+        return pd.to_numeric(raw[col].str.extract(r"(-?\d+)", expand=False), errors="coerce")
+
+    rank = number(_find(cols, "rank", "#", "pos"))
+    return pd.DataFrame({
+        "rank": rank.fillna(pd.Series(range(1, len(raw) + 1), index=raw.index)).astype(int),
+        "team": raw[team_col].str.strip() if team_col else "",
+        "institution": raw[institution_col].str.strip(),
+        "solved": number(_find(cols, "solved", "score")).fillna(0).astype(int),
+        "penalty": number(_find(cols, "penalty", "time")),
+    })
+
+
+def join_standings(standings, index, cache):
+    """Add a 'university' column (registered name or None) to standings."""
+    mapping, new, unmatched = resolve(standings["institution"], index, cache)
+    joined = standings.assign(university=standings["institution"].map(mapping))
+    return joined, new, unmatched
+
+
+def university_features(joined, top=(10, 30, 60)):
+    """Per-university performance features from joined standings, one groupby."""
+    matched = joined[joined["university"].notna()]
+    for n in top:
+        matched = matched.assign(**{f"top{n}": (matched["rank"] <= n).astype(int)})
+    agg = {
+        "best_rank": ("rank", "min"),
+        "teams": ("rank", "size"),
+        "max_solved": ("solved", "max"),
+        "mean_solved": ("solved", "mean"),
+    }
+    agg.update({f"teams_in_top{n}": (f"top{n}", "sum") for n in top})
+    features = matched.groupby("university").agg(**agg).sort_values("best_rank")
+    features["mean_solved"] = features["mean_solved"].round(2)
+    return features.reset_index()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Match standings institutions to registered universities")
+    p.add_argument("--standings", default=str(HERE / "standings.csv"), help="Scraped standings CSV")
+    p.add_argument("--teams-json", default=str(DEFAULT_TEAMS_JSON), help="university_teams.json")
+    p.add_argument("--cache", default=str(DEFAULT_CACHE), help="Printed name -> university mapping")
+    p.add_argument("--institution-col", help="Institution column (default: detect by header)")
+    p.add_argument("--top", type=int, nargs="+", default=[10, 30, 60], help="Top-N cutoffs")
+    p.add_argument("-o", "--out", default=str(HERE / "university_features.csv"), help="Features CSV")
+    args = p.parse_args(argv)
+
+    index = UniversityIndex.from_teams_json(args.teams_json)
+    cache = load_cache(args.cache)
+    standings = load_standings(args.standings, args.institution_col)
+    joined, new, unmatched = join_standings(standings, index, cache)
+    save_cache(cache, args.cache)
+
+    matched = joined["university"].notna()
+    print(f"📄 {len(joined)} standings rows, {joined['institution'].nunique()} institutions, "
+          f"{len(index.names)} registered universities")
+    print(f"✓ {matched.sum()} rows matched ({new} new name(s) added to {args.cache})")
+    if unmatched:
+        print(f"⚠ {len(unmatched)} institution(s) not matched - map them in {args.cache} "
+              f"(null = not registered):")
+        for name in unmatched[:15]:
+            print(f"  - {name}")
+        if len(unmatched) > 15:
+            print(f"  ... and {len(unmatched) - 15} more")
+
+    features = university_features(joined, args.top)
+    features.to_csv(args.out, index=False, encoding="utf-8")
+    print(f"✓ Created {args.out} ({len(features)} universities)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())